@@ -0,0 +1,96 @@
+"""
+Measures the requests/sec a single uvicorn worker sustains at increasing
+concurrency. Start the app with one worker, then run:
+
+    python -m benchmarks.concurrency --url http://localhost:8000 -c 50 -c 500
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+
+import httpx
+
+
+def percentile(latencies: list[float], p: float) -> float:
+    """Nearest rank percentile of the sorted latencies, in ms."""
+    return round(latencies[max(0, math.ceil(len(latencies) * p) - 1)] * 1000, 2)
+
+
+def get_percentiles(latencies: list[float]) -> dict:
+    """The p50, p95, p99 and max of the latencies in seconds, in ms."""
+    latencies.sort()
+    return {
+        "p50_ms": percentile(latencies, 0.5) if latencies else None,
+        "p95_ms": percentile(latencies, 0.95) if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+    }
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    r = await client.post("/login", data={"username": username, "password": password})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def run(
+    url: str,
+    path: str,
+    concurrency: int,
+    duration: float,
+    username: str,
+    password: str,
+) -> dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        token = await login(client, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        done = 0
+        errors = 0
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal done, errors
+            while time.perf_counter() < deadline:
+                r = await client.get(path, headers=headers)
+                if r.status_code == 200:
+                    done += 1
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "requests": done,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "rps": round(done / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/accounts")
+    parser.add_argument("-c", "--concurrency", type=int, action="append")
+    parser.add_argument("-d", "--duration", type=float, default=30)
+    parser.add_argument("-u", "--username", default="dummyadmin")
+    parser.add_argument("-p", "--password", default="dummyadmin")
+    args = parser.parse_args()
+
+    for c in args.concurrency or [50, 500]:
+        result = asyncio.run(
+            run(args.url, args.path, c, args.duration, args.username, args.password)
+        )
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
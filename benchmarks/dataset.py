@@ -0,0 +1,269 @@
+"""
+Generates a synthetic CRM data set with Faker, and loads it through the bulk
+endpoints: N accounts, each with contacts, opportunities and notes; each
+opportunity with projects, artifacts and notes; each project with tasks
+and notes.
+
+The data set is a function of its size and seed, ids included: a benchmark
+can regenerate it to address the rows loaded by a previous run.
+Every record is tagged `bench`. To drop the data set:
+
+    DELETE FROM accounts WHERE tags @> ARRAY['bench'];
+
+    python -m benchmarks.dataset --url http://localhost:8000 -a 1000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import httpx
+from faker import Faker
+
+from benchmarks.concurrency import login
+
+TAG = "bench"
+ARTIFACT_SCHEMA_ID = "BENCH-SCHEMA"
+ARTIFACT_SCHEMA = {
+    "nodes": {"type": "int"},
+    "cpus": {"type": "int"},
+    "region": {"type": "str"},
+}
+
+# children per parent
+CONTACTS_PER_ACCOUNT = 3
+OPPORTUNITIES_PER_ACCOUNT = 2
+PROJECTS_PER_OPPORTUNITY = 1
+TASKS_PER_PROJECT = 4
+ARTIFACTS_PER_OPPORTUNITY = 1
+NOTES_PER_PARENT = 1
+
+OPPORTUNITY_STATUSES = ["NEW", "OPEN", "IN PROGRESS", "ON HOLD", "COMPLETED"]
+TASK_STATUSES = ["NEW", "OPEN", "ON HOLD", "PENDING", "CLOSED"]
+
+# table: bulk endpoint, in load order
+BULK_ENDPOINTS = {
+    "accounts": "/accounts/bulk",
+    "contacts": "/contacts/bulk",
+    "opportunities": "/opportunities/bulk",
+    "projects": "/projects/bulk",
+    "tasks": "/tasks/bulk",
+    "account_notes": "/notes/account/bulk",
+    "opportunity_notes": "/notes/opportunity/bulk",
+    "project_notes": "/notes/project/bulk",
+}
+
+
+def get_uuid(rnd: random.Random) -> str:
+    return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+
+def get_basic(fake: Faker, rnd: random.Random, statuses: list[str]) -> dict:
+    return {
+        "name": fake.catch_phrase()[:50],
+        "text": fake.paragraph(nb_sentences=5),
+        "status": rnd.choice(statuses),
+        "owned_by": "dummyadmin",
+        "due_date": fake.date_between("-90d", "+180d").isoformat(),
+        "tags": [TAG, rnd.choice(["smb", "enterprise", "public"])],
+    }
+
+
+def get_note(fake: Faker, rnd: random.Random, key: dict) -> dict:
+    return {
+        **key,
+        "note_id": get_uuid(rnd),
+        "name": fake.sentence(nb_words=4)[:50],
+        "text": fake.paragraph(nb_sentences=8),
+        "tags": [TAG],
+    }
+
+
+def get_artifact(fake: Faker, rnd: random.Random, key: dict) -> dict:
+    return {
+        **key,
+        "artifact_id": get_uuid(rnd),
+        "name": f"{fake.word()}-cluster"[:50],
+        "artifact_schema_id": ARTIFACT_SCHEMA_ID,
+        "payload": {
+            "nodes": rnd.randint(3, 30),
+            "cpus": rnd.choice([4, 8, 16, 32]),
+            "region": fake.country_code(),
+        },
+        "tags": [TAG],
+    }
+
+
+def generate(accounts: int, seed: int = 0) -> dict[str, list[dict]]:
+    """The records of each table, parents first."""
+    fake = Faker()
+    fake.seed_instance(seed)
+    rnd = random.Random(seed)
+
+    data: dict[str, list[dict]] = {x: [] for x in BULK_ENDPOINTS}
+    data["artifacts"] = []
+
+    for _ in range(accounts):
+        account = {
+            "account_id": get_uuid(rnd),
+            **get_basic(fake, rnd, ["NEW", "OPPORTUNITY", "ENTERPRISE", "POC"]),
+            "name": fake.company()[:50],
+        }
+        data["accounts"].append(account)
+        acc_key = {"account_id": account["account_id"]}
+
+        for _ in range(CONTACTS_PER_ACCOUNT):
+            data["contacts"].append(
+                {
+                    **acc_key,
+                    "contact_id": get_uuid(rnd),
+                    "fname": fake.first_name(),
+                    "lname": fake.last_name(),
+                    "role_title": fake.job()[:50],
+                    "email": fake.email(),
+                    "telephone_number": fake.phone_number()[:30],
+                }
+            )
+
+        for _ in range(NOTES_PER_PARENT):
+            data["account_notes"].append(get_note(fake, rnd, acc_key))
+
+        for _ in range(OPPORTUNITIES_PER_ACCOUNT):
+            opp_key = {**acc_key, "opportunity_id": get_uuid(rnd)}
+            data["opportunities"].append(
+                {**opp_key, **get_basic(fake, rnd, OPPORTUNITY_STATUSES)}
+            )
+
+            for _ in range(NOTES_PER_PARENT):
+                data["opportunity_notes"].append(get_note(fake, rnd, opp_key))
+
+            for _ in range(ARTIFACTS_PER_OPPORTUNITY):
+                data["artifacts"].append(get_artifact(fake, rnd, opp_key))
+
+            for _ in range(PROJECTS_PER_OPPORTUNITY):
+                proj_key = {**opp_key, "project_id": get_uuid(rnd)}
+                data["projects"].append(
+                    {**proj_key, **get_basic(fake, rnd, OPPORTUNITY_STATUSES)}
+                )
+
+                for _ in range(NOTES_PER_PARENT):
+                    data["project_notes"].append(get_note(fake, rnd, proj_key))
+
+                for _ in range(TASKS_PER_PROJECT):
+                    data["tasks"].append(
+                        {
+                            **proj_key,
+                            "task_id": get_uuid(rnd),
+                            **get_basic(fake, rnd, TASK_STATUSES),
+                        }
+                    )
+
+    return data
+
+
+async def create_artifact_schema(client: httpx.AsyncClient, headers: dict):
+    r = await client.get(f"/artifact-schemas/{ARTIFACT_SCHEMA_ID}", headers=headers)
+
+    if r.status_code == 200 and r.json():
+        return
+
+    r = await client.post(
+        "/artifact-schemas",
+        headers=headers,
+        json={
+            "artifact_schema_id": ARTIFACT_SCHEMA_ID,
+            "artifact_schema": ARTIFACT_SCHEMA,
+        },
+    )
+    r.raise_for_status()
+
+
+async def load(
+    client: httpx.AsyncClient,
+    headers: dict,
+    data: dict[str, list[dict]],
+    bulk_size: int,
+    concurrency: int = 4,
+) -> dict[str, float]:
+    """
+    Loads the tables through their bulk endpoints, concurrency batches at
+    a time, and the artifacts one by one, as they have no bulk endpoint.
+    Returns the rows/sec of each table.
+    """
+    await create_artifact_schema(client, headers)
+
+    rates: dict[str, float] = {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def post(path: str, json_data) -> None:
+        async with sem:
+            r = await client.post(path, headers=headers, json=json_data)
+            r.raise_for_status()
+
+    for table, rows in data.items():
+        path = BULK_ENDPOINTS.get(table)
+        start = time.perf_counter()
+
+        if path:
+            await asyncio.gather(
+                *[
+                    post(path, rows[i : i + bulk_size])
+                    for i in range(0, len(rows), bulk_size)
+                ]
+            )
+        else:
+            await asyncio.gather(*[post(f"/{table}", x) for x in rows])
+
+        rates[table] = round(len(rows) / (time.perf_counter() - start), 1)
+
+    return rates
+
+
+async def run(
+    url: str,
+    accounts: int,
+    seed: int,
+    bulk_size: int,
+    concurrency: int,
+    username: str,
+    password: str,
+):
+    data = generate(accounts, seed)
+    print(json.dumps({k: len(v) for k, v in data.items()}))
+
+    async with httpx.AsyncClient(base_url=url, timeout=600) as client:
+        token = await login(client, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        rates = await load(client, headers, data, bulk_size, concurrency)
+        print(json.dumps({"rows_per_s": rates}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("-a", "--accounts", type=int, default=1000)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-b", "--bulk-size", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("-u", "--username", default="dummyadmin")
+    parser.add_argument("-p", "--password", default="dummyadmin")
+    args = parser.parse_args()
+
+    asyncio.run(
+        run(
+            args.url,
+            args.accounts,
+            args.seed,
+            args.bulk_size,
+            args.concurrency,
+            args.username,
+            args.password,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""
+Micro-benchmarks of the hot paths of worst_crm.db, without HTTP and without
+a database: the connection pool is replaced by a stand-in whose cursors
+return canned rows through the real row factories. What is measured is the
+Python side of the data layer: statement building, row mapping, model
+building and validation.
+
+- execute_stmt mapping 1, 100 and 10k rows to an overview model
+- __get_where_clause compiling filters and conditions
+- every create_* and update_* taking a model
+- build_model_tuple and extend_model
+- sanitize, with the artifact validator cached and rebuilt
+
+Each benchmark is calibrated to run for at least --min-time seconds,
+repeated --repeat times: the min and median time per call are reported as a
+JSON line, with the commit. With --compare, the medians are checked against
+the last result in that file, and the exit code is 1 if any is slower by
+more than --threshold: run it before deploying, against the result
+of the deployed commit.
+
+    python -m benchmarks.db_hot_paths -o db_hot_paths.jsonl
+    python -m benchmarks.db_hot_paths --compare db_hot_paths.jsonl
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import statistics
+import sys
+import time
+import typing
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable
+
+import psycopg
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SET
+
+from benchmarks.workload import get_git_commit
+
+# the app reads its config at import: nothing connects to these
+for k, v in {
+    "DB_URL": "postgresql://root@localhost:26257/worst_crm",
+    "JWT_KEY": "0" * 64,
+    "JWT_KEY_ALGORITHM": "HS256",
+    "S3_ENDPOINT_URL": "localhost:9000",
+    "S3_BUCKET": "bench",
+}.items():
+    os.environ.setdefault(k, v)
+
+
+# STAND-IN
+class Column:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+class StandInCursor:
+    """Returns the canned result of the stand-in to every statement."""
+
+    def __init__(self, stand_in: "StandIn", row_factory: Any = None) -> None:
+        self.stand_in = stand_in
+        self.row_factory = row_factory
+        self.description: list[Column] | None = None
+        self.rowcount = -1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    async def execute(self, stmt: str, args: Any = None, prepare: Any = None):
+        cols, self.rows = self.stand_in.result
+        self.description = [Column(x) for x in cols]
+        self.rowcount = len(self.rows)
+
+    def __make_rows(self) -> list:
+        if not self.row_factory:
+            return list(self.rows)
+
+        make_row = self.row_factory(self)
+        return [make_row(x) for x in self.rows]
+
+    async def fetchall(self) -> list:
+        return self.__make_rows()
+
+    async def fetchone(self) -> Any:
+        rows = self.__make_rows()
+        return rows[0] if rows else None
+
+
+class StandInConnection:
+    def __init__(self, stand_in: "StandIn") -> None:
+        self.stand_in = stand_in
+        self._prepared: dict = {}
+
+    def cursor(self, row_factory: Any = None) -> StandInCursor:
+        return StandInCursor(self.stand_in, row_factory)
+
+
+class StandIn:
+    """Replaces db.pool: every connection returns `result`."""
+
+    def __init__(self) -> None:
+        # (column names, rows)
+        self.result: tuple[list[str], list[tuple]] = ([], [])
+        self.conn = StandInConnection(self)
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self.conn
+
+    def get_stats(self) -> dict:
+        return {}
+
+
+class SyncStandIn:
+    """Replaces psycopg.connect at import, when the dynamic fields are loaded."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def cursor(self):
+        return self
+
+    def execute(self, *args, **kwargs) -> None:
+        pass
+
+    def fetchall(self) -> list:
+        return []
+
+
+psycopg.connect = lambda *args, **kwargs: SyncStandIn()  # type: ignore
+
+from worst_crm import db, models  # noqa: E402
+from worst_crm.routers import artifacts  # noqa: E402
+
+stand_in = StandIn()
+db.pool = stand_in  # type: ignore
+
+
+# SAMPLES
+def get_sample_value(name: str, field: Any) -> Any:
+    if field.shape == SHAPE_SET:
+        return {"bench", "t1"}
+    if field.shape == SHAPE_LIST:
+        return ["bench"]
+
+    t = field.type_
+
+    if t is uuid.UUID:
+        return uuid.UUID(int=1)
+    if t is dt.datetime:
+        return dt.datetime(2030, 1, 1, tzinfo=dt.timezone.utc)
+    if t is dt.date:
+        return dt.date(2030, 1, 1)
+    if t is dict:
+        return {"nodes": 3, "cpus": 8}
+    if t is bool:
+        return False
+    if t in (int, float):
+        return t(1)
+    if isinstance(t, type) and issubclass(t, str):
+        return "bench@example.com" if "email" in name else f"bench-{name}"[:20]
+
+    return None
+
+
+def get_sample(model: type[BaseModel], exclude: tuple[str, ...] = ()) -> dict:
+    return {
+        name: get_sample_value(name, field)
+        for name, field in model.__fields__.items()
+        if name not in exclude
+    }
+
+
+def get_result(model: type[BaseModel], n: int = 1) -> tuple[list[str], list[tuple]]:
+    sample = get_sample(model)
+    # the arrays of the `set` fields are read from the db as lists
+    row = tuple(list(x) if isinstance(x, set) else x for x in sample.values())
+    return (list(sample), [row] * n)
+
+
+def get_write_functions() -> list[tuple[str, Callable, type[BaseModel], type]]:
+    """The create_* and update_* functions of db taking a model."""
+    fns = []
+
+    for name in sorted(dir(db)):
+        if not name.startswith(("create_", "update_")):
+            continue
+
+        fn = getattr(db, name)
+        hints = typing.get_type_hints(fn)
+        params = [v for k, v in hints.items() if k != "return"]
+
+        if params and isinstance(params[0], type) and issubclass(params[0], BaseModel):
+            returned = typing.get_args(hints["return"])[0]
+            fns.append((name, fn, params[0], returned))
+
+    return fns
+
+
+ARTIFACT_SCHEMA = {
+    "nodes": {"type": "int"},
+    "cpus": {"type": "int"},
+    "region": {"type": "str"},
+    "tier": {"type": "str", "default_value": {"min_length": 3, "max_length": 30}},
+    "tags": {"type": "list[str]"},
+    "ha": {"type": "bool"},
+}
+
+ARTIFACT_PAYLOAD = {
+    "nodes": 3,
+    "cpus": 8,
+    "region": "us-east-1",
+    "tier": "gold",
+    "tags": ["a", "b"],
+    "ha": True,
+}
+
+
+# TIMING
+def bench_sync(fn: Callable[[], Any], min_time: float, repeat: int) -> dict:
+    def elapsed(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        return time.perf_counter() - start
+
+    # the number of loops taking at least min_time
+    loops = 1
+    while elapsed(loops) < min_time:
+        loops *= 2
+
+    return summary([elapsed(loops) / loops for _ in range(repeat)], loops)
+
+
+async def bench_async(
+    fn: Callable[[], Awaitable], min_time: float, repeat: int
+) -> dict:
+    async def elapsed(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            await fn()
+        return time.perf_counter() - start
+
+    loops = 1
+    while await elapsed(loops) < min_time:
+        loops *= 2
+
+    return summary([await elapsed(loops) / loops for _ in range(repeat)], loops)
+
+
+def summary(times: list[float], loops: int) -> dict:
+    return {
+        "loops": loops,
+        "min_us": round(min(times) * 1e6, 2),
+        "median_us": round(statistics.median(times) * 1e6, 2),
+    }
+
+
+# BENCHMARKS
+async def run(min_time: float, repeat: int, only: str | None) -> dict[str, dict]:
+    results: dict[str, dict] = {}
+
+    def selected(name: str) -> bool:
+        return not only or only in name
+
+    # execute_stmt row mapping
+    for n in [1, 100, 10_000]:
+        name = f"execute_stmt[{n} rows]"
+        if selected(name):
+            result = get_result(models.AccountOverview, n)
+
+            async def execute():
+                stand_in.result = result
+                return await db.execute_stmt(
+                    "SELECT 1", (), models.AccountOverview, True, name="bench"
+                )
+
+            results[name] = await bench_async(execute, min_time, repeat)
+
+    # where clauses
+    get_where_clause = db.__dict__["__get_where_clause"]
+    filters = {
+        "basic": models.AccountFilters(
+            owned_by=["dummyadmin"], status=["NEW", "POC"], tags=["t1"]
+        ),
+        "conditions": models.AccountFilters(
+            where={
+                "name": {"prefix": "ACME"},
+                "due_date": {"gte": "2030-01-01", "lt": "2031-01-01"},
+                "status": {"in": ["NEW", "POC"]},
+            },
+            any_of=[{"owned_by": {"eq": "dummyadmin"}}, {"tags": {"contains": ["t1"]}}],
+        ),
+    }
+    for k, f in filters.items():
+        name = f"__get_where_clause[{k}]"
+        if selected(name):
+            results[name] = bench_sync(
+                lambda f=f: get_where_clause(f, "accounts"), min_time, repeat
+            )
+
+    # writes: the updates leave the name out, as renaming a parent
+    # starts a background propagation to its children
+    for fn_name, fn, in_db, returned in get_write_functions():
+        if not selected(fn_name):
+            continue
+
+        exclude = ("name",) if fn_name.startswith("update_") else ()
+        arg = in_db(**get_sample(in_db, exclude))
+        result = get_result(returned)
+
+        async def write(fn=fn, arg=arg, result=result):
+            stand_in.result = result
+            return await fn(arg)
+
+        results[fn_name] = await bench_async(write, min_time, repeat)
+
+    # dynamic models
+    if selected("build_model_tuple"):
+        results["build_model_tuple"] = bench_sync(
+            lambda: models.build_model_tuple(ARTIFACT_SCHEMA), min_time, repeat
+        )
+
+    if selected("extend_model"):
+        fields = models.build_model_tuple(ARTIFACT_SCHEMA)
+        results["extend_model"] = bench_sync(
+            lambda: models.extend_model("Bench", BaseModel, fields), min_time, repeat
+        )
+
+    # sanitize: the schema is always read, the validator is cached per version
+    schema_result = get_result(models.ArtifactSchema)
+    cols, [row] = schema_result
+    row = tuple(
+        ARTIFACT_SCHEMA
+        if c == "artifact_schema"
+        else "BENCH"
+        if c == "artifact_schema_id"
+        else v
+        for c, v in zip(cols, row)
+    )
+    schema_result = (cols, [row])
+
+    async def sanitize():
+        stand_in.result = schema_result
+        return await artifacts.sanitize("BENCH", ARTIFACT_PAYLOAD)
+
+    async def sanitize_cold():
+        db.invalidate_artifact_validators("BENCH")
+        return await sanitize()
+
+    if selected("sanitize[cached]"):
+        results["sanitize[cached]"] = await bench_async(sanitize, min_time, repeat)
+
+    if selected("sanitize[cold]"):
+        results["sanitize[cold]"] = await bench_async(sanitize_cold, min_time, repeat)
+
+    return results
+
+
+def compare(results: dict[str, dict], path: str, threshold: float) -> list[dict]:
+    """The benchmarks whose median is slower than in the last result of path."""
+    with open(path) as f:
+        lines = [x for x in f.read().splitlines() if x.strip()]
+
+    baseline = json.loads(lines[-1])
+    regressions = []
+
+    for name, r in results.items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+
+        ratio = r["median_us"] / before["median_us"]
+        if ratio > 1 + threshold:
+            regressions.append(
+                {
+                    "name": name,
+                    "baseline_commit": baseline.get("commit"),
+                    "baseline_us": before["median_us"],
+                    "median_us": r["median_us"],
+                    "ratio": round(ratio, 2),
+                }
+            )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-k", "--only", help="runs the benchmarks matching this")
+    parser.add_argument("-o", "--output", help="appends the result to this file")
+    parser.add_argument("--compare", help="a file of previous results")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    # the slow query log would print every statement of the large results
+    db.SLOW_QUERY_THRESHOLD_MS = float("inf")
+
+    results = asyncio.run(run(args.min_time, args.repeat, args.only))
+
+    line = json.dumps(
+        {
+            "commit": get_git_commit(),
+            "python": sys.version.split()[0],
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "results": results,
+        }
+    )
+    print(line)
+
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+
+    for x in regressions:
+        print(json.dumps({"regression": x}), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(line + "\n")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
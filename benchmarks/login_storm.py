@@ -0,0 +1,99 @@
+"""
+Measures the latency of unrelated GETs while a storm of logins keeps the
+bcrypt workers busy. The probe runs first alone, then during the storm:
+with hashing on the event loop, the p99 of the probe grows to the duration
+of the queued bcrypt calls.
+
+    python -m benchmarks.login_storm --url http://localhost:8000 -l 200
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.concurrency import get_percentiles, login
+
+
+async def probe(
+    client: httpx.AsyncClient, path: str, headers: dict, deadline: float
+) -> list[float]:
+    latencies: list[float] = []
+
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        r = await client.get(path, headers=headers)
+        r.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def summary(latencies: list[float]) -> dict:
+    return {"requests": len(latencies), **get_percentiles(latencies)}
+
+
+async def run(
+    url: str,
+    path: str,
+    logins: int,
+    duration: float,
+    username: str,
+    password: str,
+) -> dict:
+    limits = httpx.Limits(max_connections=logins + 10)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        token = await login(client, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        baseline = await probe(client, path, headers, time.perf_counter() + duration)
+
+        statuses: dict[int, int] = {}
+        deadline = time.perf_counter() + duration
+
+        async def storm():
+            while time.perf_counter() < deadline:
+                r = await client.post(
+                    "/login", data={"username": username, "password": password}
+                )
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+        storming = asyncio.gather(*[storm() for _ in range(logins)])
+        during = await probe(client, path, headers, deadline)
+        await storming
+
+    return {
+        "path": path,
+        "concurrent_logins": logins,
+        "login_statuses": statuses,
+        "baseline": summary(baseline),
+        "during_storm": summary(during),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/me")
+    parser.add_argument("-l", "--logins", type=int, default=100)
+    parser.add_argument("-d", "--duration", type=float, default=15)
+    parser.add_argument("-u", "--username", default="dummyadmin")
+    parser.add_argument("-p", "--password", default="dummyadmin")
+    args = parser.parse_args()
+
+    result = asyncio.run(
+        run(
+            args.url,
+            args.path,
+            args.logins,
+            args.duration,
+            args.username,
+            args.password,
+        )
+    )
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
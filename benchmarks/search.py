@@ -0,0 +1,163 @@
+"""
+Measures the latency of GET /search on a synthetic data set of accounts
+and contacts, loaded through the bulk endpoints and tagged `bench-search`.
+Loading a million accounts takes a while: use --skip-load to rerun
+the queries on the data set of a previous run. To drop it:
+
+    DELETE FROM accounts WHERE tags @> ARRAY['bench-search'];
+
+    python -m benchmarks.search --url http://localhost:8000 -a 1000000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from benchmarks.concurrency import get_percentiles, login
+
+BULK_SIZE = 10_000
+TAG = "bench-search"
+
+# a few words are in most rows, the rest are rare
+COMMON_WORDS = ["global", "systems", "solutions", "group"]
+RARE_WORDS = [f"w{i:05}" for i in range(20_000)]
+FIRST_NAMES = ["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi"]
+
+
+def get_text(rnd: random.Random, n: int) -> str:
+    return " ".join(
+        rnd.choice(COMMON_WORDS) if rnd.random() < 0.3 else rnd.choice(RARE_WORDS)
+        for _ in range(n)
+    )
+
+
+async def load(client: httpx.AsyncClient, headers: dict, accounts: int, contacts: int):
+    rnd = random.Random(0)
+    account_ids = []
+
+    for start in range(0, accounts, BULK_SIZE):
+        r = await client.post(
+            "/accounts/bulk",
+            headers=headers,
+            json=[
+                {
+                    "name": get_text(rnd, 3),
+                    "text": get_text(rnd, 30),
+                    "owned_by": "dummyadmin",
+                    "tags": [TAG],
+                }
+                for _ in range(min(BULK_SIZE, accounts - start))
+            ],
+        )
+        r.raise_for_status()
+        account_ids += [x["key"]["account_id"] for x in r.json() if x["ok"]]
+
+    for start in range(0, contacts, BULK_SIZE):
+        r = await client.post(
+            "/contacts/bulk",
+            headers=headers,
+            json=[
+                {
+                    "account_id": rnd.choice(account_ids),
+                    "fname": rnd.choice(FIRST_NAMES) + rnd.choice(RARE_WORDS),
+                    "lname": rnd.choice(RARE_WORDS),
+                    "email": f"{rnd.choice(RARE_WORDS)}@example.com",
+                }
+                for _ in range(min(BULK_SIZE, contacts - start))
+            ],
+        )
+        r.raise_for_status()
+
+
+async def run_queries(
+    client: httpx.AsyncClient, headers: dict, name: str, params: list[dict]
+) -> dict:
+    latencies: list[float] = []
+    hits = 0
+
+    for p in params:
+        start = time.perf_counter()
+        r = await client.get("/search", headers=headers, params=p)
+        latencies.append(time.perf_counter() - start)
+        r.raise_for_status()
+        hits += len(r.json())
+
+    return {
+        "query": name,
+        "requests": len(latencies),
+        "mean_hits": round(hits / len(latencies), 1) if latencies else 0,
+        **get_percentiles(latencies),
+    }
+
+
+async def run(
+    url: str,
+    accounts: int,
+    contacts: int,
+    requests: int,
+    skip_load: bool,
+    username: str,
+    password: str,
+):
+    async with httpx.AsyncClient(base_url=url, timeout=600) as client:
+        token = await login(client, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        if not skip_load:
+            start = time.perf_counter()
+            await load(client, headers, accounts, contacts)
+            print(json.dumps({"loaded_s": round(time.perf_counter() - start, 1)}))
+
+        rnd = random.Random(1)
+        scenarios = {
+            "rare_term": [{"q": rnd.choice(RARE_WORDS)} for _ in range(requests)],
+            "common_term": [
+                {"q": rnd.choice(COMMON_WORDS), "entity": ["account"]}
+                for _ in range(requests)
+            ],
+            "two_terms": [
+                {"q": f"{rnd.choice(COMMON_WORDS)} {rnd.choice(RARE_WORDS)}"}
+                for _ in range(requests)
+            ],
+            "fuzzy_contact": [
+                {
+                    "q": rnd.choice(FIRST_NAMES) + rnd.choice(RARE_WORDS)[:-1],
+                    "entity": ["contact"],
+                }
+                for _ in range(requests)
+            ],
+        }
+
+        for name, params in scenarios.items():
+            print(json.dumps(await run_queries(client, headers, name, params)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("-a", "--accounts", type=int, default=1_000_000)
+    parser.add_argument("-k", "--contacts", type=int, default=100_000)
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("-u", "--username", default="dummyadmin")
+    parser.add_argument("-p", "--password", default="dummyadmin")
+    args = parser.parse_args()
+
+    asyncio.run(
+        run(
+            args.url,
+            args.accounts,
+            args.contacts,
+            args.requests,
+            args.skip_load,
+            args.username,
+            args.password,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
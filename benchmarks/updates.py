@@ -0,0 +1,133 @@
+"""
+Measures the latency of PUT /accounts, with concurrent clients updating either
+their own account or the same, single account (contention).
+With --optimistic, every update carries the `expected_updated_at`
+of the version last read by the client, and conflicts (409) are counted.
+
+    python -m benchmarks.updates --url http://localhost:8000 -c 1 -c 50
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.concurrency import get_percentiles, login
+
+
+async def create_account(client: httpx.AsyncClient, headers: dict, i: int) -> dict:
+    r = await client.post(
+        "/accounts",
+        headers=headers,
+        json={
+            "name": f"BENCH-UPD-{i:06}",
+            "text": "x" * 100_000,
+            "status": "NEW",
+            "owned_by": "dummyadmin",
+            "tags": ["bench"],
+        },
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+async def run(
+    url: str,
+    concurrency: int,
+    updates: int,
+    contended: bool,
+    optimistic: bool,
+    username: str,
+    password: str,
+) -> dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        token = await login(client, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        accounts = [
+            await create_account(client, headers, i)
+            for i in range(1 if contended else concurrency)
+        ]
+
+        latencies: list[float] = []
+        conflicts = 0
+        errors = 0
+
+        async def worker(n: int):
+            nonlocal conflicts, errors
+            acc = accounts[0 if contended else n]
+            updated_at = acc["updated_at"]
+
+            for i in range(updates):
+                params = {"expected_updated_at": updated_at} if optimistic else {}
+                start = time.perf_counter()
+                r = await client.put(
+                    "/accounts",
+                    headers=headers,
+                    params=params,
+                    # a tag change only: the large text column is not sent
+                    json={"account_id": acc["account_id"], "tags": [f"t{n}-{i}"]},
+                )
+                latencies.append(time.perf_counter() - start)
+
+                if r.status_code == 200 and r.json():
+                    updated_at = r.json()["updated_at"]
+                elif r.status_code == 409:
+                    conflicts += 1
+                    # re-read the current version, as a real client would
+                    r = await client.get(
+                        f"/accounts/{acc['account_id']}", headers=headers
+                    )
+                    updated_at = r.json()["updated_at"]
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(n) for n in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+        for acc in accounts:
+            await client.delete(f"/accounts/{acc['account_id']}", headers=headers)
+
+    return {
+        "concurrency": concurrency,
+        "contended": contended,
+        "optimistic": optimistic,
+        "updates": len(latencies),
+        "conflicts": conflicts,
+        "errors": errors,
+        "ups": round(len(latencies) / elapsed, 1),
+        **get_percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("-c", "--concurrency", type=int, action="append")
+    parser.add_argument("-n", "--updates", type=int, default=100)
+    parser.add_argument("--optimistic", action="store_true")
+    parser.add_argument("-u", "--username", default="dummyadmin")
+    parser.add_argument("-p", "--password", default="dummyadmin")
+    args = parser.parse_args()
+
+    for c in args.concurrency or [1, 50]:
+        for contended in [False, True]:
+            result = asyncio.run(
+                run(
+                    args.url,
+                    c,
+                    args.updates,
+                    contended,
+                    args.optimistic,
+                    args.username,
+                    args.password,
+                )
+            )
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
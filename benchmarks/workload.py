@@ -0,0 +1,416 @@
+"""
+Drives a scenario, a weighted mix of requests, against a running server
+at a given concurrency, and reports the throughput and the p50/p95/p99
+latency of each endpoint as a JSON line. With --output, the line is also
+appended to a file, to track the trend across commits.
+
+Scenarios:
+- dashboard: the lists, stats, account trees and searches of a dashboard
+- mixed: the dashboard reads, with a fifth of writes (notes, tasks, updates)
+- bulk_import: the data set loaded through the bulk endpoints
+- login_storm: logins, with the requests of the users already logged in
+- artifact_ingestion: artifacts validated against their schema and created
+
+The reads address the data set of benchmarks.dataset, regenerated from
+the same --accounts and --seed: load it first, or pass --load.
+
+    python -m benchmarks.workload dashboard --url http://localhost:8000 -c 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from typing import Callable
+
+import httpx
+from faker import Faker
+
+from benchmarks import dataset
+from benchmarks.concurrency import get_percentiles, login
+
+# a request: (endpoint, httpx.request kwargs).
+# The endpoint is the route template, so that stats aggregate per endpoint.
+Request = tuple[str, dict]
+# a scenario: [(weight, request factory)]
+Scenario = list[tuple[float, Callable[[random.Random], Request]]]
+
+
+def summary(latencies: list[float], errors: int, seconds: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 1),
+        **get_percentiles(latencies),
+    }
+
+
+def get(endpoint: str, url: str, **kwargs) -> Request:
+    return (endpoint, {"method": "GET", "url": url, **kwargs})
+
+
+def get_dashboard(data: dict[str, list[dict]]) -> Scenario:
+    accounts = data["accounts"]
+    opportunities = data["opportunities"]
+    projects = data["projects"]
+    words = [x["name"].split()[0] for x in accounts[:1000]]
+
+    return [
+        (4, lambda rnd: get("GET /accounts", "/accounts")),
+        (3, lambda rnd: get("GET /opportunities", "/opportunities")),
+        (2, lambda rnd: get("GET /projects", "/projects")),
+        (
+            2,
+            lambda rnd: get(
+                "GET /stats/{entity}",
+                f"/stats/{rnd.choice(['opportunities', 'projects', 'tasks'])}",
+            ),
+        ),
+        (
+            2,
+            lambda rnd: get(
+                "GET /accounts/{account_id}/tree",
+                "/accounts/{account_id}/tree".format(**rnd.choice(accounts)),
+            ),
+        ),
+        (
+            2,
+            lambda rnd: get(
+                "GET /opportunities/{account_id}",
+                "/opportunities/{account_id}".format(**rnd.choice(accounts)),
+            ),
+        ),
+        (
+            2,
+            lambda rnd: get(
+                "GET /tasks/{account_id}/{opportunity_id}/{project_id}",
+                "/tasks/{account_id}/{opportunity_id}/{project_id}".format(
+                    **rnd.choice(projects)
+                ),
+            ),
+        ),
+        (
+            1,
+            lambda rnd: get(
+                "GET /opportunities (filtered)",
+                "/opportunities",
+                json={
+                    "where": {
+                        "status": {"eq": rnd.choice(dataset.OPPORTUNITY_STATUSES)}
+                    }
+                },
+            ),
+        ),
+        (1, lambda rnd: get("GET /search", "/search", params={"q": rnd.choice(words)})),
+        (
+            1,
+            lambda rnd: get(
+                "GET /opportunities/{account_id}/{opportunity_id}",
+                "/opportunities/{account_id}/{opportunity_id}".format(
+                    **rnd.choice(opportunities)
+                ),
+            ),
+        ),
+    ]
+
+
+def get_mixed(data: dict[str, list[dict]]) -> Scenario:
+    fake = Faker()
+    opportunities = data["opportunities"]
+    projects = data["projects"]
+    tasks = data["tasks"]
+
+    def create_note(rnd: random.Random) -> Request:
+        opp = rnd.choice(opportunities)
+        note = {
+            "account_id": opp["account_id"],
+            "opportunity_id": opp["opportunity_id"],
+            "name": fake.sentence(nb_words=4)[:50],
+            "text": fake.paragraph(),
+            "tags": [dataset.TAG],
+        }
+        return (
+            "POST /notes/opportunity",
+            {"method": "POST", "url": "/notes/opportunity", "json": note},
+        )
+
+    def update_task(rnd: random.Random) -> Request:
+        task = {**rnd.choice(tasks), "status": rnd.choice(dataset.TASK_STATUSES)}
+        return ("PUT /tasks", {"method": "PUT", "url": "/tasks", "json": task})
+
+    writes: Scenario = [
+        (2, create_note),
+        (
+            2,
+            lambda rnd: (
+                "POST /tasks",
+                {
+                    "method": "POST",
+                    "url": "/tasks",
+                    "json": {
+                        **{
+                            k: v
+                            for k, v in rnd.choice(projects).items()
+                            if k.endswith("_id")
+                        },
+                        **dataset.get_basic(fake, rnd, dataset.TASK_STATUSES),
+                    },
+                },
+            ),
+        ),
+        (1, update_task),
+    ]
+
+    # the dashboard weighs 20: the writes are a fifth of the mix
+    return get_dashboard(data) + writes
+
+
+def get_login_storm(username: str, password: str) -> Scenario:
+    return [
+        (
+            1,
+            lambda rnd: (
+                "POST /login",
+                {
+                    "method": "POST",
+                    "url": "/login",
+                    "data": {"username": username, "password": password},
+                },
+            ),
+        ),
+        (4, lambda rnd: get("GET /me", "/me")),
+    ]
+
+
+def get_artifact_ingestion(data: dict[str, list[dict]]) -> Scenario:
+    fake = Faker()
+    opportunities = data["opportunities"]
+
+    return [
+        (
+            9,
+            lambda rnd: (
+                "POST /artifacts",
+                {
+                    "method": "POST",
+                    "url": "/artifacts",
+                    "json": dataset.get_artifact(
+                        fake,
+                        rnd,
+                        {
+                            k: v
+                            for k, v in rnd.choice(opportunities).items()
+                            if k in ["account_id", "opportunity_id"]
+                        },
+                    ),
+                },
+            ),
+        ),
+        (
+            1,
+            lambda rnd: get(
+                "GET /artifacts/{account_id}/{opportunity_id}",
+                "/artifacts/{account_id}/{opportunity_id}".format(
+                    **rnd.choice(opportunities)
+                ),
+            ),
+        ),
+    ]
+
+
+def get_bulk_import(data: dict[str, list[dict]], bulk_size: int) -> list[list[Request]]:
+    """The batches of the data set, per table, parents first."""
+    return [
+        [
+            (
+                f"POST {path}",
+                {"method": "POST", "url": path, "json": data[table][i : i + bulk_size]},
+            )
+            for i in range(0, len(data[table]), bulk_size)
+        ]
+        for table, path in dataset.BULK_ENDPOINTS.items()
+    ]
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    headers: dict,
+    concurrency: int,
+    duration: float,
+    seed: int,
+    scenario: Scenario | None = None,
+    requests: list[Request] | None = None,
+) -> tuple[dict[str, list[float]], dict[str, int], float]:
+    """
+    Sends the requests drawn from the scenario from concurrency workers,
+    for duration seconds; or sends the given requests once, in order,
+    each worker taking the next one.
+    Returns the latencies and the errors of each endpoint, and the elapsed time.
+    """
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+    queue = list(reversed(requests or []))
+
+    async def worker(i: int):
+        rnd = random.Random(seed * 1000 + i)
+
+        while True:
+            if scenario:
+                if time.perf_counter() >= deadline:
+                    return
+                [(_, factory)] = rnd.choices(scenario, [w for w, _ in scenario])
+                endpoint, req = factory(rnd)
+            elif queue:
+                endpoint, req = queue.pop()
+            else:
+                return
+
+            start = time.perf_counter()
+            try:
+                r = await client.request(**req, headers=headers)
+                ok = r.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - start
+
+            if ok:
+                latencies.setdefault(endpoint, []).append(elapsed)
+            else:
+                errors[endpoint] = errors.get(endpoint, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+
+    return (latencies, errors, time.perf_counter() - start)
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(
+    scenario_name: str,
+    url: str,
+    concurrency: int,
+    duration: float,
+    accounts: int,
+    seed: int,
+    bulk_size: int,
+    load: bool,
+    username: str,
+    password: str,
+) -> dict:
+    data = dataset.generate(accounts, seed)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=600) as client:
+        token = await login(client, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        # bulk_import loads the data set itself
+        if load and scenario_name != "bulk_import":
+            await dataset.load(client, headers, data, bulk_size)
+        elif scenario_name == "artifact_ingestion":
+            await dataset.create_artifact_schema(client, headers)
+
+        if scenario_name == "bulk_import":
+            latencies, errors, elapsed = {}, {}, 0.0
+
+            # a table at a time: the children reference their parents
+            for batches in get_bulk_import(data, bulk_size):
+                lat, err, sec = await drive(
+                    client, headers, concurrency, duration, seed, requests=batches
+                )
+                latencies.update(lat)
+                errors.update(err)
+                elapsed += sec
+        else:
+            scenario = {
+                "dashboard": lambda: get_dashboard(data),
+                "mixed": lambda: get_mixed(data),
+                "login_storm": lambda: get_login_storm(username, password),
+                "artifact_ingestion": lambda: get_artifact_ingestion(data),
+            }[scenario_name]()
+
+            latencies, errors, elapsed = await drive(
+                client, headers, concurrency, duration, seed, scenario=scenario
+            )
+
+    endpoints = sorted(set(latencies) | set(errors))
+
+    return {
+        "scenario": scenario_name,
+        "commit": get_git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "concurrency": concurrency,
+        "accounts": accounts,
+        "seconds": round(elapsed, 2),
+        "total": summary(sum(latencies.values(), []), sum(errors.values()), elapsed),
+        "endpoints": {
+            x: summary(latencies.get(x, []), errors.get(x, 0), elapsed)
+            for x in endpoints
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "scenario",
+        choices=[
+            "dashboard",
+            "mixed",
+            "bulk_import",
+            "login_storm",
+            "artifact_ingestion",
+        ],
+    )
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("-d", "--duration", type=float, default=30)
+    parser.add_argument("-a", "--accounts", type=int, default=1000)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-b", "--bulk-size", type=int, default=1000)
+    parser.add_argument("--load", action="store_true")
+    parser.add_argument("-o", "--output", help="appends the result to this file")
+    parser.add_argument("-u", "--username", default="dummyadmin")
+    parser.add_argument("-p", "--password", default="dummyadmin")
+    args = parser.parse_args()
+
+    result = asyncio.run(
+        run(
+            args.scenario,
+            args.url,
+            args.concurrency,
+            args.duration,
+            args.accounts,
+            args.seed,
+            args.bulk_size,
+            args.load,
+            args.username,
+            args.password,
+        )
+    )
+
+    line = json.dumps(result)
+    print(line)
+
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
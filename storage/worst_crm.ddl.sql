@@ -14,6 +14,10 @@ ALTER DATABASE worst_crm CONFIGURE ZONE USING
     constraints = '[]',
     lease_preferences = '[]';
 
+-- the changefeed on table watch, that notifies every app instance
+-- of model changes, needs the rangefeeds enabled. As root:
+-- SET CLUSTER SETTING kv.rangefeed.enabled = true;
+
 
 CREATE TABLE users (
     user_id STRING NOT NULL,
@@ -85,12 +89,12 @@ INSERT INTO models VALUES
 
 CREATE TABLE watch (
     -- pk
-    id INT2 NOT NULL,
+    topic STRING NOT NULL,
     -- fields
     ts TIMESTAMPTZ DEFAULT now() ON UPDATE now(),
-    CONSTRAINT pk PRIMARY KEY (id)
+    CONSTRAINT pk PRIMARY KEY (topic)
 );
-INSERT INTO watch (id) VALUES (1);
+INSERT INTO watch (topic) VALUES ('models');
 
 CREATE TABLE accounts (
     -- pk
@@ -109,6 +113,9 @@ CREATE TABLE accounts (
     status STRING(20) NULL,
     tags STRING [] NULL DEFAULT ARRAY[],
     -- not in models
+    search_vector TSVECTOR AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(text, ''))
+    ) STORED,
     attachments STRING[] NULL DEFAULT ARRAY[],
     -- PK
     CONSTRAINT pk PRIMARY KEY (account_id),
@@ -123,8 +130,18 @@ CREATE TABLE accounts (
         REFERENCES users(user_id) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
-CREATE INDEX accounts_owned_by ON accounts(owned_by);
+-- the secondary indexes are listed in db.MANAGED_INDEXES: an existing
+-- database is brought up to date with POST /admin/indexes
+CREATE INDEX accounts_name ON accounts(name, account_id)
+    STORING (created_at, updated_at, created_by, updated_by, owned_by, status, due_date, tags);
+CREATE INDEX accounts_owned_by ON accounts(owned_by, name, account_id)
+    STORING (created_at, updated_at, created_by, updated_by, status, due_date, tags);
+CREATE INDEX accounts_status_due_date ON accounts(status, due_date);
+CREATE INDEX accounts_due_date ON accounts(due_date);
+CREATE INDEX accounts_updated_at ON accounts(updated_at);
 CREATE INVERTED INDEX accounts_tags_gin ON accounts(tags);
+CREATE INVERTED INDEX accounts_name_trgm ON accounts(name gin_trgm_ops);
+CREATE INVERTED INDEX accounts_search ON accounts(search_vector);
 
 
 CREATE TABLE contacts (
@@ -157,6 +174,12 @@ CREATE TABLE contacts (
         REFERENCES users(user_id) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+CREATE INDEX contacts_fname ON contacts(account_id, fname, contact_id)
+    STORING (created_by, updated_by, lname, role_title, email, telephone_number, business_card, tags, created_at, updated_at);
+CREATE INVERTED INDEX contacts_fname_trgm ON contacts(fname gin_trgm_ops);
+CREATE INVERTED INDEX contacts_lname_trgm ON contacts(lname gin_trgm_ops);
+CREATE INVERTED INDEX contacts_email_trgm ON contacts(email gin_trgm_ops);
+
 
 CREATE TABLE opportunities (
     -- pk
@@ -176,6 +199,9 @@ CREATE TABLE opportunities (
     status STRING(20) NULL,
     tags STRING [] NULL DEFAULT ARRAY[],
     -- not in models
+    search_vector TSVECTOR AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(text, ''))
+    ) STORED,
     attachments STRING[] NULL DEFAULT ARRAY[],
     -- PK
     CONSTRAINT pk PRIMARY KEY (account_id, opportunity_id),
@@ -193,7 +219,15 @@ CREATE TABLE opportunities (
         REFERENCES users(user_id) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+CREATE INDEX opportunities_name ON opportunities(account_id, name, opportunity_id)
+    STORING (created_at, updated_at, created_by, updated_by, owned_by, status, due_date, tags);
+CREATE INDEX opportunities_owned_by ON opportunities(owned_by)
+    STORING (status, due_date);
+CREATE INDEX opportunities_status_due_date ON opportunities(status, due_date);
+CREATE INDEX opportunities_due_date ON opportunities(due_date);
+CREATE INDEX opportunities_updated_at ON opportunities(updated_at);
 CREATE INVERTED INDEX opportunity_tags_gin ON opportunities(tags);
+CREATE INVERTED INDEX opportunities_search ON opportunities(search_vector);
 
 
 CREATE TABLE artifact_schemas (
@@ -232,6 +266,9 @@ CREATE TABLE artifacts (
     artifact_schema_id STRING NULL,
     payload JSONB NULL,
     tags STRING [] NULL DEFAULT ARRAY[],
+    -- not in models
+    account_name STRING NULL,
+    opportunity_name STRING NULL,
     -- PK
     CONSTRAINT pk PRIMARY KEY (account_id, opportunity_id, artifact_id),
     -- PK related FK
@@ -246,6 +283,11 @@ CREATE TABLE artifacts (
         REFERENCES users(user_id) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+CREATE INDEX artifacts_name ON artifacts(account_id, opportunity_id, name, artifact_id)
+    STORING (created_at, updated_at, created_by, updated_by, tags);
+CREATE INDEX artifacts_account_name ON artifacts(account_name, account_id, opportunity_name, opportunity_id, name, artifact_id)
+    STORING (created_at, updated_at, created_by, updated_by, tags);
+CREATE INDEX artifacts_updated_at ON artifacts(updated_at);
 CREATE INVERTED INDEX artifact_tags_gin ON artifacts(tags);
 
 
@@ -268,6 +310,11 @@ CREATE TABLE projects (
     status STRING(20) NULL,
     tags STRING [] NULL DEFAULT ARRAY[],
     -- not in models
+    account_name STRING NULL,
+    opportunity_name STRING NULL,
+    search_vector TSVECTOR AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(text, ''))
+    ) STORED,
     attachments STRING[] NULL DEFAULT ARRAY[],
     -- PK
     CONSTRAINT pk PRIMARY KEY (account_id, opportunity_id, project_id),
@@ -285,7 +332,17 @@ CREATE TABLE projects (
         REFERENCES users(user_id) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+CREATE INDEX projects_name ON projects(account_id, opportunity_id, name, project_id)
+    STORING (created_at, updated_at, created_by, updated_by, owned_by, status, due_date, tags);
+CREATE INDEX projects_account_name ON projects(account_name, account_id, opportunity_name, opportunity_id, name, project_id)
+    STORING (created_at, updated_at, created_by, updated_by, owned_by, status, due_date, tags);
+CREATE INDEX projects_owned_by ON projects(owned_by)
+    STORING (status, due_date);
+CREATE INDEX projects_status_due_date ON projects(status, due_date);
+CREATE INDEX projects_due_date ON projects(due_date);
+CREATE INDEX projects_updated_at ON projects(updated_at);
 CREATE INVERTED INDEX projects_tags_gin ON projects(tags);
+CREATE INVERTED INDEX projects_search ON projects(search_vector);
 
 
 CREATE TABLE tasks (
@@ -308,6 +365,10 @@ CREATE TABLE tasks (
     status STRING(20) NULL,
     tags STRING [] NULL DEFAULT ARRAY[],
     -- not in models
+    project_name STRING NULL,
+    search_vector TSVECTOR AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(text, ''))
+    ) STORED,
     attachments STRING[] NULL DEFAULT ARRAY[],
     -- PK
     CONSTRAINT pk PRIMARY KEY (account_id, opportunity_id, project_id, task_id),
@@ -325,7 +386,15 @@ CREATE TABLE tasks (
         REFERENCES users(user_id) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+CREATE INDEX tasks_project_name ON tasks(account_id, opportunity_id, project_name, task_id DESC)
+    STORING (created_at, updated_at, created_by, updated_by, name, owned_by, status, due_date, tags);
+CREATE INDEX tasks_owned_by ON tasks(owned_by)
+    STORING (status, due_date);
+CREATE INDEX tasks_status_due_date ON tasks(status, due_date);
+CREATE INDEX tasks_due_date ON tasks(due_date);
+CREATE INDEX tasks_updated_at ON tasks(updated_at);
 CREATE INVERTED INDEX tasks_tags_gin ON tasks(tags);
+CREATE INVERTED INDEX tasks_search ON tasks(search_vector);
 
 
 CREATE TABLE account_notes (
@@ -343,6 +412,9 @@ CREATE TABLE account_notes (
     text STRING NULL,
     tags STRING [] NULL DEFAULT ARRAY[],
     -- not in models
+    search_vector TSVECTOR AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(text, ''))
+    ) STORED,
     attachments STRING[] NULL DEFAULT ARRAY[],
     -- PK
     CONSTRAINT pk PRIMARY KEY (account_id, note_id),
@@ -356,7 +428,10 @@ CREATE TABLE account_notes (
         REFERENCES users(user_id) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+CREATE INDEX account_notes_name ON account_notes(account_id, name, note_id)
+    STORING (created_at, updated_at, created_by, updated_by);
 CREATE INVERTED INDEX account_notes_tags_gin ON account_notes(tags);
+CREATE INVERTED INDEX account_notes_search ON account_notes(search_vector);
 
 
 CREATE TABLE opportunity_notes (
@@ -375,6 +450,9 @@ CREATE TABLE opportunity_notes (
     text STRING NULL,
     tags STRING [] NULL DEFAULT ARRAY[],
     -- not in models
+    search_vector TSVECTOR AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(text, ''))
+    ) STORED,
     attachments STRING[] NULL DEFAULT ARRAY[],
     -- PK
     CONSTRAINT pk PRIMARY KEY (account_id, opportunity_id, note_id),
@@ -388,7 +466,10 @@ CREATE TABLE opportunity_notes (
         REFERENCES users(user_id) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+CREATE INDEX opportunity_notes_name ON opportunity_notes(account_id, opportunity_id, name, note_id)
+    STORING (created_at, updated_at, created_by, updated_by);
 CREATE INVERTED INDEX opportunity_notes_tags_gin ON opportunity_notes(tags);
+CREATE INVERTED INDEX opportunity_notes_search ON opportunity_notes(search_vector);
 
 
 CREATE TABLE project_notes (
@@ -408,6 +489,9 @@ CREATE TABLE project_notes (
     text STRING NULL,
     tags STRING [] NULL DEFAULT ARRAY[],
     -- not in models
+    search_vector TSVECTOR AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(text, ''))
+    ) STORED,
     attachments STRING[] NULL DEFAULT ARRAY[],
     -- PK
     CONSTRAINT pk PRIMARY KEY (account_id, opportunity_id, project_id, note_id),
@@ -421,7 +505,10 @@ CREATE TABLE project_notes (
         REFERENCES users(user_id) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+CREATE INDEX project_notes_name ON project_notes(account_id, opportunity_id, project_id, name, note_id)
+    STORING (created_at, updated_at, created_by, updated_by);
 CREATE INVERTED INDEX project_notes_tags_gin ON project_notes(tags);
+CREATE INVERTED INDEX project_notes_search ON project_notes(search_vector);
 
 
 
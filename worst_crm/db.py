@@ -1,10 +1,22 @@
-from psycopg_pool import ConnectionPool
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
 from psycopg.types.array import ListDumper
 from psycopg.types.json import Jsonb, JsonbDumper
-from typing import Any
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SET
+from typing import Any, AsyncIterator, Awaitable, Callable, Sequence
 from uuid import UUID
+from weakref import WeakKeyDictionary
+import asyncio
+import datetime as dt
+import logging
 import os
+import random
+import time
 
+from worst_crm import metrics, tracing
 from worst_crm.models import (
     Account,
     AccountFilters,
@@ -13,6 +25,7 @@ from worst_crm.models import (
     AccountNoteInDB,
     AccountNoteOverview,
     AccountOverview,
+    AccountTree,
     Artifact,
     ArtifactFilters,
     ArtifactInDB,
@@ -21,9 +34,13 @@ from worst_crm.models import (
     ArtifactOverviewWithOpportunityName,
     ArtifactSchema,
     ArtifactSchemaInDB,
+    BulkResult,
+    Condition,
     Contact,
     ContactInDB,
     ContactWithAccountName,
+    DueWeekCount,
+    ManagedIndex,
     NoteFilters,
     Opportunity,
     OpportunityFilters,
@@ -33,6 +50,8 @@ from worst_crm.models import (
     OpportunityNoteOverview,
     OpportunityOverview,
     OpportunityOverviewWithAccountName,
+    OwnerWorkload,
+    PipelineStats,
     Project,
     ProjectFilters,
     ProjectInDB,
@@ -42,7 +61,11 @@ from worst_crm.models import (
     ProjectOverview,
     ProjectOverviewWithAccountName,
     ProjectOverviewWithOpportunityName,
+    SearchHit,
+    SlowQuery,
     Status,
+    StatementStats,
+    StatusCount,
     Task,
     TaskFilters,
     TaskInDB,
@@ -50,7 +73,10 @@ from worst_crm.models import (
     TaskOverviewWithProjectName,
 )
 from worst_crm.models import User, UserInDB, UpdatedUserInDB
+from worst_crm.models import build_model_tuple, extend_model
+from worst_crm.models import get_dynamic_model_names, reload_models
 
+logger = logging.getLogger(__name__)
 
 DB_URL = os.getenv("DB_URL")
 
@@ -58,24 +84,84 @@ if not DB_URL:
     raise EnvironmentError("DB_URL env variable not found!")
 
 
-# the pool starts connecting immediately.
-pool = ConnectionPool(DB_URL, kwargs={"autocommit": True})
+async def __configure_connection(conn) -> None:
+    # adapters are registered once, when the pool creates the connection
+    # convert a set to a psycopg list
+    conn.adapters.register_dumper(set, ListDumper)
+    conn.adapters.register_dumper(dict, DictJsonbDumper)
 
 
-def get_watch() -> int:
-    return execute_stmt(
-        "SELECT ts::INT8 FROM WATCH AS OF SYSTEM TIME follower_read_timestamp() LIMIT 1",
-    )[0]
+# the pool is opened by the app on startup, within the running event loop.
+pool = AsyncConnectionPool(
+    DB_URL,
+    kwargs={"autocommit": True},
+    configure=__configure_connection,
+    open=False,
+)
+
+
+async def migrate_watch() -> None:
+    """
+    Re-keys the `watch` table of a database created before the topics,
+    a single row keyed by `id`, by topic: the existing row becomes `models`.
+    """
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            SELECT count(*)
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+                AND table_name = 'watch'
+                AND column_name = 'topic'
+            """
+        )
+        if (await cur.fetchone())[0]:  # type: ignore
+            return
+
+        for stmt in [
+            "ALTER TABLE watch ADD COLUMN IF NOT EXISTS topic STRING NOT NULL DEFAULT 'models'",
+            "ALTER TABLE watch ALTER PRIMARY KEY USING COLUMNS (topic)",
+            # the old primary key is kept as a unique index: dropped with the column
+            "ALTER TABLE watch DROP COLUMN IF EXISTS id CASCADE",
+            "ALTER TABLE watch ALTER COLUMN topic DROP DEFAULT",
+        ]:
+            await conn.execute(stmt)  # type: ignore
+
+
+async def get_watch() -> dict[str, dt.datetime]:
+    rs = await execute_stmt(
+        "SELECT topic, ts FROM watch",
+        is_list=True,
+        name="get_watch",
+    )
+    return {topic: ts for topic, ts in rs or []}
+
+
+async def update_watch(topic: str) -> dt.datetime | None:
+    rs = await execute_stmt(
+        """
+        INSERT INTO watch (topic) 
+        VALUES (%s)
+        ON CONFLICT (topic) DO UPDATE SET ts = now()
+        RETURNING ts""",
+        (topic,),
+        name="update_watch",
+    )
+    return rs[0] if rs else None
 
 
-def update_watch() -> None:
-    # just refresh the entry to update column 'ts'
-    execute_stmt("UPDATE watch SET id=1 WHERE true", returning_rs=False)
+async def notify(channel: str, payload: str) -> None:
+    await execute_stmt(
+        "SELECT pg_notify(%s, %s)",
+        (channel, payload),
+        returning_rs=False,
+        name="notify",
+    )
 
 
-def load_schema(ddl_filename):
+async def load_schema(ddl_filename):
     with open(ddl_filename) as f:
-        execute_stmt(f.read(), returning_rs=False)
+        await execute_stmt(f.read(), returning_rs=False)
 
 
 def get_fields(model) -> str:
@@ -87,51 +173,84 @@ def get_placeholders(model) -> str:
 
 
 # STATUS
-def get_all_account_status() -> list[Status]:
-    return execute_stmt("SELECT name FROM account_status", model=Status, is_list=True)
+async def get_all_account_status() -> list[Status]:
+    return await execute_stmt(
+        "SELECT name FROM account_status",
+        model=Status,
+        is_list=True,
+        name="get_all_account_status",
+    )
 
 
-def create_account_status(status: str):
-    execute_stmt(
-        "UPSERT INTO account_status(name) VALUES (%s)", (status,), returning_rs=False
+async def create_account_status(status: str):
+    await execute_stmt(
+        "UPSERT INTO account_status(name) VALUES (%s)",
+        (status,),
+        returning_rs=False,
+        name="create_account_status",
     )
 
 
-def delete_account_status(status: str):
-    execute_stmt(
-        "DELETE FROM account_status WHERE name = %s", (status,), returning_rs=False
+async def delete_account_status(status: str):
+    await execute_stmt(
+        "DELETE FROM account_status WHERE name = %s",
+        (status,),
+        returning_rs=False,
+        name="delete_account_status",
     )
 
 
-def get_all_project_status() -> list[Status]:
-    return execute_stmt("SELECT name FROM project_status", model=Status, is_list=True)
+async def get_all_project_status() -> list[Status]:
+    return await execute_stmt(
+        "SELECT name FROM project_status",
+        model=Status,
+        is_list=True,
+        name="get_all_project_status",
+    )
 
 
-def create_project_status(status: str):
-    execute_stmt(
-        "UPSERT INTO project_status(name) VALUES (%s)", (status,), returning_rs=False
+async def create_project_status(status: str):
+    await execute_stmt(
+        "UPSERT INTO project_status(name) VALUES (%s)",
+        (status,),
+        returning_rs=False,
+        name="create_project_status",
     )
 
 
-def delete_project_status(status: str):
-    execute_stmt(
-        "DELETE FROM project_status WHERE name = %s", (status,), returning_rs=False
+async def delete_project_status(status: str):
+    await execute_stmt(
+        "DELETE FROM project_status WHERE name = %s",
+        (status,),
+        returning_rs=False,
+        name="delete_project_status",
     )
 
 
-def get_all_task_status() -> list[Status]:
-    return execute_stmt("SELECT name FROM task_status", model=Status, is_list=True)
+async def get_all_task_status() -> list[Status]:
+    return await execute_stmt(
+        "SELECT name FROM task_status",
+        model=Status,
+        is_list=True,
+        name="get_all_task_status",
+    )
 
 
-def create_task_status(status: str):
-    execute_stmt(
-        "UPSERT INTO task_status(name) VALUES (%s)", (status,), returning_rs=False
+async def create_task_status(status: str):
+    await execute_stmt(
+        "UPSERT INTO task_status(name) VALUES (%s)",
+        (status,),
+        returning_rs=False,
+        name="create_task_status",
     )
 
 
-def delete_task_status(status: str):
-    execute_stmt(
-        "DELETE FROM task_status WHERE name = %s", (status,), returning_rs=False
+async def delete_task_status(status: str):
+    await execute_stmt(
+        "DELETE FROM task_status WHERE name = %s",
+        (status,),
+        returning_rs=False,
+        name="delete_task_status",
     )
 
 
@@ -140,9 +259,35 @@ USERS_COLS = get_fields(User)
 USERINDB_COLS = get_fields(UserInDB)
 USERINDB_PLACEHOLDERS = get_placeholders(UserInDB)
 
+# cache of the users authenticated by this process, keyed by user_id.
+# Entries are dropped whenever this process changes the user, and expire
+# after the TTL to pick up changes made by other processes.
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 30))
+__user_cache: dict[str, tuple[float, UserInDB]] = {}
+
+
+def invalidate_cached_user(user_id: str) -> None:
+    __user_cache.pop(user_id, None)
+
+
+async def get_cached_user_with_hash(user_id: str) -> UserInDB | None:
+    cached = __user_cache.get(user_id)
+
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    user = await get_user_with_hash(user_id)
+
+    if user:
+        __user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL_SECONDS, user)
+    else:
+        invalidate_cached_user(user_id)
+
+    return user
 
-def get_all_users() -> list[User]:
-    return execute_stmt(
+
+async def get_all_users() -> list[User]:
+    return await execute_stmt(
         f"""
         SELECT {USERS_COLS} 
         FROM users
@@ -151,11 +296,12 @@ def get_all_users() -> list[User]:
         (),
         User,
         True,
+        name="get_all_users",
     )
 
 
-def get_user_with_hash(user_id: str) -> UserInDB | None:
-    return execute_stmt(
+async def get_user_with_hash(user_id: str) -> UserInDB | None:
+    return await execute_stmt(
         f"""
         select {USERINDB_COLS}
         from users 
@@ -163,11 +309,12 @@ def get_user_with_hash(user_id: str) -> UserInDB | None:
         """,
         (user_id,),
         UserInDB,
+        name="get_user_with_hash",
     )
 
 
-def get_user(user_id: str) -> User | None:
-    return execute_stmt(
+async def get_user(user_id: str) -> User | None:
+    return await execute_stmt(
         f"""
         select {USERS_COLS}
         from users 
@@ -175,11 +322,12 @@ def get_user(user_id: str) -> User | None:
         """,
         (user_id,),
         User,
+        name="get_user",
     )
 
 
-def create_user(user: UserInDB) -> User | None:
-    return execute_stmt(
+async def create_user(user: UserInDB) -> User | None:
+    return await execute_stmt(
         f"""
         insert into users 
             ({USERINDB_COLS})
@@ -189,43 +337,43 @@ def create_user(user: UserInDB) -> User | None:
         """,
         tuple(user.dict().values()),
         User,
+        name="create_user",
     )
 
 
-def increase_failed_attempt_count(user_id: str) -> UserInDB | None:
-    return execute_stmt(
+async def increase_failed_attempt_count(user_id: str) -> UserInDB | None:
+    uid = await execute_stmt(
         f"""update users set
             failed_attempts = failed_attempts +1 
         where user_id = %s
         returning {USERINDB_COLS}""",
         (user_id,),
         UserInDB,
+        name="increase_failed_attempt_count",
     )
 
+    invalidate_cached_user(user_id)
+
+    return uid
 
-def update_user(user_id: str, user: UpdatedUserInDB) -> User | None:
-    old_uid = get_user_with_hash(user_id)
 
-    if old_uid:
-        update_data = user.dict(exclude_unset=True)
+async def update_user(user_id: str, user: UpdatedUserInDB) -> User | None:
+    updated_user = await __update_row(
+        "users",
+        {"user_id": user_id},
+        user.dict(exclude_unset=True),
+        USERS_COLS,
+        User,
+        name="update_user",
+    )
 
-        new_uid = old_uid.copy(update=update_data)
+    invalidate_cached_user(user_id)
 
-        return execute_stmt(
-            f"""
-            update users set 
-            ({USERINDB_COLS}) = 
-                ({USERINDB_PLACEHOLDERS})
-            where user_id  = %s
-            returning {USERS_COLS}
-            """,
-            (*tuple(new_uid.dict().values()), user_id),
-            User,
-        )
+    return updated_user
 
 
-def delete_user(user_id: str) -> User | None:
-    return execute_stmt(
+async def delete_user(user_id: str) -> User | None:
+    deleted_user = await execute_stmt(
         f"""
         delete from users
         where user_id = %s
@@ -233,8 +381,85 @@ def delete_user(user_id: str) -> User | None:
         """,
         (user_id,),
         User,
+        name="delete_user",
     )
 
+    invalidate_cached_user(user_id)
+
+    return deleted_user
+
+
+# FILTERS
+CONDITION_OPERATORS = {
+    "eq": "=",
+    "ne": "<>",
+    "gt": ">",
+    "gte": ">=",
+    "lt": "<",
+    "lte": "<=",
+}
+
+
+def __get_prefix_end(prefix: str) -> str | None:
+    """
+    Returns the smallest string greater than every string starting with prefix,
+    or None if there's no such string.
+    The surrogates, U+D800 to U+DFFF, can't be encoded in UTF-8: they're skipped.
+    """
+    for i in reversed(range(len(prefix))):
+        if ord(prefix[i]) < 0x10FFFF:
+            c = ord(prefix[i]) + 1
+            return prefix[:i] + chr(0xE000 if 0xD800 <= c <= 0xDFFF else c)
+    return None
+
+
+def __get_condition(col: str, cond: Condition, bind_params: list) -> list[str]:
+    """
+    Returns the predicates of the condition, appending their values
+    to bind_params. Every predicate can be served by an index on the column:
+    a prefix is a range, rather than a LIKE pattern.
+    """
+    where: list[str] = []
+
+    for op, operator in CONDITION_OPERATORS.items():
+        v = getattr(cond, op)
+        if v is not None:
+            where.append(f"{col} {operator} %s")
+            bind_params.append(v)
+
+    if cond.in_ is not None:
+        if cond.in_:
+            where.append(f'{col} IN ({ ("%s, " * len(cond.in_))[:-2] })')
+            bind_params += cond.in_
+        else:
+            where.append("false")
+
+    if cond.not_in:
+        where.append(f'{col} NOT IN ({ ("%s, " * len(cond.not_in))[:-2] })')
+        bind_params += cond.not_in
+
+    if cond.prefix:
+        where.append(f"{col} >= %s")
+        bind_params.append(cond.prefix)
+
+        end = __get_prefix_end(cond.prefix)
+        if end:
+            where.append(f"{col} < %s")
+            bind_params.append(end)
+
+    if cond.ilike is not None:
+        where.append(f"{col} ILIKE %s")
+        bind_params.append(cond.ilike)
+
+    if cond.is_null is not None:
+        where.append(f"{col} IS {'' if cond.is_null else 'NOT '}NULL")
+
+    if cond.contains is not None:
+        where.append(f"{col} @> %s")
+        bind_params.append(cond.contains)
+
+    return where
+
 
 def __get_where_clause(
     filters, table_name: str, include_where: bool = True
@@ -248,7 +473,22 @@ def __get_where_clause(
     filters_iter = iter(filters)
 
     for k, v in filters_iter:
-        if v:
+        if k == "where":
+            for col, cond in (v or {}).items():
+                where += __get_condition(f"{table_name}.{col}", cond, bind_params)
+        elif k == "any_of":
+            groups = [
+                " AND ".join(
+                    x
+                    for col, cond in group.items()
+                    for x in __get_condition(f"{table_name}.{col}", cond, bind_params)
+                )
+                or "true"
+                for group in v or []
+            ]
+            if groups:
+                where.append("(" + " OR ".join(f"({x})" for x in groups) + ")")
+        elif v:
             # handling special case 'tags'
             if k == "tags":
                 where.append(f"{table_name}.{k} @> %s")
@@ -273,6 +513,85 @@ def __get_where_clause(
     return (where_clause[:-4], tuple(bind_params))
 
 
+# PAGINATION
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+# rows fetched per round trip by the server-side cursor of the exports
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+# rows written per multi-row UPSERT by the bulk endpoints
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 500))
+# the error reported for a failed row, by SQLSTATE: the driver's message
+# names the constraints and columns, and may quote values of other rows
+BULK_ERRORS = {
+    "22001": "a value is too long",
+    "22P02": "a value has an invalid format",
+    "23502": "a required value is missing",
+    "23503": "a referenced row does not exist",
+    "23505": "the row conflicts with an existing one",
+    "23514": "a value fails a check constraint",
+    "40001": "the transaction conflicted with another one, retry",
+}
+BULK_UNKNOWN_ERROR = "the row could not be written"
+MAX_BULK_SIZE = int(os.getenv("MAX_BULK_SIZE", 10000))
+
+
+def __get_keyset_clause(keyset: tuple, after: list | None) -> tuple[str, tuple]:
+    """
+    Returns the predicate selecting the rows that sort after the `after` values.
+    The keyset is a tuple of (column, model field) pairs, sorted ascending
+    with NULLs first.
+    """
+    if not after:
+        return ("", ())
+
+    cols = [col for col, _ in keyset]
+
+    if None not in after:
+        # a row comparison, which can be served by an index on the keyset
+        return (
+            f"({', '.join(cols)}) > ({('%s, ' * len(cols))[:-2]})",
+            tuple(after),
+        )
+
+    ors: list[str] = []
+    bind_params: list[Any] = []
+
+    for i, col in enumerate(cols):
+        ands: list[str] = []
+
+        for prev_col, prev_value in zip(cols[:i], after[:i]):
+            if prev_value is None:
+                ands.append(f"{prev_col} IS NULL")
+            else:
+                ands.append(f"{prev_col} = %s")
+                bind_params.append(prev_value)
+
+        if after[i] is None:
+            ands.append(f"{col} IS NOT NULL")
+        else:
+            ands.append(f"{col} > %s")
+            bind_params.append(after[i])
+
+        ors.append("(" + " AND ".join(ands) + ")")
+
+    return ("(" + " OR ".join(ors) + ")", tuple(bind_params))
+
+
+def get_order_by(keyset: tuple) -> str:
+    return ", ".join([col for col, _ in keyset])
+
+
+# BOUNDED STALENESS
+# list queries accept a `staleness`: reading data that old, rather than
+# the latest, lets CockroachDB serve them from the nearest replica
+# instead of the leaseholder, possibly in another region
+def __get_as_of_clause(staleness: dt.timedelta | None) -> str:
+    if not staleness:
+        return ""
+
+    return f"AS OF SYSTEM TIME '-{int(staleness / dt.timedelta(milliseconds=1))}ms'"
+
+
 # ADMIN/MODELS
 def get_type(x):
     """
@@ -286,17 +605,19 @@ def get_type(x):
     }.get(x, None)
 
 
-def get_model(name: str) -> dict:
-    return execute_stmt(
+async def get_model(name: str) -> dict:
+    rs = await execute_stmt(
         """
         SELECT model_def 
         FROM models
         WHERE name = %s""",
         (name,),
-    )[0]
+        name="get_model",
+    )
+    return rs[0]
 
 
-def update_model(name: str, model: dict) -> dict:
+async def update_model(name: str, model: dict) -> dict:
     def get_table_name(x):
         return {
             "account": "accounts",
@@ -310,7 +631,7 @@ def update_model(name: str, model: dict) -> dict:
             "contact": "contacts",
         }[x]
 
-    old_model = get_model(name)
+    old_model = await get_model(name)
 
     additions = {}
     removals = {}
@@ -330,7 +651,7 @@ def update_model(name: str, model: dict) -> dict:
 
     # drop column stmts have to be executed in their own transaction
     for x in removals.keys():
-        execute_stmt(
+        await execute_stmt(
             f"""SET sql_safe_updates = false;
             ALTER TABLE {get_table_name(name)} DROP COLUMN {x};
             SET sql_safe_updates = true;
@@ -339,53 +660,266 @@ def update_model(name: str, model: dict) -> dict:
         )
 
     for x, y in additions.items():
-        execute_stmt(
+        await execute_stmt(
             f"ALTER TABLE {get_table_name(name)} ADD COLUMN {x} {get_type(y['type'])};",
             returning_rs=False,
         )
 
-    new_model = execute_stmt(
+    rs = await execute_stmt(
         """UPDATE models 
         SET model_def = %s 
         WHERE name = %s 
         RETURNING model_def""",
         (model, name),
-    )[0]
+    )
+    new_model = rs[0]
 
-    # trigger async App restart
-    update_watch()
+    # the prepared statements refer to the old columns
+    invalidate_statements()
 
     return new_model
 
 
+async def get_model_defs(names: list[str]) -> dict[str, dict]:
+    rs = await execute_stmt(
+        """
+        SELECT name, model_def 
+        FROM models
+        WHERE name = ANY (%s)""",
+        (names,),
+        is_list=True,
+        name="get_model_defs",
+    )
+    return {name: model_def for name, model_def in rs}
+
+
+async def refresh_models() -> None:
+    model_defs = await get_model_defs(get_dynamic_model_names())
+
+    # no await from here on, so no request runs
+    # with the new models and the old columns, or vice versa
+    reload_models(model_defs)
+    refresh_columns()
+
+
+def refresh_columns() -> None:
+    """
+    Recomputes the column lists of the dynamic models,
+    after their fields were reloaded
+    """
+    global ACCOUNT_IN_DB_COLS, ACCOUNT_IN_DB_PLACEHOLDERS, ACCOUNT_OVERVIEW_COLS
+    global ACCOUNTS_COLS, CONTACT_IN_DB_COLS, CONTACT_IN_DB_PLACEHOLDERS
+    global CONTACT_OVERVIEW_COLS, CONTACT_COLS, OPPORTUNITY_IN_DB_COLS
+    global OPPORTUNITY_IN_DB_PLACEHOLDERS, OPPORTUNITY_OVERVIEW_COLS
+    global OPPORTUNITIES_COLS, ARTIFACT_IN_DB_COLS, ARTIFACT_IN_DB_PLACEHOLDERS
+    global ARTIFACT_OVERVIEW_COLS, ARTIFACTS_COLS, PROJECT_IN_DB_COLS
+    global PROJECT_IN_DB_PLACEHOLDERS, PROJECT_OVERVIEW_COLS, PROJECTS_COLS
+    global TASK_IN_DB_COLS, TASK_IN_DB_PLACEHOLDERS, TASK_OVERVIEW_COLS, TASKS_COLS
+
+    ACCOUNT_IN_DB_COLS = get_fields(AccountInDB)
+    ACCOUNT_IN_DB_PLACEHOLDERS = get_placeholders(AccountInDB)
+    ACCOUNT_OVERVIEW_COLS = get_fields(AccountOverview)
+    ACCOUNTS_COLS = get_fields(Account)
+
+    CONTACT_IN_DB_COLS = get_fields(ContactInDB)
+    CONTACT_IN_DB_PLACEHOLDERS = get_placeholders(ContactInDB)
+    CONTACT_OVERVIEW_COLS = get_fields(Contact)
+    CONTACT_COLS = get_fields(Contact)
+
+    OPPORTUNITY_IN_DB_COLS = get_fields(OpportunityInDB)
+    OPPORTUNITY_IN_DB_PLACEHOLDERS = get_placeholders(OpportunityInDB)
+    OPPORTUNITY_OVERVIEW_COLS = get_fields(OpportunityOverview)
+    OPPORTUNITIES_COLS = get_fields(Opportunity)
+
+    ARTIFACT_IN_DB_COLS = get_fields(ArtifactInDB)
+    ARTIFACT_IN_DB_PLACEHOLDERS = get_placeholders(ArtifactInDB)
+    ARTIFACT_OVERVIEW_COLS = get_fields(ArtifactOverview)
+    ARTIFACTS_COLS = get_fields(Artifact)
+
+    PROJECT_IN_DB_COLS = get_fields(ProjectInDB)
+    PROJECT_IN_DB_PLACEHOLDERS = get_placeholders(ProjectInDB)
+    PROJECT_OVERVIEW_COLS = get_fields(ProjectOverview)
+    PROJECTS_COLS = get_fields(Project)
+
+    TASK_IN_DB_COLS = get_fields(TaskInDB)
+    TASK_IN_DB_PLACEHOLDERS = get_placeholders(TaskInDB)
+    TASK_OVERVIEW_COLS = get_fields(TaskOverview)
+    TASKS_COLS = get_fields(Task)
+
+    # the mappers and the prepared statements were built on the old columns
+    __mappers.clear()
+    invalidate_statements()
+
+
+# PARENT NAMES
+# The names of the parents are copied into the child rows, so the overviews
+# are read from a single table, without joins.
+# Children are written with the current names of their parents. When a parent
+# is renamed, the new name is propagated to its children in the background,
+# PARENT_NAMES_BATCH_SIZE rows per transaction: until then, the children
+# show the old name.
+# A propagation interrupted by a restart is caught up by migrate_indexes(),
+# which checks every child: with SYNC_PARENT_NAMES_ON_STARTUP, each instance
+# also does it when it starts, at the cost of a scan of the child tables.
+PARENT_NAMES_BATCH_SIZE = int(os.getenv("PARENT_NAMES_BATCH_SIZE", 1000))
+SYNC_PARENT_NAMES_ON_STARTUP = (
+    True
+    if os.getenv("SYNC_PARENT_NAMES_ON_STARTUP", "False").lower()
+    in ["true", "1", "t", "y", "yes", "on"]
+    else False
+)
+
+# child table: {name column: (parent table, parent key)}
+PARENT_NAMES: dict[str, dict[str, tuple[str, tuple[str, ...]]]] = {
+    "artifacts": {
+        "account_name": ("accounts", ("account_id",)),
+        "opportunity_name": ("opportunities", ("account_id", "opportunity_id")),
+    },
+    "projects": {
+        "account_name": ("accounts", ("account_id",)),
+        "opportunity_name": ("opportunities", ("account_id", "opportunity_id")),
+    },
+    "tasks": {
+        "project_name": ("projects", ("account_id", "opportunity_id", "project_id")),
+    },
+}
+
+PARENT_TABLES = {
+    parent for names in PARENT_NAMES.values() for parent, _ in names.values()
+}
+
+# keep a reference to the propagation tasks so they are not garbage collected
+__propagations: set[asyncio.Task] = set()
+
+
+def __get_parent_names(table_name: str, row: Any) -> tuple[list[str], list[str], tuple]:
+    """
+    Returns the name columns of the child table, the subqueries reading
+    the names from the parents, and the bind params of the subqueries for row.
+    """
+    cols: list[str] = []
+    subqueries: list[str] = []
+    bind_params: list[Any] = []
+
+    for col, (parent, key) in PARENT_NAMES.get(table_name, {}).items():
+        cols.append(col)
+        subqueries.append(
+            f"(SELECT name FROM {parent} "
+            f"WHERE ({', '.join(key)}) = ({('%s, ' * len(key))[:-2]}))"
+        )
+        bind_params += [getattr(row, x) for x in key]
+
+    return (cols, subqueries, tuple(bind_params))
+
+
+async def sync_parent_names(
+    parent_table: str | None = None, keys: list[dict[str, Any]] | None = None
+) -> None:
+    """
+    Copies the current names of the parents into the children where they differ.
+    With keys, only the children of those parents are checked: otherwise,
+    all the children of parent_table, or of every parent table.
+    Unlike execute_stmt(), errors are raised: a failed batch must not
+    end the sync as if all the names were up to date.
+    """
+    for table_name, names in PARENT_NAMES.items():
+        for col, (parent, parent_key) in names.items():
+            if parent_table and parent != parent_table:
+                continue
+
+            join = " AND ".join([f"{table_name}.{x} = p.{x}" for x in parent_key])
+            where = "true"
+            bind_params: tuple = ()
+            if keys:
+                cols = ", ".join([f"p.{x}" for x in parent_key])
+                row = f"({('%s, ' * len(parent_key))[:-2]})"
+                where = f"({cols}) IN ({', '.join([row] * len(keys))})"
+                bind_params = tuple(k[x] for k in keys for x in parent_key)
+
+            while True:
+                async with pool.connection() as conn:
+                    cur = await conn.execute(
+                        f"""
+                        UPDATE {table_name} SET
+                            {col} = p.name
+                        FROM {parent} AS p
+                        WHERE {join} AND {where}
+                            AND {table_name}.{col} IS DISTINCT FROM p.name
+                        LIMIT %s
+                        """,  # type: ignore
+                        bind_params + (PARENT_NAMES_BATCH_SIZE,),
+                    )
+
+                if cur.rowcount < PARENT_NAMES_BATCH_SIZE:
+                    break
+
+
+def __propagate_parent_names(parent_table: str, keys: list[dict[str, Any]]) -> None:
+    if not keys:
+        return
+
+    task = asyncio.create_task(sync_parent_names(parent_table, keys))
+    __propagations.add(task)
+    task.add_done_callback(__propagations.discard)
+
+
 # ACCOUNTS
 ACCOUNT_IN_DB_COLS = get_fields(AccountInDB)
 ACCOUNT_IN_DB_PLACEHOLDERS = get_placeholders(AccountInDB)
 ACCOUNT_OVERVIEW_COLS = get_fields(AccountOverview)
 ACCOUNTS_COLS = get_fields(Account)
+ACCOUNTS_KEYSET = (("accounts.name", "name"), ("accounts.account_id", "account_id"))
 
 
 def add_model_accounts(d):
     pass
 
 
-def get_all_accounts(account_filters: AccountFilters | None) -> list[AccountOverview]:
-    where_clause, bind_params = __get_where_clause(account_filters, "accounts")
-    return execute_stmt(
+async def get_all_accounts(
+    account_filters: AccountFilters | None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: list | None = None,
+    staleness: dt.timedelta | None = None,
+) -> list[AccountOverview]:
+    where_clause, bind_params = __get_where_clause(
+        account_filters, "accounts", include_where=False
+    )
+    keyset_clause, keyset_params = __get_keyset_clause(ACCOUNTS_KEYSET, after)
+
+    return await execute_stmt(
         f"""
         SELECT {ACCOUNT_OVERVIEW_COLS}
         FROM accounts
-        {where_clause} 
-        ORDER BY name
+        {__get_as_of_clause(staleness)}
+        WHERE {where_clause or 'true'} AND {keyset_clause or 'true'}
+        ORDER BY {get_order_by(ACCOUNTS_KEYSET)}
+        LIMIT %s
         """,
-        bind_params,
+        bind_params + keyset_params + (limit,),
         AccountOverview,
         True,
+        name="get_all_accounts",
+    )
+
+
+def stream_all_accounts(
+    account_filters: AccountFilters | None,
+) -> AsyncIterator[dict[str, Any]]:
+    where_clause, bind_params = __get_where_clause(account_filters, "accounts")
+
+    return stream_stmt(
+        f"""
+        SELECT {ACCOUNT_OVERVIEW_COLS}
+        FROM accounts
+        {where_clause}
+        ORDER BY {get_order_by(ACCOUNTS_KEYSET)}
+        """,
+        bind_params,
     )
 
 
-def get_account(account_id: UUID) -> Account | None:
-    return execute_stmt(
+async def get_account(account_id: UUID) -> Account | None:
+    return await execute_stmt(
         f"""
         SELECT {ACCOUNTS_COLS} 
         FROM accounts 
@@ -393,11 +927,12 @@ def get_account(account_id: UUID) -> Account | None:
         """,
         (account_id,),
         Account,
+        name="get_account",
     )
 
 
-def create_account(account_in_db: AccountInDB) -> Account | None:
-    return execute_stmt(
+async def create_account(account_in_db: AccountInDB) -> Account | None:
+    return await execute_stmt(
         f"""
         INSERT INTO accounts 
             ({ACCOUNT_IN_DB_COLS})
@@ -407,34 +942,40 @@ def create_account(account_in_db: AccountInDB) -> Account | None:
         """,
         tuple(account_in_db.dict().values()),
         Account,
+        name="create_account",
     )
 
 
-def update_account(account_in_db: AccountInDB) -> Account | None:
-    if account_in_db.account_id:
-        old_acc = get_account(account_in_db.account_id)
-    else:
+async def bulk_upsert_accounts(accounts_in_db: list[AccountInDB]) -> list[BulkResult]:
+    return await __bulk_upsert("accounts", ("account_id",), accounts_in_db)
+
+
+async def update_account(
+    account_in_db: AccountInDB, expected_updated_at: dt.datetime | None = None
+) -> Account | None:
+    if not account_in_db.account_id:
         return None
 
-    if old_acc:
-        old_acc = AccountInDB(**old_acc.dict())
-        update_data = account_in_db.dict(exclude_unset=True)
-        new_acc = old_acc.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE accounts SET 
-                ({ACCOUNT_IN_DB_COLS}) = ({ACCOUNT_IN_DB_PLACEHOLDERS})
-            WHERE account_id = %s
-            RETURNING {ACCOUNTS_COLS}
-            """,
-            (*tuple(new_acc.dict().values()), account_in_db.account_id),
-            Account,
-        )
+    pk = {"account_id": account_in_db.account_id}
+
+    updated_account = await __update_row(
+        "accounts",
+        pk,
+        account_in_db.dict(exclude_unset=True),
+        ACCOUNTS_COLS,
+        Account,
+        expected_updated_at,
+        name="update_account",
+    )
+
+    if updated_account and "name" in account_in_db.__fields_set__:
+        __propagate_parent_names("accounts", [pk])
 
+    return updated_account
 
-def delete_account(account_id: UUID) -> Account | None:
-    return execute_stmt(
+
+async def delete_account(account_id: UUID) -> Account | None:
+    return await execute_stmt(
         f"""
         DELETE FROM accounts
         WHERE account_id = %s
@@ -442,11 +983,12 @@ def delete_account(account_id: UUID) -> Account | None:
         """,
         (account_id,),
         Account,
+        name="delete_account",
     )
 
 
-def add_account_attachment(account_id: UUID, s3_object_name: str) -> None:
-    return execute_stmt(
+async def add_account_attachment(account_id: UUID, s3_object_name: str) -> None:
+    return await execute_stmt(
         """
         UPDATE accounts SET
             attachments = array_append(attachments, %s)
@@ -454,11 +996,12 @@ def add_account_attachment(account_id: UUID, s3_object_name: str) -> None:
         """,
         (s3_object_name, account_id),
         returning_rs=False,
+        name="add_account_attachment",
     )
 
 
-def remove_account_attachment(account_id: UUID, s3_object_name: str) -> None:
-    return execute_stmt(
+async def remove_account_attachment(account_id: UUID, s3_object_name: str) -> None:
+    return await execute_stmt(
         """
         UPDATE accounts SET
             attachments = array_remove(attachments, %s)
@@ -466,6 +1009,7 @@ def remove_account_attachment(account_id: UUID, s3_object_name: str) -> None:
         """,
         (s3_object_name, account_id),
         returning_rs=False,
+        name="remove_account_attachment",
     )
 
 
@@ -474,40 +1018,59 @@ CONTACT_IN_DB_COLS = get_fields(ContactInDB)
 CONTACT_IN_DB_PLACEHOLDERS = get_placeholders(ContactInDB)
 CONTACT_OVERVIEW_COLS = get_fields(Contact)
 CONTACT_COLS = get_fields(Contact)
+CONTACTS_KEYSET = (
+    ("accounts.name", "account_name"),
+    ("contacts.account_id", "account_id"),
+    ("contacts.fname", "fname"),
+    ("contacts.contact_id", "contact_id"),
+)
 
 
-def get_all_contacts() -> list[ContactWithAccountName]:
+async def get_all_contacts(
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: list | None = None,
+    staleness: dt.timedelta | None = None,
+) -> list[ContactWithAccountName]:
     fully_qualified = ", ".join([f"contacts.{x}" for x in Contact.__fields__.keys()])
+    keyset_clause, keyset_params = __get_keyset_clause(CONTACTS_KEYSET, after)
 
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT {fully_qualified}, accounts.name AS account_name
         FROM accounts JOIN contacts
             ON accounts.account_id = contacts.account_id
-        ORDER BY account_name, contacts.fname
+        {__get_as_of_clause(staleness)}
+        WHERE {keyset_clause or 'true'}
+        ORDER BY {get_order_by(CONTACTS_KEYSET)}
+        LIMIT %s
         """,
-        (),
+        keyset_params + (limit,),
         ContactWithAccountName,
         True,
+        name="get_all_contacts",
     )
 
 
-def get_all_contacts_for_account_id(account_id: UUID) -> list[Contact]:
-    return execute_stmt(
+async def get_all_contacts_for_account_id(
+    account_id: UUID, staleness: dt.timedelta | None = None
+) -> list[Contact]:
+    return await execute_stmt(
         f"""
         SELECT {CONTACT_COLS}
         FROM contacts
+        {__get_as_of_clause(staleness)}
         WHERE account_id = %s
         ORDER BY fname
         """,
         (account_id,),
         Contact,
         True,
+        name="get_all_contacts_for_account_id",
     )
 
 
-def get_contact(account_id: UUID, contact_id: UUID) -> Contact | None:
-    return execute_stmt(
+async def get_contact(account_id: UUID, contact_id: UUID) -> Contact | None:
+    return await execute_stmt(
         f"""
         SELECT {CONTACT_COLS}
         FROM contacts 
@@ -515,11 +1078,12 @@ def get_contact(account_id: UUID, contact_id: UUID) -> Contact | None:
         """,
         (account_id, contact_id),
         Contact,
+        name="get_contact",
     )
 
 
-def create_contact(contact_in_db: ContactInDB) -> Contact | None:
-    return execute_stmt(
+async def create_contact(contact_in_db: ContactInDB) -> Contact | None:
+    return await execute_stmt(
         f"""
         INSERT INTO contacts 
             ({CONTACT_IN_DB_COLS})
@@ -529,38 +1093,36 @@ def create_contact(contact_in_db: ContactInDB) -> Contact | None:
         """,
         tuple(contact_in_db.dict().values()),
         Contact,
+        name="create_contact",
     )
 
 
-def update_contact(contact_in_db: ContactInDB) -> Contact | None:
-    if contact_in_db.contact_id:
-        old_contact = get_contact(contact_in_db.account_id, contact_in_db.contact_id)
-    else:
+async def bulk_upsert_contacts(contacts_in_db: list[ContactInDB]) -> list[BulkResult]:
+    return await __bulk_upsert("contacts", ("account_id", "contact_id"), contacts_in_db)
+
+
+async def update_contact(
+    contact_in_db: ContactInDB, expected_updated_at: dt.datetime | None = None
+) -> Contact | None:
+    if not contact_in_db.contact_id:
         return None
 
-    if old_contact:
-        old_contact = ContactInDB(**old_contact.dict())
-        update_data = contact_in_db.dict(exclude_unset=True)
-        new_contact = old_contact.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE contacts SET 
-                ({CONTACT_IN_DB_COLS}) = ({CONTACT_IN_DB_PLACEHOLDERS})
-            WHERE (account_id, contact_id) = (%s, %s)
-            RETURNING {CONTACT_COLS}
-            """,
-            (
-                *tuple(new_contact.dict().values()),
-                contact_in_db.account_id,
-                contact_in_db.contact_id,
-            ),
-            Contact,
-        )
+    return await __update_row(
+        "contacts",
+        {
+            "account_id": contact_in_db.account_id,
+            "contact_id": contact_in_db.contact_id,
+        },
+        contact_in_db.dict(exclude_unset=True),
+        CONTACT_COLS,
+        Contact,
+        expected_updated_at,
+        name="update_contact",
+    )
 
 
-def delete_contact(account_id: UUID, contact_id: UUID) -> Contact | None:
-    return execute_stmt(
+async def delete_contact(account_id: UUID, contact_id: UUID) -> Contact | None:
+    return await execute_stmt(
         f"""
         DELETE FROM contacts
         WHERE (account_id, contact_id) = (%s, %s)
@@ -568,6 +1130,7 @@ def delete_contact(account_id: UUID, contact_id: UUID) -> Contact | None:
         """,
         (account_id, contact_id),
         Contact,
+        name="delete_contact",
     )
 
 
@@ -576,11 +1139,48 @@ OPPORTUNITY_IN_DB_COLS = get_fields(OpportunityInDB)
 OPPORTUNITY_IN_DB_PLACEHOLDERS = get_placeholders(OpportunityInDB)
 OPPORTUNITY_OVERVIEW_COLS = get_fields(OpportunityOverview)
 OPPORTUNITIES_COLS = get_fields(Opportunity)
+OPPORTUNITIES_KEYSET = (
+    ("accounts.name", "account_name"),
+    ("opportunities.account_id", "account_id"),
+    ("opportunities.name", "name"),
+    ("opportunities.opportunity_id", "opportunity_id"),
+)
 
 
-def get_all_opportunities(
+async def get_all_opportunities(
     opportunity_filters: OpportunityFilters | None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: list | None = None,
+    staleness: dt.timedelta | None = None,
 ) -> list[OpportunityOverviewWithAccountName]:
+    where_clause, bind_params = __get_where_clause(
+        opportunity_filters, table_name="opportunities", include_where=False
+    )
+    keyset_clause, keyset_params = __get_keyset_clause(OPPORTUNITIES_KEYSET, after)
+
+    fully_qualified = ", ".join(
+        [f"opportunities.{x}" for x in OpportunityOverview.__fields__.keys()]
+    )
+    return await execute_stmt(
+        f"""
+        SELECT {fully_qualified}, accounts.name AS account_name
+        FROM accounts JOIN opportunities
+            ON accounts.account_id = opportunities.account_id
+        {__get_as_of_clause(staleness)}
+        WHERE {where_clause or 'true'} AND {keyset_clause or 'true'}
+        ORDER BY {get_order_by(OPPORTUNITIES_KEYSET)}
+        LIMIT %s
+        """,
+        bind_params + keyset_params + (limit,),
+        OpportunityOverviewWithAccountName,
+        True,
+        name="get_all_opportunities",
+    )
+
+
+def stream_all_opportunities(
+    opportunity_filters: OpportunityFilters | None,
+) -> AsyncIterator[dict[str, Any]]:
     where_clause, bind_params = __get_where_clause(
         opportunity_filters, table_name="opportunities"
     )
@@ -588,36 +1188,38 @@ def get_all_opportunities(
     fully_qualified = ", ".join(
         [f"opportunities.{x}" for x in OpportunityOverview.__fields__.keys()]
     )
-    return execute_stmt(
+    return stream_stmt(
         f"""
         SELECT {fully_qualified}, accounts.name AS account_name
         FROM accounts JOIN opportunities
             ON accounts.account_id = opportunities.account_id
         {where_clause}
-        ORDER BY account_name, opportunities.name
+        ORDER BY {get_order_by(OPPORTUNITIES_KEYSET)}
         """,
         bind_params,
-        OpportunityOverviewWithAccountName,
-        True,
     )
 
 
-def get_all_opportunities_for_account_id(account_id: UUID) -> list[OpportunityOverview]:
-    return execute_stmt(
+async def get_all_opportunities_for_account_id(
+    account_id: UUID, staleness: dt.timedelta | None = None
+) -> list[OpportunityOverview]:
+    return await execute_stmt(
         f"""
         SELECT {OPPORTUNITY_OVERVIEW_COLS}
         FROM opportunities
+        {__get_as_of_clause(staleness)}
         WHERE account_id = %s
         ORDER BY name
         """,
         (account_id,),
         OpportunityOverview,
         True,
+        name="get_all_opportunities_for_account_id",
     )
 
 
-def get_opportunity(account_id: UUID, opportunity_id: UUID) -> Opportunity | None:
-    return execute_stmt(
+async def get_opportunity(account_id: UUID, opportunity_id: UUID) -> Opportunity | None:
+    return await execute_stmt(
         f"""
         SELECT {OPPORTUNITIES_COLS}
         FROM opportunities 
@@ -625,11 +1227,12 @@ def get_opportunity(account_id: UUID, opportunity_id: UUID) -> Opportunity | Non
         """,
         (account_id, opportunity_id),
         Opportunity,
+        name="get_opportunity",
     )
 
 
-def create_opportunity(opportunity_in_db: OpportunityInDB) -> Opportunity | None:
-    return execute_stmt(
+async def create_opportunity(opportunity_in_db: OpportunityInDB) -> Opportunity | None:
+    return await execute_stmt(
         f"""
         INSERT INTO opportunities 
             ({OPPORTUNITY_IN_DB_COLS})
@@ -639,40 +1242,49 @@ def create_opportunity(opportunity_in_db: OpportunityInDB) -> Opportunity | None
         """,
         tuple(opportunity_in_db.dict().values()),
         Opportunity,
+        name="create_opportunity",
     )
 
 
-def update_opportunity(opportunity_in_db: OpportunityInDB) -> Opportunity | None:
-    if opportunity_in_db.opportunity_id:
-        old_opp = get_opportunity(
-            opportunity_in_db.account_id, opportunity_in_db.opportunity_id
-        )
-    else:
+async def bulk_upsert_opportunities(
+    opportunities_in_db: list[OpportunityInDB],
+) -> list[BulkResult]:
+    return await __bulk_upsert(
+        "opportunities", ("account_id", "opportunity_id"), opportunities_in_db
+    )
+
+
+async def update_opportunity(
+    opportunity_in_db: OpportunityInDB, expected_updated_at: dt.datetime | None = None
+) -> Opportunity | None:
+    if not opportunity_in_db.opportunity_id:
         return None
 
-    if old_opp:
-        old_opp = OpportunityInDB(**old_opp.dict())
-        update_data = opportunity_in_db.dict(exclude_unset=True)
-        new_opp = old_opp.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE opportunities SET 
-                ({OPPORTUNITY_IN_DB_COLS}) = ({OPPORTUNITY_IN_DB_PLACEHOLDERS})
-            WHERE (account_id, opportunity_id) = (%s, %s)
-            RETURNING {OPPORTUNITIES_COLS}
-            """,
-            (
-                *tuple(new_opp.dict().values()),
-                opportunity_in_db.account_id,
-                opportunity_in_db.opportunity_id,
-            ),
-            Opportunity,
-        )
+    pk = {
+        "account_id": opportunity_in_db.account_id,
+        "opportunity_id": opportunity_in_db.opportunity_id,
+    }
+
+    updated_opportunity = await __update_row(
+        "opportunities",
+        pk,
+        opportunity_in_db.dict(exclude_unset=True),
+        OPPORTUNITIES_COLS,
+        Opportunity,
+        expected_updated_at,
+        name="update_opportunity",
+    )
 
+    if updated_opportunity and "name" in opportunity_in_db.__fields_set__:
+        __propagate_parent_names("opportunities", [pk])
 
-def delete_opportunity(account_id: UUID, opportunity_id: UUID) -> Opportunity | None:
-    return execute_stmt(
+    return updated_opportunity
+
+
+async def delete_opportunity(
+    account_id: UUID, opportunity_id: UUID
+) -> Opportunity | None:
+    return await execute_stmt(
         f"""
         DELETE FROM opportunities
         WHERE (account_id, opportunity_id) = (%s, %s)
@@ -680,13 +1292,14 @@ def delete_opportunity(account_id: UUID, opportunity_id: UUID) -> Opportunity |
         """,
         (account_id, opportunity_id),
         Opportunity,
+        name="delete_opportunity",
     )
 
 
-def add_opportunity_attachment(
+async def add_opportunity_attachment(
     account_id: UUID, opportunity_id: UUID, s3_object_name: str
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE opportunities SET
             attachments = array_append(attachments, %s)
@@ -694,13 +1307,14 @@ def add_opportunity_attachment(
         """,
         (s3_object_name, account_id, opportunity_id),
         returning_rs=False,
+        name="add_opportunity_attachment",
     )
 
 
-def remove_opportunity_attachment(
+async def remove_opportunity_attachment(
     account_id: UUID, opportunity_id: UUID, s3_object_name: str
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE opportunities SET
             attachments = array_remove(attachments, %s)
@@ -708,6 +1322,7 @@ def remove_opportunity_attachment(
         """,
         (s3_object_name, account_id, opportunity_id),
         returning_rs=False,
+        name="remove_opportunity_attachment",
     )
 
 
@@ -717,8 +1332,8 @@ ARTIFACT_SCHEMA_IN_DB_PLACEHOLDERS = get_placeholders(ArtifactSchemaInDB)
 ARTIFACT_SCHEMAS_COLS = get_fields(ArtifactSchema)
 
 
-def get_all_artifact_schemas() -> list[ArtifactSchema]:
-    return execute_stmt(
+async def get_all_artifact_schemas() -> list[ArtifactSchema]:
+    return await execute_stmt(
         f"""
         SELECT {ARTIFACT_SCHEMAS_COLS}
         FROM artifact_schemas
@@ -727,11 +1342,12 @@ def get_all_artifact_schemas() -> list[ArtifactSchema]:
         (),
         ArtifactSchema,
         True,
+        name="get_all_artifact_schemas",
     )
 
 
-def get_artifact_schema(artifact_schema_id: str) -> ArtifactSchema | None:
-    return execute_stmt(
+async def get_artifact_schema(artifact_schema_id: str) -> ArtifactSchema | None:
+    return await execute_stmt(
         f"""
         SELECT {ARTIFACT_SCHEMAS_COLS}
         FROM artifact_schemas 
@@ -739,13 +1355,14 @@ def get_artifact_schema(artifact_schema_id: str) -> ArtifactSchema | None:
         """,
         (artifact_schema_id,),
         ArtifactSchema,
+        name="get_artifact_schema",
     )
 
 
-def create_artifact_schema(
+async def create_artifact_schema(
     artifact_schema_in_db: ArtifactSchemaInDB,
 ) -> ArtifactSchema | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         INSERT INTO artifact_schemas 
             ({ARTIFACT_SCHEMA_IN_DB_COLS})
@@ -755,39 +1372,34 @@ def create_artifact_schema(
         """,
         tuple(artifact_schema_in_db.dict().values()),
         ArtifactSchema,
+        name="create_artifact_schema",
     )
 
 
-def update_artifact_schema(
+async def update_artifact_schema(
     artifact_schema_in_db: ArtifactSchemaInDB,
+    expected_updated_at: dt.datetime | None = None,
 ) -> ArtifactSchema | None:
-    if artifact_schema_in_db.artifact_schema_id:
-        old_art = get_artifact_schema(artifact_schema_in_db.artifact_schema_id)
-    else:
+    if not artifact_schema_in_db.artifact_schema_id:
         return None
 
-    if old_art:
-        old_art = ArtifactSchemaInDB(**old_art.dict())
-        update_data = artifact_schema_in_db.dict(exclude_unset=True)
-        new_art = old_art.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE artifact_schemas SET 
-                ({ARTIFACT_SCHEMA_IN_DB_COLS}) = ({ARTIFACT_SCHEMA_IN_DB_PLACEHOLDERS})
-            WHERE artifact_schema_id = %s
-            RETURNING {ARTIFACT_SCHEMAS_COLS}
-            """,
-            (
-                *tuple(new_art.dict().values()),
-                new_art.artifact_schema_id,
-            ),
-            ArtifactSchema,
-        )
+    artifact_schema = await __update_row(
+        "artifact_schemas",
+        {"artifact_schema_id": artifact_schema_in_db.artifact_schema_id},
+        artifact_schema_in_db.dict(exclude_unset=True),
+        ARTIFACT_SCHEMAS_COLS,
+        ArtifactSchema,
+        expected_updated_at,
+        name="update_artifact_schema",
+    )
+
+    invalidate_artifact_validators(artifact_schema_in_db.artifact_schema_id)
 
+    return artifact_schema
 
-def delete_artifact_schema(artifact_schema_id: str) -> ArtifactSchema | None:
-    return execute_stmt(
+
+async def delete_artifact_schema(artifact_schema_id: str) -> ArtifactSchema | None:
+    artifact_schema = await execute_stmt(
         f"""
         DELETE FROM artifact_schemas
         WHERE artifact_schema_id = %s
@@ -795,50 +1407,134 @@ def delete_artifact_schema(artifact_schema_id: str) -> ArtifactSchema | None:
         """,
         (artifact_schema_id,),
         ArtifactSchema,
+        name="delete_artifact_schema",
     )
 
+    invalidate_artifact_validators(artifact_schema_id)
+
+    return artifact_schema
+
+
+# LRU cache of the models validating the artifact payloads, compiled
+# from the artifact schemas. The key includes `updated_at`, so a schema
+# updated by another process gets a new entry.
+ARTIFACT_VALIDATORS_CACHE_SIZE = int(os.getenv("ARTIFACT_VALIDATORS_CACHE_SIZE", 256))
+__artifact_validators: OrderedDict[
+    tuple[str, dt.datetime], type[BaseModel]
+] = OrderedDict()
+
+
+def invalidate_artifact_validators(artifact_schema_id: str) -> None:
+    for k in [k for k in __artifact_validators if k[0] == artifact_schema_id]:
+        del __artifact_validators[k]
+
+
+async def get_artifact_validator(artifact_schema_id: str) -> type[BaseModel] | None:
+    artifact_schema = await get_artifact_schema(artifact_schema_id)
+
+    if not artifact_schema:
+        return None
+
+    key = (artifact_schema_id, artifact_schema.updated_at)
+    validator = __artifact_validators.get(key)
+
+    if validator:
+        __artifact_validators.move_to_end(key)
+    else:
+        # a schema updated by another process leaves its old entry behind
+        invalidate_artifact_validators(artifact_schema_id)
+
+        with tracing.span("build_artifact_validator"):
+            validator = __artifact_validators[key] = extend_model(
+                artifact_schema_id,
+                BaseModel,
+                build_model_tuple(artifact_schema.artifact_schema),
+            )
+
+        if len(__artifact_validators) > ARTIFACT_VALIDATORS_CACHE_SIZE:
+            __artifact_validators.popitem(last=False)
+
+    return validator
+
 
 # ARTIFACTS
 ARTIFACT_IN_DB_COLS = get_fields(ArtifactInDB)
 ARTIFACT_IN_DB_PLACEHOLDERS = get_placeholders(ArtifactInDB)
 ARTIFACT_OVERVIEW_COLS = get_fields(ArtifactOverview)
 ARTIFACTS_COLS = get_fields(Artifact)
+ARTIFACTS_KEYSET = (
+    ("artifacts.account_name", "account_name"),
+    ("artifacts.account_id", "account_id"),
+    ("artifacts.opportunity_name", "opportunity_name"),
+    ("artifacts.opportunity_id", "opportunity_id"),
+    ("artifacts.name", "name"),
+    ("artifacts.artifact_id", "artifact_id"),
+)
 
 
-def get_all_artifacts(
+async def get_all_artifacts(
     artifact_filters: ArtifactFilters | None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: list | None = None,
+    staleness: dt.timedelta | None = None,
 ) -> list[ArtifactOverviewWithAccountName]:
     where_clause, bind_params = __get_where_clause(
-        artifact_filters, table_name="artifacts", include_where=True
+        artifact_filters, table_name="artifacts", include_where=False
     )
+    keyset_clause, keyset_params = __get_keyset_clause(ARTIFACTS_KEYSET, after)
 
     fully_qualified = ", ".join(
         [f"artifacts.{x}" for x in ArtifactOverview.__fields__.keys()]
     )
 
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT
-            {fully_qualified}, 
-            accounts.name as account_name, 
-            opportunities.name AS opportunity_name
-        FROM accounts 
-            JOIN opportunities 
-                ON accounts.account_id = opportunities.account_id 
-            JOIN artifacts 
-                ON (opportunities.account_id, opportunities.opportunity_id) = (artifacts.account_id, artifacts.opportunity_id)
-        {where_clause}
-        ORDER BY account_name, opportunity_name, artifacts.name
+            {fully_qualified},
+            artifacts.account_name,
+            artifacts.opportunity_name
+        FROM artifacts
+        {__get_as_of_clause(staleness)}
+        WHERE {where_clause or 'true'} AND {keyset_clause or 'true'}
+        ORDER BY {get_order_by(ARTIFACTS_KEYSET)}
+        LIMIT %s
         """,
-        bind_params,
+        bind_params + keyset_params + (limit,),
         ArtifactOverviewWithAccountName,
         True,
+        name="get_all_artifacts",
+    )
+
+
+def stream_all_artifacts(
+    artifact_filters: ArtifactFilters | None,
+) -> AsyncIterator[dict[str, Any]]:
+    where_clause, bind_params = __get_where_clause(
+        artifact_filters, table_name="artifacts"
+    )
+
+    fully_qualified = ", ".join(
+        [f"artifacts.{x}" for x in ArtifactOverview.__fields__.keys()]
+    )
+
+    return stream_stmt(
+        f"""
+        SELECT
+            {fully_qualified},
+            artifacts.account_name,
+            artifacts.opportunity_name
+        FROM artifacts
+        {where_clause}
+        ORDER BY {get_order_by(ARTIFACTS_KEYSET)}
+        """,
+        bind_params,
     )
 
 
-def get_all_artifacts_for_account_id(
+async def get_all_artifacts_for_account_id(
     account_id: UUID,
     artifact_filters: ArtifactFilters | None,
+    staleness: dt.timedelta | None = None,
 ) -> list[ArtifactOverviewWithOpportunityName]:
     where_clause, bind_params = __get_where_clause(
         artifact_filters, table_name="artifacts", include_where=False
@@ -848,40 +1544,43 @@ def get_all_artifacts_for_account_id(
         [f"artifacts.{x}" for x in ArtifactOverview.__fields__.keys()]
     )
 
-    return execute_stmt(
+    return await execute_stmt(
         f"""
-        SELECT {fully_qualified}, opportunities.name AS opportunity_name
-        FROM artifacts JOIN opportunities 
-            ON (opportunities.account_id, opportunities.opportunity_id) = (artifacts.account_id, artifacts.opportunity_id) 
+        SELECT {fully_qualified}, artifacts.opportunity_name
+        FROM artifacts
+        {__get_as_of_clause(staleness)}
         WHERE artifacts.account_id = %s {' AND ' if where_clause else ''} {where_clause}
-        ORDER BY opportunity_name, artifacts.name
+        ORDER BY artifacts.opportunity_name, artifacts.name
         """,
         (account_id,) + bind_params,
         ArtifactOverviewWithOpportunityName,
         True,
+        name="get_all_artifacts_for_account_id",
     )
 
 
-def get_all_artifacts_for_opportunity_id(
-    account_id: UUID, opportunity_id: UUID
+async def get_all_artifacts_for_opportunity_id(
+    account_id: UUID, opportunity_id: UUID, staleness: dt.timedelta | None = None
 ) -> list[ArtifactOverview]:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT {ARTIFACT_OVERVIEW_COLS}
         FROM artifacts
+        {__get_as_of_clause(staleness)}
         WHERE (account_id, opportunity_id) = (%s, %s)
         ORDER BY name
         """,
         (account_id, opportunity_id),
         ArtifactOverview,
         True,
+        name="get_all_artifacts_for_opportunity_id",
     )
 
 
-def get_artifact(
+async def get_artifact(
     account_id: UUID, opportunity_id: UUID, artifact_id: UUID
 ) -> Artifact | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT {ARTIFACTS_COLS}
         FROM artifacts 
@@ -889,59 +1588,54 @@ def get_artifact(
         """,
         (account_id, opportunity_id, artifact_id),
         Artifact,
+        name="get_artifact",
     )
 
 
-def create_artifact(artifact_in_db: ArtifactInDB) -> Artifact | None:
-    return execute_stmt(
+async def create_artifact(artifact_in_db: ArtifactInDB) -> Artifact | None:
+    name_cols, name_subqueries, name_params = __get_parent_names(
+        "artifacts", artifact_in_db
+    )
+
+    return await execute_stmt(
         f"""
         INSERT INTO artifacts 
-            ({ARTIFACT_IN_DB_COLS})
+            ({ARTIFACT_IN_DB_COLS}, {', '.join(name_cols)})
         VALUES
-            ({ARTIFACT_IN_DB_PLACEHOLDERS})
+            ({ARTIFACT_IN_DB_PLACEHOLDERS}, {', '.join(name_subqueries)})
         RETURNING {ARTIFACTS_COLS}
         """,
-        tuple(artifact_in_db.dict().values()),
+        tuple(artifact_in_db.dict().values()) + name_params,
         Artifact,
+        name="create_artifact",
     )
 
 
-def update_artifact(artifact_in_db: ArtifactInDB) -> Artifact | None:
-    if artifact_in_db.artifact_id:
-        old_proj = get_artifact(
-            artifact_in_db.account_id,
-            artifact_in_db.opportunity_id,
-            artifact_in_db.artifact_id,
-        )
-    else:
+async def update_artifact(
+    artifact_in_db: ArtifactInDB, expected_updated_at: dt.datetime | None = None
+) -> Artifact | None:
+    if not artifact_in_db.artifact_id:
         return None
 
-    if old_proj:
-        old_proj = ArtifactInDB(**old_proj.dict())
-        update_data = artifact_in_db.dict(exclude_unset=True)
-        new_proj = old_proj.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE artifacts SET 
-                ({ARTIFACT_IN_DB_COLS}) = ({ARTIFACT_IN_DB_PLACEHOLDERS})
-            WHERE (account_id, opportunity_id, artifact_id) = (%s, %s, %s)
-            RETURNING {ARTIFACTS_COLS}
-            """,
-            (
-                *tuple(new_proj.dict().values()),
-                artifact_in_db.account_id,
-                artifact_in_db.opportunity_id,
-                artifact_in_db.artifact_id,
-            ),
-            Artifact,
-        )
+    return await __update_row(
+        "artifacts",
+        {
+            "account_id": artifact_in_db.account_id,
+            "opportunity_id": artifact_in_db.opportunity_id,
+            "artifact_id": artifact_in_db.artifact_id,
+        },
+        artifact_in_db.dict(exclude_unset=True),
+        ARTIFACTS_COLS,
+        Artifact,
+        expected_updated_at,
+        name="update_artifact",
+    )
 
 
-def delete_artifact(
+async def delete_artifact(
     account_id: UUID, opportunity_id: UUID, artifact_id: UUID
 ) -> Artifact | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         DELETE FROM artifacts
         WHERE (account_id, opportunity_id, artifact_id) = (%s, %s, %s)
@@ -949,6 +1643,7 @@ def delete_artifact(
         """,
         (account_id, opportunity_id, artifact_id),
         Artifact,
+        name="delete_artifact",
     )
 
 
@@ -957,85 +1652,125 @@ PROJECT_IN_DB_COLS = get_fields(ProjectInDB)
 PROJECT_IN_DB_PLACEHOLDERS = get_placeholders(ProjectInDB)
 PROJECT_OVERVIEW_COLS = get_fields(ProjectOverview)
 PROJECTS_COLS = get_fields(Project)
+PROJECTS_KEYSET = (
+    ("projects.account_name", "account_name"),
+    ("projects.account_id", "account_id"),
+    ("projects.opportunity_name", "opportunity_name"),
+    ("projects.opportunity_id", "opportunity_id"),
+    ("projects.name", "name"),
+    ("projects.project_id", "project_id"),
+)
 
 
-def get_all_projects(
+async def get_all_projects(
     project_filters: ProjectFilters | None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: list | None = None,
+    staleness: dt.timedelta | None = None,
 ) -> list[ProjectOverviewWithAccountName]:
     where_clause, bind_params = __get_where_clause(
         project_filters, table_name="projects", include_where=False
     )
+    keyset_clause, keyset_params = __get_keyset_clause(PROJECTS_KEYSET, after)
 
     fully_qualified = ", ".join(
         [f"projects.{x}" for x in ProjectOverview.__fields__.keys()]
     )
 
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT
-            {fully_qualified}, 
-            accounts.name as account_name, 
-            opportunities.name AS opportunity_name
-        FROM accounts
-            JOIN opportunities
-                ON accounts.account_id = opportunities.account_id 
-            JOIN projects  
-                ON (opportunities.account_id, opportunities.opportunity_id) = (projects.account_id, projects.opportunity_id)
-        {where_clause}
-        ORDER BY account_name, opportunity_name, projects.name
+            {fully_qualified},
+            projects.account_name,
+            projects.opportunity_name
+        FROM projects
+        {__get_as_of_clause(staleness)}
+        WHERE {where_clause or 'true'} AND {keyset_clause or 'true'}
+        ORDER BY {get_order_by(PROJECTS_KEYSET)}
+        LIMIT %s
         """,
-        bind_params,
+        bind_params + keyset_params + (limit,),
         ProjectOverviewWithAccountName,
         True,
+        name="get_all_projects",
     )
 
 
-def get_all_projects_for_account_id(
-    account_id: UUID,
+def stream_all_projects(
     project_filters: ProjectFilters | None,
-) -> list[ProjectOverviewWithOpportunityName]:
+) -> AsyncIterator[dict[str, Any]]:
     where_clause, bind_params = __get_where_clause(
-        project_filters, table_name="projects", include_where=False
+        project_filters, table_name="projects"
     )
 
     fully_qualified = ", ".join(
         [f"projects.{x}" for x in ProjectOverview.__fields__.keys()]
     )
 
-    return execute_stmt(
+    return stream_stmt(
         f"""
-        SELECT {fully_qualified}, opportunities.name AS opportunity_name
-        FROM projects JOIN opportunities 
-            ON (opportunities.account_id, opportunities.opportunity_id) = (projects.account_id, projects.opportunity_id) 
-        WHERE projects.account_id = %s {' AND ' if where_clause else ''} {where_clause}
-        ORDER BY opportunity_name, projects.name
+        SELECT
+            {fully_qualified},
+            projects.account_name,
+            projects.opportunity_name
+        FROM projects
+        {where_clause}
+        ORDER BY {get_order_by(PROJECTS_KEYSET)}
         """,
-        (account_id,) + bind_params,
-        ProjectOverviewWithOpportunityName,
+        bind_params,
+    )
+
+
+async def get_all_projects_for_account_id(
+    account_id: UUID,
+    project_filters: ProjectFilters | None,
+    staleness: dt.timedelta | None = None,
+) -> list[ProjectOverviewWithOpportunityName]:
+    where_clause, bind_params = __get_where_clause(
+        project_filters, table_name="projects", include_where=False
+    )
+
+    fully_qualified = ", ".join(
+        [f"projects.{x}" for x in ProjectOverview.__fields__.keys()]
+    )
+
+    return await execute_stmt(
+        f"""
+        SELECT {fully_qualified}, projects.opportunity_name
+        FROM projects
+        {__get_as_of_clause(staleness)}
+        WHERE projects.account_id = %s {' AND ' if where_clause else ''} {where_clause}
+        ORDER BY projects.opportunity_name, projects.name
+        """,
+        (account_id,) + bind_params,
+        ProjectOverviewWithOpportunityName,
         True,
+        name="get_all_projects_for_account_id",
     )
 
 
-def get_all_projects_for_opportunity_id(
-    account_id: UUID, opportunity_id: UUID
+async def get_all_projects_for_opportunity_id(
+    account_id: UUID, opportunity_id: UUID, staleness: dt.timedelta | None = None
 ) -> list[ProjectOverview]:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT {PROJECT_OVERVIEW_COLS}
         FROM projects
+        {__get_as_of_clause(staleness)}
         WHERE (account_id, opportunity_id) = (%s, %s)
         ORDER BY name
         """,
         (account_id, opportunity_id),
         ProjectOverview,
         True,
+        name="get_all_projects_for_opportunity_id",
     )
 
 
-def get_project(
+async def get_project(
     account_id: UUID, opportunity_id: UUID, project_id: UUID
 ) -> Project | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT {PROJECTS_COLS}
         FROM projects 
@@ -1043,59 +1778,67 @@ def get_project(
         """,
         (account_id, opportunity_id, project_id),
         Project,
+        name="get_project",
     )
 
 
-def create_project(project_in_db: ProjectInDB) -> Project | None:
-    return execute_stmt(
+async def create_project(project_in_db: ProjectInDB) -> Project | None:
+    name_cols, name_subqueries, name_params = __get_parent_names(
+        "projects", project_in_db
+    )
+
+    return await execute_stmt(
         f"""
         INSERT INTO projects 
-            ({PROJECT_IN_DB_COLS})
+            ({PROJECT_IN_DB_COLS}, {', '.join(name_cols)})
         VALUES
-            ({PROJECT_IN_DB_PLACEHOLDERS})
+            ({PROJECT_IN_DB_PLACEHOLDERS}, {', '.join(name_subqueries)})
         RETURNING {PROJECTS_COLS}
         """,
-        tuple(project_in_db.dict().values()),
+        tuple(project_in_db.dict().values()) + name_params,
         Project,
+        name="create_project",
     )
 
 
-def update_project(project_in_db: ProjectInDB) -> Project | None:
-    if project_in_db.project_id:
-        old_proj = get_project(
-            project_in_db.account_id,
-            project_in_db.opportunity_id,
-            project_in_db.project_id,
-        )
-    else:
+async def bulk_upsert_projects(projects_in_db: list[ProjectInDB]) -> list[BulkResult]:
+    return await __bulk_upsert(
+        "projects", ("account_id", "opportunity_id", "project_id"), projects_in_db
+    )
+
+
+async def update_project(
+    project_in_db: ProjectInDB, expected_updated_at: dt.datetime | None = None
+) -> Project | None:
+    if not project_in_db.project_id:
         return None
 
-    if old_proj:
-        old_proj = ProjectInDB(**old_proj.dict())
-        update_data = project_in_db.dict(exclude_unset=True)
-        new_proj = old_proj.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE projects SET 
-                ({PROJECT_IN_DB_COLS}) = ({PROJECT_IN_DB_PLACEHOLDERS})
-            WHERE (account_id, opportunity_id, project_id) = (%s, %s, %s)
-            RETURNING {PROJECTS_COLS}
-            """,
-            (
-                *tuple(new_proj.dict().values()),
-                project_in_db.account_id,
-                project_in_db.opportunity_id,
-                project_in_db.project_id,
-            ),
-            Project,
-        )
+    pk = {
+        "account_id": project_in_db.account_id,
+        "opportunity_id": project_in_db.opportunity_id,
+        "project_id": project_in_db.project_id,
+    }
+
+    updated_project = await __update_row(
+        "projects",
+        pk,
+        project_in_db.dict(exclude_unset=True),
+        PROJECTS_COLS,
+        Project,
+        expected_updated_at,
+        name="update_project",
+    )
 
+    if updated_project and "name" in project_in_db.__fields_set__:
+        __propagate_parent_names("projects", [pk])
 
-def delete_project(
+    return updated_project
+
+
+async def delete_project(
     account_id: UUID, opportunity_id: UUID, project_id: UUID
 ) -> Project | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         DELETE FROM projects
         WHERE (account_id, opportunity_id, project_id) = (%s, %s, %s)
@@ -1103,13 +1846,14 @@ def delete_project(
         """,
         (account_id, opportunity_id, project_id),
         Project,
+        name="delete_project",
     )
 
 
-def add_project_attachment(
+async def add_project_attachment(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, s3_object_name: str
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE projects SET
             attachments = array_append(attachments, %s)
@@ -1117,13 +1861,14 @@ def add_project_attachment(
         """,
         (s3_object_name, account_id, opportunity_id, project_id),
         returning_rs=False,
+        name="add_project_attachment",
     )
 
 
-def remove_project_attachment(
+async def remove_project_attachment(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, s3_object_name: str
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE projects SET
             attachments = array_remove(attachments, %s)
@@ -1131,6 +1876,7 @@ def remove_project_attachment(
         """,
         (s3_object_name, account_id, opportunity_id, project_id),
         returning_rs=False,
+        name="remove_project_attachment",
     )
 
 
@@ -1141,8 +1887,11 @@ TASK_OVERVIEW_COLS = get_fields(TaskOverview)
 TASKS_COLS = get_fields(Task)
 
 
-def get_all_tasks_for_opportunity_id(
-    account_id: UUID, opportunity_id: UUID, task_filters: TaskFilters | None = None
+async def get_all_tasks_for_opportunity_id(
+    account_id: UUID,
+    opportunity_id: UUID,
+    task_filters: TaskFilters | None = None,
+    staleness: dt.timedelta | None = None,
 ) -> list[TaskOverviewWithProjectName]:
     where_clause, bind_params = __get_where_clause(
         task_filters, table_name="tasks", include_where=False
@@ -1150,41 +1899,47 @@ def get_all_tasks_for_opportunity_id(
 
     fully_qualified = ", ".join([f"tasks.{x}" for x in TaskOverview.__fields__.keys()])
 
-    return execute_stmt(
+    return await execute_stmt(
         f"""
-        SELECT {fully_qualified}, projects.name AS project_name
-        FROM tasks JOIN projects
-            ON (tasks.account_id, tasks.project_id) = (projects.account_id, projects.project_id)
-        WHERE tasks.account_id = %s
+        SELECT {fully_qualified}, tasks.project_name
+        FROM tasks
+        {__get_as_of_clause(staleness)}
+        WHERE (tasks.account_id, tasks.opportunity_id) = (%s, %s)
         {' AND ' if where_clause else ''} {where_clause}
-        ORDER BY project_name, task_id DESC
+        ORDER BY tasks.project_name, tasks.task_id DESC
         """,
-        (account_id,) + bind_params,
+        (account_id, opportunity_id) + bind_params,
         TaskOverviewWithProjectName,
         True,
+        name="get_all_tasks_for_opportunity_id",
     )
 
 
-def get_all_tasks_for_project_id(
-    account_id: UUID, opportunity_id: UUID, project_id: UUID
+async def get_all_tasks_for_project_id(
+    account_id: UUID,
+    opportunity_id: UUID,
+    project_id: UUID,
+    staleness: dt.timedelta | None = None,
 ) -> list[TaskOverview]:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT {TASK_OVERVIEW_COLS}
         FROM tasks
+        {__get_as_of_clause(staleness)}
         WHERE (account_id, opportunity_id, project_id) =  (%s, %s, %s)
         ORDER BY task_id DESC
         """,
         (account_id, opportunity_id, project_id),
         TaskOverview,
         True,
+        name="get_all_tasks_for_project_id",
     )
 
 
-def get_task(
+async def get_task(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, task_id: UUID
 ) -> Task | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT {TASKS_COLS}
         FROM tasks 
@@ -1192,61 +1947,59 @@ def get_task(
         """,
         (account_id, opportunity_id, project_id, task_id),
         Task,
+        name="get_task",
     )
 
 
-def create_task(task_in_db: TaskInDB) -> Task | None:
-    return execute_stmt(
+async def create_task(task_in_db: TaskInDB) -> Task | None:
+    name_cols, name_subqueries, name_params = __get_parent_names("tasks", task_in_db)
+
+    return await execute_stmt(
         f"""
         INSERT INTO tasks 
-            ({TASK_IN_DB_COLS})
+            ({TASK_IN_DB_COLS}, {', '.join(name_cols)})
         VALUES
-            ({TASK_IN_DB_PLACEHOLDERS})
+            ({TASK_IN_DB_PLACEHOLDERS}, {', '.join(name_subqueries)})
         RETURNING {TASKS_COLS}
         """,
-        tuple(task_in_db.dict().values()),
+        tuple(task_in_db.dict().values()) + name_params,
         Task,
+        name="create_task",
     )
 
 
-def update_task(task_in_db: TaskInDB) -> Task | None:
-    if task_in_db.task_id:
-        old_task = get_task(
-            task_in_db.account_id,
-            task_in_db.opportunity_id,
-            task_in_db.project_id,
-            task_in_db.task_id,
-        )
-    else:
+async def bulk_upsert_tasks(tasks_in_db: list[TaskInDB]) -> list[BulkResult]:
+    return await __bulk_upsert(
+        "tasks", ("account_id", "opportunity_id", "project_id", "task_id"), tasks_in_db
+    )
+
+
+async def update_task(
+    task_in_db: TaskInDB, expected_updated_at: dt.datetime | None = None
+) -> Task | None:
+    if not task_in_db.task_id:
         return None
 
-    if old_task:
-        old_task = TaskInDB(**old_task.dict())
-        update_data = task_in_db.dict(exclude_unset=True)
-        new_task = old_task.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE tasks SET 
-                ({TASK_IN_DB_COLS}) = ({TASK_IN_DB_PLACEHOLDERS})
-            WHERE (account_id, opportunity_id, project_id, task_id) = (%s, %s, %s, %s)
-            RETURNING {TASKS_COLS}
-            """,
-            (
-                *tuple(new_task.dict().values()),
-                task_in_db.account_id,
-                task_in_db.opportunity_id,
-                task_in_db.project_id,
-                task_in_db.task_id,
-            ),
-            Task,
-        )
+    return await __update_row(
+        "tasks",
+        {
+            "account_id": task_in_db.account_id,
+            "opportunity_id": task_in_db.opportunity_id,
+            "project_id": task_in_db.project_id,
+            "task_id": task_in_db.task_id,
+        },
+        task_in_db.dict(exclude_unset=True),
+        TASKS_COLS,
+        Task,
+        expected_updated_at,
+        name="update_task",
+    )
 
 
-def delete_task(
+async def delete_task(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, task_id: UUID
 ) -> Task | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         DELETE FROM tasks
         WHERE (account_id, opportunity_id, project_id, task_id) = (%s, %s, %s, %s)
@@ -1254,17 +2007,18 @@ def delete_task(
         """,
         (account_id, opportunity_id, project_id, task_id),
         Task,
+        name="delete_task",
     )
 
 
-def add_task_attachment(
+async def add_task_attachment(
     account_id: UUID,
     opportunity_id: UUID,
     project_id: UUID,
     task_id: UUID,
     s3_object_name: str,
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE tasks SET
             attachments = array_append(attachments, %s)
@@ -1272,17 +2026,18 @@ def add_task_attachment(
         """,
         (s3_object_name, account_id, opportunity_id, project_id, task_id),
         returning_rs=False,
+        name="add_task_attachment",
     )
 
 
-def remove_task_attachment(
+async def remove_task_attachment(
     account_id: UUID,
     opportunity_id: UUID,
     project_id: UUID,
     task_id: UUID,
     s3_object_name: str,
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE tasks SET
             attachments = array_remove(attachments, %s)
@@ -1290,6 +2045,7 @@ def remove_task_attachment(
         """,
         (s3_object_name, account_id, opportunity_id, project_id, task_id),
         returning_rs=False,
+        name="remove_task_attachment",
     )
 
 
@@ -1303,20 +2059,26 @@ PROJ_NOTE_IN_DB_PLACEHOLDERS = get_placeholders(ProjectNoteInDB)
 ACCOUNT_NOTES_COLS = get_fields(AccountNote)
 OPPORTUNITY_NOTES_COLS = get_fields(OpportunityNote)
 PROJECT_NOTES_COLS = get_fields(ProjectNote)
+ACCOUNT_NOTE_OVERVIEW_COLS = get_fields(AccountNoteOverview)
+OPPORTUNITY_NOTE_OVERVIEW_COLS = get_fields(OpportunityNoteOverview)
+PROJECT_NOTE_OVERVIEW_COLS = get_fields(ProjectNoteOverview)
 
 
 # ACCOUNT_NOTES
-def get_all_account_notes(
-    account_id: UUID, note_filters: NoteFilters | None = None
+async def get_all_account_notes(
+    account_id: UUID,
+    note_filters: NoteFilters | None = None,
+    staleness: dt.timedelta | None = None,
 ) -> list[AccountNoteOverview]:
     where_clause, bind_params = __get_where_clause(
         note_filters, table_name="account_notes", include_where=False
     )
 
-    return execute_stmt(
+    return await execute_stmt(
         f"""
-        SELECT {ACCOUNT_NOTES_COLS}
+        SELECT {ACCOUNT_NOTE_OVERVIEW_COLS}
         FROM account_notes
+        {__get_as_of_clause(staleness)}
         WHERE account_id = %s
         {' AND ' if where_clause else ''} {where_clause}
         ORDER BY name
@@ -1324,11 +2086,12 @@ def get_all_account_notes(
         (account_id,) + bind_params,
         AccountNoteOverview,
         True,
+        name="get_all_account_notes",
     )
 
 
-def get_account_note(account_id: UUID, note_id: UUID) -> AccountNote | None:
-    return execute_stmt(
+async def get_account_note(account_id: UUID, note_id: UUID) -> AccountNote | None:
+    return await execute_stmt(
         f"""
         SELECT {ACCOUNT_NOTES_COLS}
         FROM account_notes 
@@ -1336,11 +2099,12 @@ def get_account_note(account_id: UUID, note_id: UUID) -> AccountNote | None:
         """,
         (account_id, note_id),
         AccountNote,
+        name="get_account_note",
     )
 
 
-def create_account_note(note_in_db: AccountNoteInDB) -> AccountNote | None:
-    return execute_stmt(
+async def create_account_note(note_in_db: AccountNoteInDB) -> AccountNote | None:
+    return await execute_stmt(
         f"""
         INSERT INTO account_notes 
             ({ACC_NOTE_IN_DB_COLS})
@@ -1350,38 +2114,35 @@ def create_account_note(note_in_db: AccountNoteInDB) -> AccountNote | None:
         """,
         tuple(note_in_db.dict().values()),
         AccountNote,
+        name="create_account_note",
     )
 
 
-def update_account_note(note_in_db: AccountNoteInDB) -> AccountNote | None:
-    if note_in_db.note_id:
-        old_note = get_account_note(note_in_db.account_id, note_in_db.note_id)
-    else:
+async def bulk_upsert_account_notes(
+    notes_in_db: list[AccountNoteInDB],
+) -> list[BulkResult]:
+    return await __bulk_upsert("account_notes", ("account_id", "note_id"), notes_in_db)
+
+
+async def update_account_note(
+    note_in_db: AccountNoteInDB, expected_updated_at: dt.datetime | None = None
+) -> AccountNote | None:
+    if not note_in_db.note_id:
         return None
 
-    if old_note:
-        old_note = AccountNoteInDB(**old_note.dict())
-        update_data = note_in_db.dict(exclude_unset=True)
-        new_note = old_note.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE account_notes SET 
-                ({ACC_NOTE_IN_DB_COLS}) = ({ACC_NOTE_IN_DB_PLACEHOLDERS})
-            WHERE (account_id, note_id) = (%s, %s)
-            RETURNING {ACCOUNT_NOTES_COLS}
-            """,
-            (
-                *tuple(new_note.dict().values()),
-                note_in_db.account_id,
-                note_in_db.note_id,
-            ),
-            AccountNote,
-        )
+    return await __update_row(
+        "account_notes",
+        {"account_id": note_in_db.account_id, "note_id": note_in_db.note_id},
+        note_in_db.dict(exclude_unset=True),
+        ACCOUNT_NOTES_COLS,
+        AccountNote,
+        expected_updated_at,
+        name="update_account_note",
+    )
 
 
-def delete_account_note(account_id: UUID, note_id: UUID) -> AccountNote | None:
-    return execute_stmt(
+async def delete_account_note(account_id: UUID, note_id: UUID) -> AccountNote | None:
+    return await execute_stmt(
         f"""
         DELETE FROM account_notes
         WHERE (account_id, note_id) = (%s, %s)
@@ -1389,13 +2150,14 @@ def delete_account_note(account_id: UUID, note_id: UUID) -> AccountNote | None:
         """,
         (account_id, note_id),
         AccountNote,
+        name="delete_account_note",
     )
 
 
-def add_account_note_attachment(
+async def add_account_note_attachment(
     account_id: UUID, note_id: UUID, s3_object_name: str
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE account_notes SET
             attachments = array_append(attachments, %s)
@@ -1403,13 +2165,14 @@ def add_account_note_attachment(
         """,
         (s3_object_name, account_id, note_id),
         returning_rs=False,
+        name="add_account_note_attachment",
     )
 
 
-def remove_account_note_attachment(
+async def remove_account_note_attachment(
     account_id: UUID, note_id: UUID, s3_object_name: str
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE account_notes SET
             attachments = array_remove(attachments, %s)
@@ -1417,21 +2180,26 @@ def remove_account_note_attachment(
         """,
         (s3_object_name, account_id, note_id),
         returning_rs=False,
+        name="remove_account_note_attachment",
     )
 
 
 # OPPORTUNITY_NOTE
-def get_all_opportunity_notes(
-    account_id: UUID, opportunity_id: UUID, note_filters: NoteFilters | None = None
+async def get_all_opportunity_notes(
+    account_id: UUID,
+    opportunity_id: UUID,
+    note_filters: NoteFilters | None = None,
+    staleness: dt.timedelta | None = None,
 ) -> list[OpportunityNoteOverview]:
     where_clause, bind_params = __get_where_clause(
-        note_filters, table_name="account_notes", include_where=False
+        note_filters, table_name="opportunity_notes", include_where=False
     )
 
-    return execute_stmt(
+    return await execute_stmt(
         f"""
-        SELECT {OPPORTUNITY_NOTES_COLS}
+        SELECT {OPPORTUNITY_NOTE_OVERVIEW_COLS}
         FROM opportunity_notes
+        {__get_as_of_clause(staleness)}
         WHERE (account_id, opportunity_id) = (%s, %s)
         {' AND ' if where_clause else ''} {where_clause}
         ORDER BY name
@@ -1439,13 +2207,14 @@ def get_all_opportunity_notes(
         (account_id, opportunity_id) + bind_params,
         OpportunityNoteOverview,
         True,
+        name="get_all_opportunity_notes",
     )
 
 
-def get_opportunity_note(
+async def get_opportunity_note(
     account_id: UUID, opportunity_id: UUID, note_id: UUID
 ) -> OpportunityNote | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT {OPPORTUNITY_NOTES_COLS}
         FROM opportunity_notes 
@@ -1453,11 +2222,14 @@ def get_opportunity_note(
         """,
         (account_id, opportunity_id, note_id),
         OpportunityNote,
+        name="get_opportunity_note",
     )
 
 
-def create_opportunity_note(note_in_db: OpportunityNoteInDB) -> OpportunityNote | None:
-    return execute_stmt(
+async def create_opportunity_note(
+    note_in_db: OpportunityNoteInDB,
+) -> OpportunityNote | None:
+    return await execute_stmt(
         f"""
         INSERT INTO opportunity_notes 
             ({OPP_NOTE_IN_DB_COLS})
@@ -1467,43 +2239,43 @@ def create_opportunity_note(note_in_db: OpportunityNoteInDB) -> OpportunityNote
         """,
         tuple(note_in_db.dict().values()),
         OpportunityNote,
+        name="create_opportunity_note",
     )
 
 
-def update_opportunity_note(note_in_db: OpportunityNoteInDB) -> OpportunityNote | None:
-    if note_in_db.note_id:
-        old_note = get_opportunity_note(
-            note_in_db.account_id, note_in_db.opportunity_id, note_in_db.note_id
-        )
-    else:
+async def bulk_upsert_opportunity_notes(
+    notes_in_db: list[OpportunityNoteInDB],
+) -> list[BulkResult]:
+    return await __bulk_upsert(
+        "opportunity_notes", ("account_id", "opportunity_id", "note_id"), notes_in_db
+    )
+
+
+async def update_opportunity_note(
+    note_in_db: OpportunityNoteInDB, expected_updated_at: dt.datetime | None = None
+) -> OpportunityNote | None:
+    if not note_in_db.note_id:
         return None
 
-    if old_note:
-        old_note = OpportunityNoteInDB(**old_note.dict())
-        update_data = note_in_db.dict(exclude_unset=True)
-        new_note = old_note.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE opportunity_notes SET 
-                ({OPP_NOTE_IN_DB_COLS}) = ({OPP_NOTE_IN_DB_PLACEHOLDERS})
-            WHERE (account_id, opportunity_id, note_id) = (%s, %s, %s)
-            RETURNING {OPPORTUNITY_NOTES_COLS}
-            """,
-            (
-                *tuple(new_note.dict().values()),
-                note_in_db.account_id,
-                note_in_db.opportunity_id,
-                note_in_db.note_id,
-            ),
-            OpportunityNote,
-        )
+    return await __update_row(
+        "opportunity_notes",
+        {
+            "account_id": note_in_db.account_id,
+            "opportunity_id": note_in_db.opportunity_id,
+            "note_id": note_in_db.note_id,
+        },
+        note_in_db.dict(exclude_unset=True),
+        OPPORTUNITY_NOTES_COLS,
+        OpportunityNote,
+        expected_updated_at,
+        name="update_opportunity_note",
+    )
 
 
-def delete_opportunity_note(
+async def delete_opportunity_note(
     account_id: UUID, opportunity_id: UUID, note_id: UUID
 ) -> OpportunityNote | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         DELETE FROM opportunity_notes
         WHERE (account_id, opportunity_id, note_id) = (%s, %s, %s)
@@ -1511,13 +2283,14 @@ def delete_opportunity_note(
         """,
         (account_id, opportunity_id, note_id),
         OpportunityNote,
+        name="delete_opportunity_note",
     )
 
 
-def add_opportunity_note_attachment(
+async def add_opportunity_note_attachment(
     account_id: UUID, opportunity_id: UUID, note_id: UUID, s3_object_name: str
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE opportunity_notes SET
             attachments = array_append(attachments, %s)
@@ -1525,13 +2298,14 @@ def add_opportunity_note_attachment(
         """,
         (s3_object_name, account_id, opportunity_id, note_id),
         returning_rs=False,
+        name="add_opportunity_note_attachment",
     )
 
 
-def remove_opportunity_note_attachment(
+async def remove_opportunity_note_attachment(
     account_id: UUID, opportunity_id: UUID, note_id: UUID, s3_object_name: str
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE opportunity_notes SET
             attachments = array_remove(attachments, %s)
@@ -1539,24 +2313,27 @@ def remove_opportunity_note_attachment(
         """,
         (s3_object_name, account_id, opportunity_id, note_id),
         returning_rs=False,
+        name="remove_opportunity_note_attachment",
     )
 
 
 # PROJECT_NOTE
-def get_all_project_notes(
+async def get_all_project_notes(
     account_id: UUID,
     opportunity_id: UUID,
     project_id: UUID,
     note_filters: NoteFilters | None = None,
+    staleness: dt.timedelta | None = None,
 ) -> list[ProjectNoteOverview]:
     where_clause, bind_params = __get_where_clause(
-        note_filters, table_name="account_notes", include_where=False
+        note_filters, table_name="project_notes", include_where=False
     )
 
-    return execute_stmt(
+    return await execute_stmt(
         f"""
-        SELECT {PROJECT_NOTES_COLS}
+        SELECT {PROJECT_NOTE_OVERVIEW_COLS}
         FROM project_notes
+        {__get_as_of_clause(staleness)}
         WHERE (account_id, opportunity_id, project_id) = (%s, %s, %s)
         {' AND ' if where_clause else ''} {where_clause}
         ORDER BY name
@@ -1564,13 +2341,14 @@ def get_all_project_notes(
         (account_id, opportunity_id, project_id) + bind_params,
         ProjectNoteOverview,
         True,
+        name="get_all_project_notes",
     )
 
 
-def get_project_note(
+async def get_project_note(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, note_id: UUID
 ) -> ProjectNote | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         SELECT {PROJECT_NOTES_COLS}
         FROM project_notes 
@@ -1578,11 +2356,12 @@ def get_project_note(
         """,
         (account_id, opportunity_id, project_id, note_id),
         ProjectNote,
+        name="get_project_note",
     )
 
 
-def create_project_note(note_in_db: ProjectNoteInDB) -> ProjectNote | None:
-    return execute_stmt(
+async def create_project_note(note_in_db: ProjectNoteInDB) -> ProjectNote | None:
+    return await execute_stmt(
         f"""
         INSERT INTO project_notes 
             ({PROJ_NOTE_IN_DB_COLS})
@@ -1592,47 +2371,46 @@ def create_project_note(note_in_db: ProjectNoteInDB) -> ProjectNote | None:
         """,
         tuple(note_in_db.dict().values()),
         ProjectNote,
+        name="create_project_note",
     )
 
 
-def update_project_note(note_in_db: ProjectNoteInDB) -> ProjectNote | None:
-    if note_in_db.note_id:
-        old_note = get_project_note(
-            note_in_db.account_id,
-            note_in_db.opportunity_id,
-            note_in_db.project_id,
-            note_in_db.note_id,
-        )
-    else:
+async def bulk_upsert_project_notes(
+    notes_in_db: list[ProjectNoteInDB],
+) -> list[BulkResult]:
+    return await __bulk_upsert(
+        "project_notes",
+        ("account_id", "opportunity_id", "project_id", "note_id"),
+        notes_in_db,
+    )
+
+
+async def update_project_note(
+    note_in_db: ProjectNoteInDB, expected_updated_at: dt.datetime | None = None
+) -> ProjectNote | None:
+    if not note_in_db.note_id:
         return None
 
-    if old_note:
-        old_note = ProjectNoteInDB(**old_note.dict())
-        update_data = note_in_db.dict(exclude_unset=True)
-        new_note = old_note.copy(update=update_data)
-
-        return execute_stmt(
-            f"""
-            UPDATE project_notes SET 
-                ({PROJ_NOTE_IN_DB_COLS}) = ({PROJ_NOTE_IN_DB_PLACEHOLDERS})
-            WHERE (account_id, opportunity_id, project_id, note_id) = (%s, %s, %s, %s)
-            RETURNING {PROJECT_NOTES_COLS}
-            """,
-            (
-                *tuple(new_note.dict().values()),
-                note_in_db.account_id,
-                note_in_db.opportunity_id,
-                note_in_db.project_id,
-                note_in_db.note_id,
-            ),
-            ProjectNote,
-        )
+    return await __update_row(
+        "project_notes",
+        {
+            "account_id": note_in_db.account_id,
+            "opportunity_id": note_in_db.opportunity_id,
+            "project_id": note_in_db.project_id,
+            "note_id": note_in_db.note_id,
+        },
+        note_in_db.dict(exclude_unset=True),
+        PROJECT_NOTES_COLS,
+        ProjectNote,
+        expected_updated_at,
+        name="update_project_note",
+    )
 
 
-def delete_project_note(
+async def delete_project_note(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, note_id: UUID
 ) -> ProjectNote | None:
-    return execute_stmt(
+    return await execute_stmt(
         f"""
         DELETE FROM project_notes
         WHERE (account_id, opportunity_id, project_id, note_id) = (%s, %s, %s, %s)
@@ -1640,17 +2418,18 @@ def delete_project_note(
         """,
         (account_id, opportunity_id, project_id, note_id),
         ProjectNote,
+        name="delete_project_note",
     )
 
 
-def add_project_note_attachment(
+async def add_project_note_attachment(
     account_id: UUID,
     opportunity_id: UUID,
     project_id: UUID,
     note_id: UUID,
     s3_object_name: str,
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE project_notes SET
             attachments = array_append(attachments, %s)
@@ -1658,17 +2437,18 @@ def add_project_note_attachment(
         """,
         (s3_object_name, account_id, opportunity_id, project_id, note_id),
         returning_rs=False,
+        name="add_project_note_attachment",
     )
 
 
-def remove_project_note_attachment(
+async def remove_project_note_attachment(
     account_id: UUID,
     opportunity_id: UUID,
     project_id: UUID,
     note_id: UUID,
     s3_object_name: str,
 ) -> None:
-    return execute_stmt(
+    return await execute_stmt(
         """
         UPDATE project_notes SET
             attachments = array_remove(attachments, %s)
@@ -1676,6 +2456,7 @@ def remove_project_note_attachment(
         """,
         (s3_object_name, account_id, opportunity_id, project_id, note_id),
         returning_rs=False,
+        name="remove_project_note_attachment",
     )
 
 
@@ -1685,49 +2466,1148 @@ class DictJsonbDumper(JsonbDumper):
 
 
 # ==============================================================================================
-def execute_stmt(
+# ACCOUNT TREE
+# section: (depth, table, model, ORDER BY)
+ACCOUNT_TREE_SECTIONS = {
+    "contacts": (1, "contacts", Contact, "x.fname, x.contact_id"),
+    "opportunities": (
+        1,
+        "opportunities",
+        OpportunityOverview,
+        "x.name, x.opportunity_id",
+    ),
+    "account_notes": (1, "account_notes", AccountNoteOverview, "x.name, x.note_id"),
+    "projects": (
+        2,
+        "projects",
+        ProjectOverview,
+        "x.opportunity_id, x.name, x.project_id",
+    ),
+    "artifacts": (
+        2,
+        "artifacts",
+        ArtifactOverview,
+        "x.opportunity_id, x.name, x.artifact_id",
+    ),
+    "opportunity_notes": (
+        2,
+        "opportunity_notes",
+        OpportunityNoteOverview,
+        "x.opportunity_id, x.name, x.note_id",
+    ),
+    "tasks": (
+        3,
+        "tasks",
+        TaskOverview,
+        "x.opportunity_id, x.project_id, x.name, x.task_id",
+    ),
+    "project_notes": (
+        3,
+        "project_notes",
+        ProjectNoteOverview,
+        "x.opportunity_id, x.project_id, x.name, x.note_id",
+    ),
+}
+MAX_ACCOUNT_TREE_DEPTH = 3
+
+
+def __get_jsonb_object(model: Any, alias: str) -> str:
+    return (
+        "jsonb_build_object("
+        + ", ".join([f"'{x}', {alias}.{x}" for x in model.__fields__.keys()])
+        + ")"
+    )
+
+
+async def get_account_tree(
+    account_id: UUID,
+    depth: int = MAX_ACCOUNT_TREE_DEPTH,
+    include: list[str] | None = None,
+) -> AccountTree | None:
+    """
+    Fetches the account and all the requested sections in a single query:
+    each section is aggregated into a JSON array by a correlated subquery,
+    served by the account_id prefix of the primary key of each table.
+    """
+    sections = [
+        f"""(
+            SELECT COALESCE(
+                jsonb_agg({__get_jsonb_object(model, 'x')} ORDER BY {order_by}),
+                '[]'::JSONB
+            )
+            FROM {table} AS x
+            WHERE x.account_id = accounts.account_id
+        ) AS {k}"""
+        for k, (d, table, model, order_by) in ACCOUNT_TREE_SECTIONS.items()
+        if d <= depth and (not include or k in include)
+    ]
+
+    return await execute_stmt(
+        f"""
+        SELECT {', '.join([f"{__get_jsonb_object(Account, 'accounts')} AS account"] + sections)}
+        FROM accounts
+        WHERE account_id = %s
+        """,
+        (account_id,),
+        AccountTree,
+        name="get_account_tree",
+    )
+
+
+# SEARCH
+# entity: (table, primary key, name).
+# Entities are matched on the full-text `search_vector` of their name and
+# text, served by its inverted index, except contacts, which are matched
+# on the trigram similarity of their names and email.
+SEARCH_SOURCES: dict[str, tuple[str, tuple[str, ...], str]] = {
+    "account": ("accounts", ("account_id",), "name"),
+    "contact": (
+        "contacts",
+        ("account_id", "contact_id"),
+        "concat_ws(' ', fname, lname)",
+    ),
+    "opportunity": ("opportunities", ("account_id", "opportunity_id"), "name"),
+    "project": (
+        "projects",
+        ("account_id", "opportunity_id", "project_id"),
+        "name",
+    ),
+    "task": (
+        "tasks",
+        ("account_id", "opportunity_id", "project_id", "task_id"),
+        "name",
+    ),
+    "account_note": ("account_notes", ("account_id", "note_id"), "name"),
+    "opportunity_note": (
+        "opportunity_notes",
+        ("account_id", "opportunity_id", "note_id"),
+        "name",
+    ),
+    "project_note": (
+        "project_notes",
+        ("account_id", "opportunity_id", "project_id", "note_id"),
+        "name",
+    ),
+}
+
+# the computed column matched on full text, as defined by the DDL
+SEARCH_VECTOR = (
+    "to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(text, ''))"
+)
+
+# hits are sorted by descending rank
+SEARCH_KEYSET = (("hits.rank", "rank"), ("hits.entity", "entity"), ("hits.id", "id"))
+
+
+def __get_search_select(entity: str, q: str) -> tuple[str, tuple]:
+    table, pk, name = SEARCH_SOURCES[entity]
+    key = ", ".join([f"'{x}', {x}" for x in pk])
+
+    if entity == "contact":
+        rank = "greatest(similarity(fname, %s), similarity(lname, %s), similarity(email, %s))"
+        match = "fname %% %s OR lname %% %s OR email %% %s"
+        bind_params: tuple = (q,) * 6
+    else:
+        rank = "ts_rank(search_vector, plainto_tsquery('english', %s))"
+        match = "search_vector @@ plainto_tsquery('english', %s)"
+        bind_params = (q,) * 2
+
+    return (
+        f"""
+        SELECT '{entity}' AS entity, {pk[-1]} AS id, jsonb_build_object({key}) AS key,
+            {name} AS name, ({rank})::FLOAT8 AS rank
+        FROM {table}
+        WHERE {match}
+        """,
+        bind_params,
+    )
+
+
+async def search(
+    q: str,
+    entities: list[str],
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: list | None = None,
+) -> list[SearchHit]:
+    selects = [__get_search_select(x, q) for x in dict.fromkeys(entities)]
+    cols = ", ".join([col for col, _ in SEARCH_KEYSET])
+
+    return await execute_stmt(
+        f"""
+        SELECT entity, id, key, name, rank
+        FROM ({" UNION ALL ".join([stmt for stmt, _ in selects])}) AS hits
+        WHERE {f"({cols}) < (%s, %s, %s)" if after else 'true'}
+        ORDER BY {" DESC, ".join([col for col, _ in SEARCH_KEYSET])} DESC
+        LIMIT %s
+        """,
+        sum([bind_params for _, bind_params in selects], ())
+        + tuple(after or ())
+        + (limit,),
+        SearchHit,
+        True,
+        name="search",
+    )
+
+
+# STATS
+# The counts are computed by a single GROUP BY over the (status, owned_by,
+# due week) of the whole table, then rolled up here into each dimension.
+# The scan is served by the `*_owned_by` index, which stores status and
+# due_date, rather than by the primary index with the text.
+# The stats are cached for STATS_CACHE_TTL_SECONDS, and read
+# STATS_STALENESS_SECONDS in the past, so that the scan doesn't contend
+# with the writes.
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", 10))
+STATS_STALENESS_SECONDS = float(os.getenv("STATS_STALENESS_SECONDS", 5))
+
+# the rows in these statuses are neither open nor overdue
+STATS_CLOSED_STATUSES = [
+    x.strip()
+    for x in os.getenv("STATS_CLOSED_STATUSES", "COMPLETED,CLOSED").split(",")
+    if x.strip()
+]
+
+__stats_cache: dict[str, tuple[float, PipelineStats]] = {}
+# a single request per entity computes expired stats, the others wait for it
+__stats_locks: dict[str, asyncio.Lock] = {}
+
+
+def invalidate_cached_stats(entity: str | None = None) -> None:
+    if entity:
+        __stats_cache.pop(entity, None)
+    else:
+        __stats_cache.clear()
+
+
+async def get_stats_rows(entity: str) -> list[tuple] | None:
+    """The counts of each (status, owned_by, due week), before the rollup."""
+    return await execute_stmt(
+        f"""
+        SELECT status, owned_by, date_trunc('week', due_date)::DATE AS week,
+            count(*) AS count,
+            count(*) FILTER (
+                WHERE NOT (COALESCE(status, '') = ANY (%s))
+            ) AS open,
+            count(*) FILTER (
+                WHERE due_date < current_date AND NOT (COALESCE(status, '') = ANY (%s))
+            ) AS overdue
+        FROM {entity}
+        {__get_as_of_clause(dt.timedelta(seconds=STATS_STALENESS_SECONDS))}
+        GROUP BY status, owned_by, week
+        """,
+        (STATS_CLOSED_STATUSES, STATS_CLOSED_STATUSES),
+        is_list=True,
+        name=f"get_stats_{entity}",
+    )
+
+
+async def __compute_stats(entity: str) -> PipelineStats | None:
+    rs = await get_stats_rows(entity)
+
+    if rs is None:
+        return None
+
+    by_status: dict[str | None, list[int]] = {}
+    by_owner: dict[str | None, list[int]] = {}
+    by_due_week: dict[dt.date | None, list[int]] = {}
+
+    for status, owned_by, week, count, open_, overdue in rs:
+        s = by_status.setdefault(status, [0, 0])
+        s[0] += count
+        s[1] += overdue
+
+        o = by_owner.setdefault(owned_by, [0, 0])
+        o[0] += open_
+        o[1] += overdue
+
+        w = by_due_week.setdefault(week, [0, 0])
+        w[0] += count
+        w[1] += overdue
+
+    return PipelineStats(
+        entity=entity,
+        total=sum([x[3] for x in rs]),
+        open=sum([x[4] for x in rs]),
+        overdue=sum([x[5] for x in rs]),
+        by_status=[
+            StatusCount(status=k, count=v[0], overdue=v[1])
+            for k, v in sorted(by_status.items(), key=lambda x: -x[1][0])
+        ],
+        by_owner=[
+            OwnerWorkload(owned_by=k, open=v[0], overdue=v[1])
+            for k, v in sorted(by_owner.items(), key=lambda x: -x[1][0])
+            if v[0]
+        ],
+        by_due_week=[
+            DueWeekCount(week=k, count=v[0], overdue=v[1])
+            for k, v in sorted(by_due_week.items(), key=lambda x: x[0] or dt.date.max)
+        ],
+        computed_at=dt.datetime.now(dt.timezone.utc),
+    )
+
+
+async def get_stats(entity: str) -> PipelineStats | None:
+    cached = __stats_cache.get(entity)
+
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    async with __stats_locks.setdefault(entity, asyncio.Lock()):
+        # computed by another request while waiting for the lock
+        cached = __stats_cache.get(entity)
+
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        stats = await __compute_stats(entity)
+
+        if stats:
+            __stats_cache[entity] = (time.monotonic() + STATS_CACHE_TTL_SECONDS, stats)
+
+        return stats
+
+
+# MANAGED INDEXES
+# The secondary indexes serving the list queries and the filters.
+# The covering indexes store the columns of an Overview model, dynamic
+# fields included, so a page is read from the index alone, without
+# a lookup into the primary index for every row.
+# storage/worst_crm.ddl.sql creates them for a new database. For an existing
+# database, or after a model changed, migrate_indexes() brings them up to date.
+PRIMARY_KEYS: dict[str, tuple[str, ...]] = {
+    "accounts": ("account_id",),
+    "contacts": ("account_id", "contact_id"),
+    "opportunities": ("account_id", "opportunity_id"),
+    "artifacts": ("account_id", "opportunity_id", "artifact_id"),
+    "projects": ("account_id", "opportunity_id", "project_id"),
+    "tasks": ("account_id", "opportunity_id", "project_id", "task_id"),
+    "account_notes": ("account_id", "note_id"),
+    "opportunity_notes": ("account_id", "opportunity_id", "note_id"),
+    "project_notes": ("account_id", "opportunity_id", "project_id", "note_id"),
+}
+
+# the global lists of artifacts and projects are read in keyset order
+ARTIFACTS_INDEX_KEYSET = tuple(col.split(".")[1] for col, _ in ARTIFACTS_KEYSET)
+PROJECTS_INDEX_KEYSET = tuple(col.split(".")[1] for col, _ in PROJECTS_KEYSET)
+
+# index name: (table, key columns, model whose fields are stored
+# or the stored columns, inverted)
+MANAGED_INDEXES: dict[str, tuple[str, tuple[str, ...], Any, bool]] = {
+    # ACCOUNTS
+    "accounts_name": ("accounts", ("name", "account_id"), AccountOverview, False),
+    "accounts_owned_by": (
+        "accounts",
+        ("owned_by", "name", "account_id"),
+        AccountOverview,
+        False,
+    ),
+    "accounts_status_due_date": ("accounts", ("status", "due_date"), None, False),
+    "accounts_due_date": ("accounts", ("due_date",), None, False),
+    "accounts_updated_at": ("accounts", ("updated_at",), None, False),
+    "accounts_tags_gin": ("accounts", ("tags",), None, True),
+    "accounts_name_trgm": ("accounts", ("name gin_trgm_ops",), None, True),
+    "accounts_search": ("accounts", ("search_vector",), None, True),
+    # CONTACTS
+    "contacts_fname": (
+        "contacts",
+        ("account_id", "fname", "contact_id"),
+        Contact,
+        False,
+    ),
+    "contacts_fname_trgm": ("contacts", ("fname gin_trgm_ops",), None, True),
+    "contacts_lname_trgm": ("contacts", ("lname gin_trgm_ops",), None, True),
+    "contacts_email_trgm": ("contacts", ("email gin_trgm_ops",), None, True),
+    # OPPORTUNITIES
+    "opportunities_name": (
+        "opportunities",
+        ("account_id", "name", "opportunity_id"),
+        OpportunityOverview,
+        False,
+    ),
+    # the stats scan reads status and due_date from it
+    "opportunities_owned_by": (
+        "opportunities",
+        ("owned_by",),
+        ("status", "due_date"),
+        False,
+    ),
+    "opportunities_status_due_date": (
+        "opportunities",
+        ("status", "due_date"),
+        None,
+        False,
+    ),
+    "opportunities_due_date": ("opportunities", ("due_date",), None, False),
+    "opportunities_updated_at": ("opportunities", ("updated_at",), None, False),
+    "opportunity_tags_gin": ("opportunities", ("tags",), None, True),
+    "opportunities_search": ("opportunities", ("search_vector",), None, True),
+    # ARTIFACTS
+    "artifacts_name": (
+        "artifacts",
+        ("account_id", "opportunity_id", "name", "artifact_id"),
+        ArtifactOverview,
+        False,
+    ),
+    "artifacts_account_name": (
+        "artifacts",
+        ARTIFACTS_INDEX_KEYSET,
+        ArtifactOverview,
+        False,
+    ),
+    "artifacts_updated_at": ("artifacts", ("updated_at",), None, False),
+    "artifact_tags_gin": ("artifacts", ("tags",), None, True),
+    # PROJECTS
+    "projects_name": (
+        "projects",
+        ("account_id", "opportunity_id", "name", "project_id"),
+        ProjectOverview,
+        False,
+    ),
+    "projects_account_name": (
+        "projects",
+        PROJECTS_INDEX_KEYSET,
+        ProjectOverview,
+        False,
+    ),
+    # the stats scan reads status and due_date from it
+    "projects_owned_by": ("projects", ("owned_by",), ("status", "due_date"), False),
+    "projects_status_due_date": ("projects", ("status", "due_date"), None, False),
+    "projects_due_date": ("projects", ("due_date",), None, False),
+    "projects_updated_at": ("projects", ("updated_at",), None, False),
+    "projects_tags_gin": ("projects", ("tags",), None, True),
+    "projects_search": ("projects", ("search_vector",), None, True),
+    # TASKS
+    "tasks_project_name": (
+        "tasks",
+        ("account_id", "opportunity_id", "project_name", "task_id DESC"),
+        TaskOverview,
+        False,
+    ),
+    # the stats scan reads status and due_date from it
+    "tasks_owned_by": ("tasks", ("owned_by",), ("status", "due_date"), False),
+    "tasks_status_due_date": ("tasks", ("status", "due_date"), None, False),
+    "tasks_due_date": ("tasks", ("due_date",), None, False),
+    "tasks_updated_at": ("tasks", ("updated_at",), None, False),
+    "tasks_tags_gin": ("tasks", ("tags",), None, True),
+    "tasks_search": ("tasks", ("search_vector",), None, True),
+    # NOTES
+    "account_notes_name": (
+        "account_notes",
+        ("account_id", "name", "note_id"),
+        AccountNoteOverview,
+        False,
+    ),
+    "account_notes_tags_gin": ("account_notes", ("tags",), None, True),
+    "account_notes_search": ("account_notes", ("search_vector",), None, True),
+    "opportunity_notes_name": (
+        "opportunity_notes",
+        ("account_id", "opportunity_id", "name", "note_id"),
+        OpportunityNoteOverview,
+        False,
+    ),
+    "opportunity_notes_tags_gin": ("opportunity_notes", ("tags",), None, True),
+    "opportunity_notes_search": ("opportunity_notes", ("search_vector",), None, True),
+    "project_notes_name": (
+        "project_notes",
+        ("account_id", "opportunity_id", "project_id", "name", "note_id"),
+        ProjectNoteOverview,
+        False,
+    ),
+    "project_notes_tags_gin": ("project_notes", ("tags",), None, True),
+    "project_notes_search": ("project_notes", ("search_vector",), None, True),
+}
+
+
+def __get_storing(name: str) -> list[str]:
+    table_name, columns, model, _ = MANAGED_INDEXES[name]
+
+    if not model:
+        return []
+
+    fields = list(model) if isinstance(model, tuple) else model.__fields__.keys()
+
+    # the primary key is part of every index already
+    key = [x.split()[0] for x in columns] + list(PRIMARY_KEYS[table_name])
+    return [x for x in fields if x not in key]
+
+
+def get_index_ddl(name: str, index_name: str | None = None) -> str:
+    table_name, columns, _, inverted = MANAGED_INDEXES[name]
+    storing = __get_storing(name)
+
+    return (
+        f"CREATE {'INVERTED ' if inverted else ''}INDEX {index_name or name} "
+        f"ON {table_name}({', '.join(columns)})"
+        + (f" STORING ({', '.join(storing)})" if storing else "")
+    )
+
+
+async def get_managed_indexes() -> list[ManagedIndex]:
+    rs = await execute_stmt(
+        """
+        SELECT table_name, index_name, column_name, storing = 'YES'
+        FROM information_schema.statistics
+        WHERE table_schema = 'public'
+            AND table_name = ANY (%s)
+            AND implicit = 'NO'
+        ORDER BY table_name, index_name, seq_in_index
+        """,
+        (list(PRIMARY_KEYS),),
+        is_list=True,
+        name="get_managed_indexes",
+    )
+
+    # (table, index): (key columns, stored columns)
+    existing: dict[tuple[str, str], tuple[list[str], set[str]]] = {}
+    for table_name, index_name, column_name, storing in rs or []:
+        columns, stored = existing.setdefault((table_name, index_name), ([], set()))
+        if storing:
+            stored.add(column_name)
+        else:
+            columns.append(column_name)
+
+    indexes = []
+    for name, (table_name, columns, _, inverted) in MANAGED_INDEXES.items():
+        storing = __get_storing(name)
+
+        if (table_name, name) not in existing:
+            status = "missing"
+        elif existing[(table_name, name)] != (
+            [x.split()[0] for x in columns],
+            set(storing),
+        ):
+            status = "stale"
+        else:
+            status = "ok"
+
+        indexes.append(
+            ManagedIndex(
+                name=name,
+                table_name=table_name,
+                columns=list(columns),
+                storing=storing,
+                inverted=inverted,
+                status=status,
+            )
+        )
+
+    return indexes
+
+
+async def __execute_ddl(stmt: str) -> None:
+    # unlike execute_stmt(), errors are raised: a migration must stop
+    # at the first failure
+    async with pool.connection() as conn:
+        await conn.execute(stmt)  # type: ignore
+
+
+async def migrate_indexes() -> list[ManagedIndex]:
+    """
+    Creates the missing managed indexes and rebuilds the stale ones.
+    Indexes are built online: the tables stay readable and writable
+    while the index is backfilled.
+    The new version of a stale index is built under a temporary name
+    and swapped in, so its queries never run without an index.
+    The columns that some indexes are keyed on, the search vectors and
+    the parent names, are added and filled in first.
+    """
+    search_tables = {
+        t for t, columns, _, _ in MANAGED_INDEXES.values() if "search_vector" in columns
+    }
+    for table_name in sorted(search_tables):
+        await __execute_ddl(
+            f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS "
+            f"search_vector TSVECTOR AS ({SEARCH_VECTOR}) STORED"
+        )
+
+    for table_name, names in PARENT_NAMES.items():
+        for col in names:
+            await __execute_ddl(
+                f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {col} STRING NULL"
+            )
+    await sync_parent_names()
+
+    for idx in await get_managed_indexes():
+        if idx.status == "missing":
+            await __execute_ddl(get_index_ddl(idx.name))
+        elif idx.status == "stale":
+            # left over by a migration that was interrupted
+            await __execute_ddl(f"DROP INDEX IF EXISTS {idx.table_name}@{idx.name}_new")
+            await __execute_ddl(get_index_ddl(idx.name, f"{idx.name}_new"))
+            await __execute_ddl(f"DROP INDEX {idx.table_name}@{idx.name}")
+            await __execute_ddl(
+                f"ALTER INDEX {idx.table_name}@{idx.name}_new RENAME TO {idx.name}"
+            )
+
+    return await get_managed_indexes()
+
+
+# METRICS
+statement_seconds = metrics.Histogram(
+    "worst_crm_db_statement_seconds",
+    "Duration of the named SQL statements, from execute to fetch.",
+    ("name",),
+)
+statement_errors = metrics.Counter(
+    "worst_crm_db_statement_errors_total",
+    "Failed executions of the named SQL statements.",
+    ("name",),
+)
+pool_checkout_seconds = metrics.Histogram(
+    "worst_crm_db_pool_checkout_seconds",
+    "Time waited to get a connection from the pool.",
+)
+
+# the pool keeps its own stats: they are read when scraped
+metrics.CallbackMetric(
+    "worst_crm_db_pool_connections",
+    "Connections of the pool: open, idle, and the configured min and max.",
+    "gauge",
+    lambda: {
+        (state,): pool.get_stats().get(f"pool_{state}", 0)
+        for state in ["size", "available", "min", "max"]
+    },
+    ("state",),
+)
+metrics.CallbackMetric(
+    "worst_crm_db_pool_requests_waiting",
+    "Requests currently waiting for a connection.",
+    "gauge",
+    lambda: {(): pool.get_stats().get("requests_waiting", 0)},
+)
+for __name, __stat, __doc in [
+    ("requests", "requests_num", "Connections requested from the pool."),
+    ("requests_queued", "requests_queued", "Requests that had to wait."),
+    ("requests_errors", "requests_errors", "Requests that timed out waiting."),
+    ("connections_errors", "connections_errors", "Failed attempts to connect."),
+    ("connections_lost", "connections_lost", "Broken connections discarded."),
+]:
+    metrics.CallbackMetric(
+        f"worst_crm_db_pool_{__name}_total",
+        __doc,
+        "counter",
+        lambda stat=__stat: {(): pool.get_stats().get(stat, 0)},
+    )
+
+
+# STATEMENT REGISTRY
+# execute_stmt() calls passing a `name` are tracked here. A named statement
+# whose text never changes is prepared server-side on each pooled connection.
+PREPARE_STATEMENTS = (
+    True
+    if os.getenv("PREPARE_STATEMENTS", "True").lower()
+    in ["true", "1", "t", "y", "yes", "on"]
+    else False
+)
+
+__statements: dict[str, dict[str, Any]] = {}
+# bumped when the dynamic columns change: connections of an older
+# generation deallocate their prepared statements at checkout
+__statements_generation = 0
+__connections_generation: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def __register_statement(name: str, stmt: str) -> bool:
+    s = __statements.get(name)
+
+    if not s:
+        s = __statements[name] = {
+            "sql": stmt,
+            "dynamic": False,
+            "calls": 0,
+            "errors": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+        }
+    elif not s["dynamic"] and s["sql"] != stmt:
+        # the text is built per call, ie. it has a variable WHERE clause:
+        # leave it to psycopg to prepare the variants that are used often
+        s["dynamic"] = True
+
+    return PREPARE_STATEMENTS and not s["dynamic"]
+
+
+def __record_statement(name: str, elapsed_ms: float, failed: bool) -> None:
+    s = __statements[name]
+    s["calls"] += 1
+    s["errors"] += failed
+    s["total_ms"] += elapsed_ms
+    s["max_ms"] = max(s["max_ms"], elapsed_ms)
+
+
+def __check_statements_generation(conn) -> None:
+    if __connections_generation.get(conn, __statements_generation) != (
+        __statements_generation
+    ):
+        # psycopg has no public API for this: clearing its cache of prepared
+        # statements queues a DEALLOCATE ALL, sent before the next statement.
+        # Toggling prepare_threshold keeps the cache. _prepared is private to
+        # psycopg 3.1, which pyproject.toml pins for this reason.
+        conn._prepared.clear()
+
+    __connections_generation[conn] = __statements_generation
+
+
+def invalidate_statements() -> None:
+    global __statements_generation
+
+    __statements_generation += 1
+    __statements.clear()
+
+
+def reset_statement_stats() -> None:
+    """Zeroes the counters, and keeps the statements prepared."""
+    for s in __statements.values():
+        s.update(calls=0, errors=0, total_ms=0.0, max_ms=0.0)
+
+
+def get_statement_stats() -> list[StatementStats]:
+    return [
+        StatementStats(
+            name=k,
+            sql=" ".join(v["sql"].split()),
+            prepared=PREPARE_STATEMENTS and not v["dynamic"],
+            calls=v["calls"],
+            errors=v["errors"],
+            total_ms=round(v["total_ms"], 3),
+            mean_ms=round(v["total_ms"] / v["calls"], 3) if v["calls"] else 0,
+            max_ms=round(v["max_ms"], 3),
+        )
+        for k, v in sorted(
+            __statements.items(), key=lambda x: x[1]["total_ms"], reverse=True
+        )
+    ]
+
+
+# models whose db columns don't match the field types, ie users.is_disabled
+# is a STRING, or that are built from JSON: these rows are always validated
+VALIDATED_MODELS = (User, UserInDB, AccountTree, SearchHit)
+
+__mappers: dict[tuple[Any, tuple[str, ...]], Callable[[Sequence[Any]], Any]] = {}
+
+
+def __compile_mapper(model: Any, col_names: tuple[str, ...]):
+    """
+    Returns a function building a model instance straight from a row tuple.
+    The rows come from typed columns, so instead of validating each value
+    the mapper only converts the arrays of the `set` fields, and fills in
+    the defaults of the fields that weren't selected, like `Model.construct()`.
+    """
+    if model in VALIDATED_MODELS:
+        return lambda row: model(**dict(zip(col_names, row)))
+
+    idx = {k: i for i, k in enumerate(col_names)}
+    plan = [
+        (name, idx.get(name), field.shape == SHAPE_SET, field)
+        for name, field in model.__fields__.items()
+    ]
+    fields_set = {name for name, i, _, _ in plan if i is not None}
+
+    def mapper(row: Sequence[Any]):
+        values = {}
+        for name, i, is_set, field in plan:
+            if i is None:
+                values[name] = field.get_default()
+            elif is_set and row[i] is not None:
+                values[name] = set(row[i])
+            else:
+                values[name] = row[i]
+
+        m = model.__new__(model)
+        object.__setattr__(m, "__dict__", values)
+        object.__setattr__(m, "__fields_set__", set(fields_set))
+        return m
+
+    return mapper
+
+
+def __model_row(model: Any):
+    """
+    A psycopg row factory returning instances of `model`.
+    The mapper is compiled once per (model, selected columns).
+    """
+
+    def row_factory(cur) -> Callable[[Sequence[Any]], Any]:
+        if not cur.description:
+            # the statement returns no rows
+            return tuple
+
+        col_names = tuple(desc.name for desc in cur.description)
+        mapper = __mappers.get((model, col_names))
+        if not mapper:
+            mapper = __mappers[(model, col_names)] = __compile_mapper(model, col_names)
+        return mapper
+
+    return row_factory
+
+
+# EXPLAIN
+# Within explain(), execute_stmt() returns the plan of the statement
+# instead of running it: the tests use it to check which indexes are used.
+__explaining: ContextVar[bool] = ContextVar("explaining", default=False)
+
+
+async def explain(fn: Callable[..., Awaitable], *args, **kwargs) -> list[str]:
+    """
+    Calls the db function fn, and returns the EXPLAIN output
+    of the statement it executes, one line per item.
+    """
+    token = __explaining.set(True)
+    try:
+        return await fn(*args, **kwargs)
+    finally:
+        __explaining.reset(token)
+
+
+async def __explain_stmt(stmt: str, args: tuple, analyze: bool = False) -> list[str]:
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"EXPLAIN {'ANALYZE ' if analyze else ''}{stmt}", args  # type: ignore
+            )
+            return [row[0] for row in await cur.fetchall()]
+
+
+# SLOW QUERIES
+# Statements taking longer than SLOW_QUERY_THRESHOLD_MS are logged, and kept
+# in a ring buffer of the last SLOW_QUERY_LOG_SIZE.
+# A sample of the slow SELECTs is run again with EXPLAIN ANALYZE, in the
+# background: at most one at a time, and once per statement name every
+# SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS. Only the named SELECTs are explained:
+# EXPLAIN ANALYZE runs the statement again, so writes, and the SELECTs with
+# side effects listed in SLOW_QUERY_EXPLAIN_EXCLUDED, never are.
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 500))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", 100))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.1))
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(
+    os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", 60)
+)
+
+# the named SELECTs that aren't read-only
+SLOW_QUERY_EXPLAIN_EXCLUDED = {"notify"}
+
+__slow_queries: deque[SlowQuery] = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+# statement: monotonic time of its last EXPLAIN ANALYZE
+__slow_query_explained: dict[str, float] = {}
+__slow_query_explains: set[asyncio.Task] = set()
+
+
+def get_slow_queries() -> list[SlowQuery]:
+    return sorted(__slow_queries, key=lambda x: x.executed_at, reverse=True)
+
+
+def clear_slow_queries() -> None:
+    __slow_queries.clear()
+    __slow_query_explained.clear()
+
+
+def __get_param_shape(x: Any) -> str:
+    if isinstance(x, (list, tuple, set)):
+        return f"{type(x).__name__}[{len(x)}]"
+
+    return "null" if x is None else type(x).__name__
+
+
+def __should_explain(name: str | None, stmt: str) -> bool:
+    if (
+        not name
+        or name in SLOW_QUERY_EXPLAIN_EXCLUDED
+        or __slow_query_explains
+        or random.random() >= SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+        or not stmt.lstrip().upper().startswith("SELECT")
+    ):
+        return False
+
+    last = __slow_query_explained.get(name)
+    if last and time.monotonic() - last < SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS:
+        return False
+
+    __slow_query_explained[name] = time.monotonic()
+    return True
+
+
+async def __explain_slow_query(entry: SlowQuery, stmt: str, args: tuple) -> None:
+    try:
+        entry.plan = await __explain_stmt(stmt, args, analyze=True)
+    except Exception:
+        logger.exception("EXPLAIN ANALYZE of slow query %s failed", entry.name)
+
+
+def __log_slow_query(
+    name: str | None,
+    stmt: str,
+    args: tuple,
+    rows: int | None,
+    elapsed_ms: float,
+    failed: bool,
+) -> None:
+    entry = SlowQuery(
+        name=name,
+        sql=stmt,
+        params=[__get_param_shape(x) for x in args],
+        rows=rows,
+        duration_ms=elapsed_ms,
+        failed=failed,
+        executed_at=dt.datetime.now(dt.timezone.utc),
+    )
+    __slow_queries.append(entry)
+
+    logger.warning(
+        "slow query: %s took %.1fms, rows=%s params=%s",
+        name or "<unnamed>",
+        elapsed_ms,
+        rows,
+        entry.params,
+    )
+
+    if not failed and __should_explain(name, stmt):
+        task = asyncio.create_task(__explain_slow_query(entry, stmt, args))
+        __slow_query_explains.add(task)
+        task.add_done_callback(__slow_query_explains.discard)
+
+
+async def execute_stmt(
     stmt: str,
     args: tuple = (),
     model: Any = None,
     is_list: bool = False,
     returning_rs: bool = True,
+    name: str | None = None,
 ) -> Any:
-    with pool.connection() as conn:
-        # convert a set to a psycopg list
-        conn.adapters.register_dumper(set, ListDumper)
-        conn.adapters.register_dumper(dict, DictJsonbDumper)
-
-        with conn.cursor() as cur:
-            try:
-                cur.execute(stmt, args)  # type: ignore
-
-                if not returning_rs:
-                    return
-
-                if not cur.description:
-                    raise ValueError("Could not fetch column names from ResultSet")
-                col_names = [desc[0] for desc in cur.description]
-
-                if is_list:
-                    rsl = cur.fetchall()
-
-                    if model:
-                        return [
-                            model(**{k: rs[i] for i, k in enumerate(col_names)})
-                            for rs in rsl
-                        ]
+    if __explaining.get():
+        return await __explain_stmt(stmt, args)
+
+    with tracing.span(
+        "execute_stmt", **{"db.system": "cockroachdb", "db.statement.name": name}
+    ) as span:
+        # named statements are prepared, as long as their text doesn't change
+        prepare = __register_statement(name, stmt) if name else False
+
+        checkout = time.perf_counter()
+        checkout_ns = time.time_ns()
+
+        async with pool.connection() as conn:
+            pool_checkout_seconds.observe(time.perf_counter() - checkout)
+            tracing.add_span("pool_checkout", checkout_ns)
+            __check_statements_generation(conn)
+
+            async with conn.cursor(
+                row_factory=__model_row(model) if model else tuple_row
+            ) as cur:
+                start = time.perf_counter()
+                failed = False
+                try:
+                    await cur.execute(stmt, args, prepare=prepare or None)  # type: ignore
+
+                    if not returning_rs:
+                        return
+
+                    if not cur.description:
+                        raise ValueError("Could not fetch column names from ResultSet")
+
+                    if is_list:
+                        return await cur.fetchall()
                     else:
-                        return rsl
-                else:
-                    rs = cur.fetchone()
-                    if rs:
-                        if model:
-                            return model(**{k: rs[i] for i, k in enumerate(col_names)})
-                        else:
-                            return rs
-                    else:
-                        return None
-            except Exception as e:
-                # TODO correctly handle error such as PK violations
-                print(e)
-                return None
+                        return await cur.fetchone()
+                except Exception as e:
+                    failed = True
+                    # TODO correctly handle error such as PK violations
+                    print(e)
+                    return None
+                finally:
+                    elapsed = time.perf_counter() - start
+
+                    if elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+                        __log_slow_query(
+                            name,
+                            stmt,
+                            args,
+                            None if failed or cur.rowcount < 0 else cur.rowcount,
+                            elapsed * 1000,
+                            failed,
+                        )
+
+                    if span:
+                        span.set_attribute("db.rows", cur.rowcount)
+                        if failed:
+                            span.status = "ERROR"
+
+                    if name:
+                        __record_statement(name, elapsed * 1000, failed)
+                        statement_seconds.observe(elapsed, name)
+                        if failed:
+                            statement_errors.inc(name)
+
+
+async def stream_stmt(stmt: str, args: tuple = ()) -> AsyncIterator[dict[str, Any]]:
+    """
+    Yields the rows of the ResultSet one at a time, as dicts.
+    The rows are read through a server-side cursor, EXPORT_BATCH_SIZE at a time,
+    so memory usage does not depend on the size of the ResultSet.
+    """
+    async with pool.connection() as conn:
+        # server-side cursors only live within a transaction
+        async with conn.transaction():
+            async with conn.cursor(name="stream_stmt", row_factory=dict_row) as cur:
+                cur.itersize = EXPORT_BATCH_SIZE
+                try:
+                    await cur.execute(stmt, args)  # type: ignore
+
+                    async for row in cur:
+                        yield row
+                except Exception as e:
+                    # the response has already started: all we can do is to stop
+                    print(e)
+
+
+async def __update_row(
+    table_name: str,
+    pk: dict[str, Any],
+    update_data: dict[str, Any],
+    returning_cols: str,
+    model: Any,
+    expected_updated_at: dt.datetime | None = None,
+    name: str | None = None,
+) -> Any:
+    """
+    Updates only the columns in update_data in a single round trip,
+    and returns the updated row.
+    If expected_updated_at is given, the row is only updated if it
+    hasn't changed since: None is returned otherwise.
+    """
+    update_data = {k: v for k, v in update_data.items() if k not in pk}
+
+    # nothing to update, but the row is still returned
+    set_clause = ", ".join([f"{k} = %s" for k in update_data]) or ", ".join(
+        [f"{k} = {k}" for k in pk]
+    )
+    where_clause = f"({', '.join(pk)}) = ({('%s, ' * len(pk))[:-2]})"
+    bind_params = tuple(update_data.values()) + tuple(pk.values())
+
+    if expected_updated_at:
+        where_clause += " AND updated_at = %s"
+        bind_params += (expected_updated_at,)
+
+    return await execute_stmt(
+        f"""
+        UPDATE {table_name} SET
+            {set_clause}
+        WHERE {where_clause}
+        RETURNING {returning_cols}
+        """,
+        bind_params,
+        model,
+        name=name,
+    )
+
+
+async def __bulk_upsert(
+    table_name: str, pk: tuple[str, ...], rows: list[Any]
+) -> list[BulkResult]:
+    """
+    Upserts the rows, BULK_BATCH_SIZE at a time, in a single transaction.
+    Each batch is written with a multi-row INSERT .. ON CONFLICT DO UPDATE
+    within a savepoint: if a batch fails, its rows are retried one by one
+    so that only the offending rows are reported as failed.
+    An existing row is only updated in the columns the client set: the rows
+    are batched by their set of fields, each with its own DO UPDATE SET.
+    """
+    if not rows:
+        return []
+
+    name_cols, name_subqueries, _ = __get_parent_names(table_name, rows[0])
+    cols = list(rows[0].__fields__.keys())
+    placeholders = f"({', '.join(['%s'] * len(cols) + name_subqueries)})"
+
+    def get_update_cols(row: Any) -> tuple[str, ...]:
+        # created_by is kept as is when the row already exists
+        return tuple(
+            x
+            for x in cols
+            if x in row.__fields_set__ and x not in pk and x != "created_by"
+        ) + tuple(name_cols)
+
+    def get_stmt(n: int, update_cols: tuple[str, ...]) -> str:
+        return f"""
+            INSERT INTO {table_name} ({', '.join(cols + name_cols)})
+            VALUES {', '.join([placeholders] * n)}
+            ON CONFLICT ({', '.join(pk)}) DO """ + (
+            f"UPDATE SET {', '.join([f'{x} = excluded.{x}' for x in update_cols])}"
+            if update_cols
+            else "NOTHING"
+        )
+
+    def get_params(row: Any) -> tuple:
+        return tuple(row.dict().values()) + __get_parent_names(table_name, row)[2]
+
+    def get_result(index: int, row: Any, error: Exception | None = None):
+        key = {x: getattr(row, x) for x in pk}
+
+        if error is None:
+            return BulkResult(index=index, key=key, ok=True)
+
+        logger.warning("bulk upsert into %s of %s failed: %s", table_name, key, error)
+        sqlstate = getattr(error, "sqlstate", None)
+
+        return BulkResult(
+            index=index,
+            key=key,
+            ok=False,
+            error=(
+                f"{sqlstate}: {BULK_ERRORS.get(sqlstate, BULK_UNKNOWN_ERROR)}"
+                if sqlstate
+                else BULK_UNKNOWN_ERROR
+            ),
+        )
+
+    # update columns: indexes of the rows, in order
+    groups: dict[tuple[str, ...], list[int]] = {}
+    for i, x in enumerate(rows):
+        groups.setdefault(get_update_cols(x), []).append(i)
+
+    results: list[BulkResult] = []
+
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                for update_cols, indexes in groups.items():
+                    for start in range(0, len(indexes), BULK_BATCH_SIZE):
+                        batch = indexes[start : start + BULK_BATCH_SIZE]
+
+                        try:
+                            async with conn.transaction():
+                                await cur.execute(
+                                    get_stmt(len(batch), update_cols),  # type: ignore
+                                    tuple(
+                                        v for i in batch for v in get_params(rows[i])
+                                    ),
+                                )
+                            results += [get_result(i, rows[i]) for i in batch]
+                            continue
+                        except Exception as e:
+                            logger.info(
+                                "bulk upsert into %s of %d rows failed, "
+                                "retrying them one by one: %s",
+                                table_name,
+                                len(batch),
+                                e,
+                            )
+
+                        for i in batch:
+                            try:
+                                async with conn.transaction():
+                                    await cur.execute(
+                                        get_stmt(1, update_cols),  # type: ignore
+                                        get_params(rows[i]),
+                                    )
+                                results.append(get_result(i, rows[i]))
+                            except Exception as e:
+                                results.append(get_result(i, rows[i], e))
+
+    results.sort(key=lambda x: x.index)
+
+    # the rows upserted may have renamed a parent
+    if table_name in PARENT_TABLES:
+        __propagate_parent_names(table_name, [x.key for x in results if x.ok])
+
+    return results
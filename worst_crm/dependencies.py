@@ -1,15 +1,25 @@
+import asyncio
+import base64
 import datetime as dt
-from typing import Annotated
-
-from fastapi import Depends, HTTPException, status
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, Any, AsyncIterator, Callable, Literal
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute, request_response
+from fastapi.utils import create_cloned_field, create_response_field
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from pydantic.json import pydantic_encoder
 import os
+import time
 import minio
 import validators
 
-from worst_crm import db
+from worst_crm import db, metrics, tracing
 from worst_crm.models import UserInDB
 
 # to get a string like this run:
@@ -47,6 +57,7 @@ minio_client = minio.Minio(
 )
 
 
+@tracing.traced()
 def get_presigned_get_url(filename: str) -> str:
     data = minio_client.presigned_get_object(
         S3_BUCKET,
@@ -60,6 +71,7 @@ def get_presigned_get_url(filename: str) -> str:
         raise ValueError(f"Could not generate presigned-get-url for {filename}")
 
 
+@tracing.traced()
 def get_presigned_put_url(filename: str):
     data = minio_client.presigned_put_object(
         S3_BUCKET,
@@ -73,20 +85,227 @@ def get_presigned_put_url(filename: str):
         raise ValueError(f"Could not generate presigned-put-url for {filename}")
 
 
+@tracing.traced()
 def s3_remove_object(filename: str):
     minio_client.remove_object(S3_BUCKET, filename)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# keyset pagination: the cursor is the opaque encoding of the keyset
+# values of the last row of the page, returned in the X-Next-Cursor header.
+def decode_cursor(cursor: str | None, keyset: tuple) -> list | None:
+    if not cursor:
+        return None
+
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError):
+        after = None
+
+    if (
+        not isinstance(after, list)
+        or len(after) != len(keyset)
+        or not all(x is None or isinstance(x, (str, int, float)) for x in after)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid cursor",
+        )
+
+    return after
+
+
+def set_next_cursor(response: Response, items: list, limit: int, keyset: tuple):
+    if not items or len(items) < limit:
+        return
+
+    values = [getattr(items[-1], field) for _, field in keyset]
+
+    response.headers["X-Next-Cursor"] = base64.urlsafe_b64encode(
+        json.dumps(values, default=str).encode()
+    ).decode()
+
+
+# bounded staleness: list endpoints accept ie `?staleness=5s` (in ms, s or m),
+# to be served by the nearest replica with data up to that old.
+# DEFAULT_STALENESS applies when the parameter is not given.
+DEFAULT_STALENESS = os.getenv("DEFAULT_STALENESS")
+MAX_STALENESS_SECONDS = float(os.getenv("MAX_STALENESS_SECONDS", 60))
+STALENESS_UNITS = {
+    "ms": dt.timedelta(milliseconds=1),
+    "s": dt.timedelta(seconds=1),
+    "m": dt.timedelta(minutes=1),
+}
+
+
+@tracing.traced()
+def get_staleness(
+    staleness: Annotated[str | None, Query(regex=r"^\d+(ms|s|m)$")] = DEFAULT_STALENESS,
+) -> dt.timedelta | None:
+    if not staleness:
+        return None
+
+    m = re.match(r"^(\d+)(ms|s|m)$", staleness)
+
+    if not m:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid staleness '{staleness}'",
+        )
+
+    value = int(m.group(1)) * STALENESS_UNITS[m.group(2)]
+
+    if value.total_seconds() > MAX_STALENESS_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"staleness can't exceed {MAX_STALENESS_SECONDS}s",
+        )
+
+    return value
+
+
+# exports: rows are encoded as they are read from the db server-side cursor
+# and flushed EXPORT_CHUNK_SIZE at a time, so the result set is never held in memory.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 500))
+
+ExportFormat = Literal["ndjson", "json"]
+
+
+async def __encode_rows(
+    rows: AsyncIterator[dict[str, Any]], format: ExportFormat
+) -> AsyncIterator[str]:
+    chunk: list[str] = ["["] if format == "json" else []
+    count = 0
+
+    async for row in rows:
+        line = json.dumps(row, default=pydantic_encoder)
+
+        if format == "ndjson":
+            chunk.append(line + "\n")
+        else:
+            chunk.append(("," if count else "") + line)
+        count += 1
+
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+
+    if format == "json":
+        chunk.append("]")
+
+    yield "".join(chunk)
+
+
+def export_response(
+    rows: AsyncIterator[dict[str, Any]], format: ExportFormat
+) -> StreamingResponse:
+    return StreamingResponse(
+        __encode_rows(rows, format),
+        media_type="application/x-ndjson" if format == "ndjson" else "application/json",
+    )
+
+
+def raise_if_stale(current: Any):
+    # the conditional update didn't match any row:
+    # if the row still exists, it was modified in the meantime
+    if current:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The record was modified since `expected_updated_at`",
+        )
+
+
+# dynamic models are reloaded in place: the classes keep their identity,
+# but FastAPI cloned each response model into a new class when the routes
+# were created, and cached the OpenAPI schema. Both are rebuilt here.
+async def reload_models(app: FastAPI) -> None:
+    await db.refresh_models()
+    refresh_routes(app)
+
+
+def refresh_routes(app: FastAPI) -> None:
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+
+        if route.response_model:
+            route.response_field = create_response_field(
+                name=route.response_field.name, type_=route.response_model
+            )
+            route.secure_cloned_response_field = create_cloned_field(
+                route.response_field
+            )
+        route.app = request_response(route.get_route_handler())
+
+    app.openapi_schema = None
+
+
+# bcrypt takes 100+ ms of CPU per call: it runs on a bounded thread pool,
+# off the event loop. bcrypt releases the GIL, so the workers run in parallel.
+# Requests beyond the workers plus the queue are rejected with a 503
+# rather than piling up behind a login storm.
+HASHING_WORKERS = int(os.getenv("HASHING_WORKERS", os.cpu_count() or 1))
+HASHING_MAX_QUEUE = int(os.getenv("HASHING_MAX_QUEUE", 4 * HASHING_WORKERS))
+
+hashing_executor = ThreadPoolExecutor(
+    max_workers=HASHING_WORKERS, thread_name_prefix="hashing"
+)
+__hashing_in_flight = 0
+
+# the time spent hashing, in the worker, excluding the wait for a worker
+hashing_seconds = metrics.Histogram(
+    "worst_crm_auth_hashing_seconds",
+    "CPU time of bcrypt, by operation: hash or verify.",
+    ("operation",),
+)
+metrics.CallbackMetric(
+    "worst_crm_auth_hashing_in_flight",
+    "Hashing requests running or queued for a worker.",
+    "gauge",
+    lambda: {(): __hashing_in_flight},
+)
+
+
+def __timed(fn: Callable, *args) -> tuple[Any, float]:
+    start = time.perf_counter()
+    return (fn(*args), time.perf_counter() - start)
+
+
+async def __run_hashing(fn: Callable, *args) -> Any:
+    global __hashing_in_flight
+
+    if __hashing_in_flight >= HASHING_WORKERS + HASHING_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent authentication requests, retry later.",
+            headers={"Retry-After": "1"},
+        )
+
+    __hashing_in_flight += 1
+    try:
+        result, elapsed = await asyncio.get_running_loop().run_in_executor(
+            hashing_executor, __timed, fn, *args
+        )
+    finally:
+        __hashing_in_flight -= 1
 
+    hashing_seconds.observe(elapsed, fn.__name__)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return result
 
 
-def authenticate_user(username: str, password: str) -> UserInDB | None:
-    user: UserInDB | None = db.get_user_with_hash(username)
+@tracing.traced()
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await __run_hashing(pwd_context.verify, plain_password, hashed_password)
+
+
+@tracing.traced()
+async def get_password_hash(password: str) -> str:
+    return await __run_hashing(pwd_context.hash, password)
+
+
+@tracing.traced()
+async def authenticate_user(username: str, password: str) -> UserInDB | None:
+    user: UserInDB | None = await db.get_user_with_hash(username)
 
     if not user:
         return None
@@ -95,8 +314,8 @@ def authenticate_user(username: str, password: str) -> UserInDB | None:
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
             detail="User is locked. Contact your Administrator.",
         )
-    if not verify_password(password, user.hashed_password):
-        db.increase_failed_attempt_count(user.user_id)
+    if not await verify_password(password, user.hashed_password):
+        await db.increase_failed_attempt_count(user.user_id)
         return None
     return user
 
@@ -115,8 +334,56 @@ def create_access_token(data: dict, expire_seconds: int) -> str:
     return encoded_jwt
 
 
+jwt_decode_seconds = metrics.Histogram(
+    "worst_crm_auth_jwt_decode_seconds",
+    "Time to verify and decode the JWT of a request.",
+)
+
+
+@tracing.traced()
+async def get_identity(
+    request: Request, token: str
+) -> tuple[UserInDB, list[str]] | None:
+    """
+    Decodes the JWT and loads its user once per request.
+
+    The scoped and unscoped variants of get_current_user have different
+    cache keys for FastAPI, so the identity is kept in the request state.
+    """
+    identity = getattr(request.state, "identity", None)
+
+    if identity:
+        return identity
+
+    start = time.perf_counter()
+    try:
+        payload = jwt.decode(token, JWT_KEY, JWT_KEY_ALGORITHM)
+    except (JWTError, Exception):
+        return None
+    finally:
+        jwt_decode_seconds.observe(time.perf_counter() - start)
+
+    token_username = payload.get("sub", "")
+    token_scopes = payload.get("scopes", [])
+
+    if not token_username:
+        return None
+
+    user: UserInDB | None = await db.get_cached_user_with_hash(token_username)
+
+    if not user:
+        return None
+
+    request.state.identity = (user, token_scopes)
+
+    return request.state.identity
+
+
+@tracing.traced()
 async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)], security_scopes: SecurityScopes
+    request: Request,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    security_scopes: SecurityScopes,
 ) -> UserInDB:
     if security_scopes.scopes:
         authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
@@ -129,21 +396,12 @@ async def get_current_user(
         headers={"WWW-Authenticate": authenticate_value},
     )
 
-    try:
-        payload = jwt.decode(token, JWT_KEY, JWT_KEY_ALGORITHM)
-    except (JWTError, Exception):
-        raise credentials_exception
+    identity = await get_identity(request, token)
 
-    token_username = payload.get("sub", "")
-    token_scopes = payload.get("scopes", [])
-
-    if not token_username:
+    if not identity:
         raise credentials_exception
 
-    user: UserInDB | None = db.get_user_with_hash(token_username)
-
-    if not user:
-        raise credentials_exception
+    user, token_scopes = identity
 
     for scope in security_scopes.scopes:
         if scope not in token_scopes:
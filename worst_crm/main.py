@@ -1,7 +1,6 @@
-import threading
-import time
-from fastapi.responses import FileResponse
-from worst_crm import db
+import asyncio
+from fastapi.responses import FileResponse, Response
+from worst_crm import db, metrics, notifications, tracing
 from fastapi import FastAPI, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import Annotated
@@ -14,10 +13,11 @@ from worst_crm.routers import (
     artifact_schemas,
     projects,
     notes,
+    search,
+    stats,
     tasks,
 )
 import os
-from pathlib import Path
 import worst_crm.dependencies as dep
 from worst_crm.routers.admin import admin
 from fastapi.middleware.cors import CORSMiddleware
@@ -43,7 +43,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 @app.get(
@@ -58,6 +61,11 @@ async def healthcheck() -> dict:
     return {}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/me", dependencies=[Depends(dep.get_current_user)])
 async def get_user_me(
     current_user: Annotated[User, Depends(dep.get_current_user)]
@@ -71,16 +79,16 @@ async def update_password(
     new_password: Annotated[str, Query(min_length=8, max_length=50)],
     current_user: Annotated[User, Depends(dep.get_current_user)],
 ) -> bool:
-    user = db.get_user_with_hash(current_user.user_id)
-    if not user or not dep.verify_password(old_password, user.hashed_password):
+    user = await db.get_user_with_hash(current_user.user_id)
+    if not user or not await dep.verify_password(old_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
         )
 
-    user = db.update_user(
+    user = await db.update_user(
         current_user.user_id,
-        UpdatedUserInDB(hashed_password=dep.get_password_hash(new_password)),
+        UpdatedUserInDB(hashed_password=await dep.get_password_hash(new_password)),
     )
 
     return bool(user)
@@ -88,7 +96,7 @@ async def update_password(
 
 @app.post("/login", tags=["auth"])
 async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> Token:
-    user: UserInDB | None = dep.authenticate_user(
+    user: UserInDB | None = await dep.authenticate_user(
         form_data.username, form_data.password
     )
     if not user:
@@ -114,31 +122,52 @@ app.include_router(artifact_schemas.router)
 app.include_router(projects.router)
 app.include_router(tasks.router)
 app.include_router(notes.router)
+app.include_router(search.router)
+app.include_router(stats.router)
 
 
 # ADMIN
 app.include_router(admin.router)
 
-# uvicorn server is started and configured to reload
-# if file 'watch.txt' changes.
-# Thus, whenever the app wants to instruct uvicorn to reboot itself,
-# it just has to touch that file.
-# To make sure that every instance of the app reboots,
-# the app updates a db entry that is periodically fetched by
-# every instance. If the value is different than the initial value,
-# the app touches file watch.txt which will cause uvicorn to reload the app.
 
-# store initial value at startup
-watch_epoch = db.get_watch()
+# every instance reloads its dynamic models in place
+# whenever any instance updates a model: no restart is needed
+async def reload_models():
+    await dep.reload_models(app)
+
+
+notifications.subscribe("models", reload_models)
+
+
+# keep a reference to the background tasks so they are not garbage collected
+background_tasks: set[asyncio.Task] = set()
+
+
+@app.on_event("startup")
+async def startup():
+    await db.pool.open()
+
+    # store the current version of each topic at startup
+    await db.migrate_watch()
+    await notifications.init()
+
+    # listen for changes and, if enabled, catch up on the parent renames
+    # whose propagation was interrupted by a restart
+    coros = notifications.get_watchers()
+    if db.SYNC_PARENT_NAMES_ON_STARTUP:
+        coros.append(db.sync_parent_names())
 
+    for coro in coros:
+        task = asyncio.create_task(coro)
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
 
-def watch_it(watch_epoch: int):
-    while True:
-        if db.get_watch() > watch_epoch:
-            Path("watch.txt").touch()
 
-        time.sleep(15)
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
 
+    dep.hashing_executor.shutdown(wait=False, cancel_futures=True)
 
-# periodically check if a restart is needed
-threading.Thread(target=watch_it, args=(watch_epoch,), daemon=True).start()
+    await db.pool.close()
@@ -0,0 +1,217 @@
+"""
+Metrics in the Prometheus text exposition format, served at /metrics.
+
+Observing a value is a dict lookup and a couple of additions, done on the
+event loop: there are no locks, and the text is only built when scraped.
+The private helpers have a single underscore, as the classes use them
+and a double one would be mangled.
+Label values must come from a bounded set (route templates, statement names),
+never from user input.
+"""
+from bisect import bisect_left
+from typing import Callable, Literal
+import time
+
+# the response adds the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# in seconds
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_metrics: list["Histogram | Counter | CallbackMetric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    labels = [f'{k}="{_escape(str(v))}"' for k, v in zip(names, values)]
+
+    if extra:
+        labels.append(extra)
+
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _header(name: str, documentation: str, kind: str) -> list[str]:
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels: [count per bucket, the last one for +Inf, sum]
+        self.series: dict[tuple, list] = {}
+        _metrics.append(self)
+
+    def observe(self, value: float, *labels: str) -> None:
+        s = self.series.get(labels)
+
+        if s is None:
+            s = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        s[0][bisect_left(self.buckets, value)] += 1
+        s[1] += value
+
+    def collect(self) -> list[str]:
+        lines = _header(self.name, self.documentation, "histogram")
+
+        for labels, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for le, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bound = "+Inf" if le == float("inf") else repr(le)
+                labels_str = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels_str} {cumulative}")
+
+            labels_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{labels_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels_str} {cumulative}")
+
+        return lines
+
+
+class Counter:
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.series: dict[tuple, float] = {}
+        _metrics.append(self)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def collect(self) -> list[str]:
+        lines = _header(self.name, self.documentation, "counter")
+
+        for labels, value in sorted(self.series.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)}"
+                f" {_format_value(value)}"
+            )
+
+        return lines
+
+
+class CallbackMetric:
+    """
+    A metric whose values are read from elsewhere when scraped:
+    fn returns the value for each tuple of label values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: Literal["gauge", "counter"],
+        fn: Callable[[], dict[tuple, float]],
+        labelnames: tuple[str, ...] = (),
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.fn = fn
+        self.labelnames = labelnames
+        _metrics.append(self)
+
+    def collect(self) -> list[str]:
+        lines = _header(self.name, self.documentation, self.kind)
+
+        for labels, value in sorted(self.fn().items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)}"
+                f" {_format_value(value)}"
+            )
+
+        return lines
+
+
+def render() -> str:
+    lines: list[str] = []
+
+    for m in _metrics:
+        try:
+            lines += m.collect()
+        except Exception as e:
+            # a failing callback must not hide the other metrics
+            print(e)
+
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+http_request_seconds = Histogram(
+    "worst_crm_http_request_seconds",
+    "Duration of the HTTP requests, by route template and status code.",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request, until the response is fully sent.
+    A plain ASGI middleware: BaseHTTPMiddleware would add a task
+    and a queue to every request.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router sets the matched route in the scope: its template,
+            # not the actual path, keeps the number of series bounded
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                getattr(route, "path", "<unmatched>"),
+                str(status_code),
+            )
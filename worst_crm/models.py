@@ -1,4 +1,6 @@
-from pydantic import create_model, BaseModel, Field, EmailStr
+from pydantic import create_model, root_validator, BaseModel, Field, EmailStr
+from pydantic.fields import SHAPE_SINGLETON
+from typing import Any, Literal
 from uuid import UUID
 import datetime as dt
 import os
@@ -15,26 +17,29 @@ if not DB_URL:
     raise EnvironmentError("DB_URL env variable not found!")
 
 
-def fetch_model_definition(model_name: str) -> dict[str, dict]:
-    def to_snake_case(string):
-        return re.sub(r"(.)([A-Z])", r"\1_\2", str(string)).lower()
-
-    with psycopg.connect(DB_URL, autocommit=True) as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT model_def 
-                FROM models
-                WHERE name = %s""",
-                (to_snake_case(model_name),),
-            )
+def to_snake_case(string):
+    return re.sub(r"(.)([A-Z])", r"\1_\2", str(string)).lower()
+
+
+# all model definitions are read at once, on a single connection,
+# the first time a dynamic model is built
+__model_defs: dict[str, dict] | None = None
+
 
-            rs = cur.fetchone()
+def fetch_model_definitions() -> dict[str, dict]:
+    global __model_defs
 
-            if rs:
-                return rs[0]
+    if __model_defs is None:
+        with psycopg.connect(DB_URL, autocommit=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT name, model_def FROM models")
+                __model_defs = {name: model_def for name, model_def in cur.fetchall()}
 
-    return {}
+    return __model_defs
+
+
+def fetch_model_definition(model_name: str) -> dict[str, dict]:
+    return fetch_model_definitions().get(to_snake_case(model_name), {})
 
 
 def build_model_tuple(d: dict[str, dict]) -> dict:
@@ -88,16 +93,69 @@ def extend_filter_model(name: str, base, dict_def: dict):
     return create_model(name, __base__=base, **fields)
 
 
+# every dynamic model as (model, model name, base class), in build order
+__dynamic_models: list[tuple[type, str, type]] = []
+
+
 def update_model(parent_class: type, base_class: type):
     d = fetch_model_definition(parent_class.__name__)
     f = build_model_tuple(d)
-    return extend_model(base_class.__name__, base_class, f)
+    model = extend_model(base_class.__name__, base_class, f)
+    __dynamic_models.append((model, to_snake_case(parent_class.__name__), base_class))
+    return model
 
 
 def update_filter_model(parent_class: type, base_class: type):
     d = fetch_model_definition(parent_class.__name__)
     f = build_model_tuple(d)
-    return extend_model(base_class.__name__, base_class, f)
+    model = extend_model(base_class.__name__, base_class, f)
+    __dynamic_models.append((model, to_snake_case(parent_class.__name__), base_class))
+    return model
+
+
+def get_dynamic_model_names() -> list[str]:
+    return list(dict.fromkeys(name for _, name, _ in __dynamic_models))
+
+
+def reload_models(model_defs: dict[str, dict]) -> None:
+    """
+    Rebuilds the dynamic models from the given model definitions and swaps
+    the new fields into the existing classes, so every module and route
+    that imported them picks up the change.
+
+    All classes are rebuilt before any is swapped, and there is no await
+    in between, so a request never sees a half-updated set of models.
+    """
+    fetch_model_definitions().update(model_defs)
+
+    rebuilt: dict[type, type] = {}
+    for model, name, base in __dynamic_models:
+        # a model built on top of another dynamic model (AccountInDB)
+        # must inherit the rebuilt fields, not the old ones
+        base = rebuilt.get(base, base)
+        f = build_model_tuple(model_defs.get(name, {}))
+        rebuilt[model] = extend_model(model.__name__, base, f)
+
+    for model, new_model in rebuilt.items():
+        for k, v in new_model.__dict__.items():
+            if k not in __NOT_SWAPPED:
+                setattr(model, k, v)
+
+    # models holding a dynamic model as a field cached its old schema
+    for x in list(globals().values()):
+        if isinstance(x, type) and issubclass(x, BaseModel):
+            x.__schema_cache__.clear()
+
+
+__NOT_SWAPPED = {
+    "__module__",
+    "__qualname__",
+    "__doc__",
+    "__dict__",
+    "__weakref__",
+    "__abstractmethods__",
+    "_abc_impl",
+}
 
 
 ###################
@@ -136,6 +194,39 @@ class UserInDB(User):
     failed_attempts: int = 0
 
 
+class StatementStats(BaseModel):
+    name: str
+    sql: str
+    prepared: bool
+    calls: int
+    errors: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+
+
+class SlowQuery(BaseModel):
+    name: str | None
+    sql: str
+    # the type of each bind param, and the length of the lists: never the values
+    params: list[str]
+    rows: int | None
+    duration_ms: float
+    failed: bool
+    executed_at: dt.datetime
+    # the EXPLAIN ANALYZE output, for the sampled statements
+    plan: list[str] | None = None
+
+
+class ManagedIndex(BaseModel):
+    name: str
+    table_name: str
+    columns: list[str]
+    storing: list[str]
+    inverted: bool
+    status: Literal["ok", "missing", "stale"]
+
+
 ###################
 #  MODEL OBJECTS  #
 ###################
@@ -167,7 +258,124 @@ class DBComputed(BaseModel):
     updated_at: dt.datetime
 
 
-class BasicFilters(BaseModel):
+class BulkResult(BaseModel):
+    index: int
+    key: dict[str, UUID]
+    ok: bool
+    error: str | None = None
+
+
+class Condition(BaseModel):
+    """
+    The operators applied to a single column, ANDed together.
+    `ne` and `not_in` follow SQL: rows where the column is null don't match,
+    use `is_null` for those.
+    `prefix` and `ilike` apply to text columns, `contains` to tags and other
+    list columns: every item must be in the column.
+    """
+
+    eq: Any = None
+    ne: Any = None
+    in_: list | None = Field(default=None, alias="in")
+    not_in: list | None = None
+    gt: Any = None
+    gte: Any = None
+    lt: Any = None
+    lte: Any = None
+    prefix: str | None = Field(default=None, min_length=1)
+    ilike: str | None = None
+    is_null: bool | None = None
+    contains: list | None = None
+
+    class Config:
+        extra = "forbid"
+        allow_population_by_field_name = True
+
+
+# the entity whose columns each filter model can refer to
+FILTERED_MODELS = {
+    "AccountFilters": "Account",
+    "OpportunityFilters": "Opportunity",
+    "ArtifactFilters": "Artifact",
+    "ProjectFilters": "Project",
+    "TaskFilters": "Task",
+    # shared by the account, opportunity and project notes:
+    # only the columns of the account notes are common to all of them
+    "NoteFilters": "AccountNote",
+}
+
+SCALAR_OPERATORS = ["eq", "ne", "gt", "gte", "lt", "lte"]
+LIST_OPERATORS = ["in_", "not_in"]
+TEXT_OPERATORS = ["prefix", "ilike"]
+
+
+def validate_conditions(model: type, conditions: dict[str, Condition]) -> None:
+    """
+    Checks every column against the fields of the model,
+    and converts the values of the operators to the type of the column.
+    """
+    for col, cond in conditions.items():
+        field = model.__fields__.get(col)
+        if not field:
+            raise ValueError(f"Unknown column '{col}'")
+
+        is_collection = field.shape != SHAPE_SINGLETON
+
+        for op in cond.__fields_set__:
+            value = getattr(cond, op)
+            if value is None:
+                continue
+
+            if op == "contains":
+                if not is_collection:
+                    raise ValueError(f"'contains' is not supported by '{col}'")
+                value, error = field.validate(value, {}, loc=col)
+                value = list(value) if not error else value
+            elif is_collection and op != "is_null":
+                raise ValueError(f"'{op}' is not supported by '{col}'")
+            elif op in TEXT_OPERATORS and not (
+                isinstance(field.type_, type) and issubclass(field.type_, str)
+            ):
+                raise ValueError(f"'{op}' is not supported by '{col}'")
+            elif op in SCALAR_OPERATORS:
+                value, error = field.validate(value, {}, loc=col)
+            elif op in LIST_OPERATORS:
+                items = [field.validate(x, {}, loc=col) for x in value]
+                error = next((e for _, e in items if e), None)
+                value = [x for x, _ in items]
+            else:
+                error = None
+
+            if error:
+                raise ValueError(f"Invalid value for '{col}.{op}': {value}")
+
+            setattr(cond, op, value)
+
+
+class Conditions(BaseModel):
+    """
+    `where` conditions apply to every row. Of the `any_of` groups,
+    at least one must match: a group matches if all its conditions do.
+    """
+
+    where: dict[str, Condition] | None = None
+    any_of: list[dict[str, Condition]] | None = None
+
+    @root_validator(skip_on_failure=True)
+    def check_columns(cls, values):
+        # looked up by name: the entity is declared, and can be reloaded,
+        # after its filters
+        model = globals().get(FILTERED_MODELS.get(cls.__name__, ""))
+
+        for conditions in [values.get("where") or {}, *(values.get("any_of") or [])]:
+            if conditions and not model:
+                raise ValueError(f"{cls.__name__} doesn't support conditions")
+            validate_conditions(model, conditions)
+
+        return values
+
+
+class BasicFilters(Conditions):
     name: list[str] | None = None
     owned_by: list[str] | None = None
     due_date_from: dt.date | None = None
@@ -480,7 +688,7 @@ class ProjectNoteOverview(OpportunityNoteOverview):
     project_id: UUID
 
 
-class NoteFilters(BaseModel):
+class NoteFilters(Conditions):
     name: list[str] | None = None
     tags: list[str] | None = None
     attachments: list[str] | None = None
@@ -490,3 +698,90 @@ class NoteFilters(BaseModel):
     updated_at_from: dt.date | None = None
     updated_at_to: dt.date | None = None
     updated_by: list[str] | None = None
+
+
+# ACCOUNT TREE
+class AccountTree(BaseModel):
+    """
+    An account with the overviews of everything under it.
+    Each section is a flat list: rows refer to their parents by id.
+    Sections beyond the requested depth, or not included, are null.
+    """
+
+    account: Account
+    contacts: list[Contact] | None = None
+    opportunities: list[OpportunityOverview] | None = None
+    account_notes: list[AccountNoteOverview] | None = None
+    projects: list[ProjectOverview] | None = None
+    artifacts: list[ArtifactOverview] | None = None
+    opportunity_notes: list[OpportunityNoteOverview] | None = None
+    tasks: list[TaskOverview] | None = None
+    project_notes: list[ProjectNoteOverview] | None = None
+
+
+AccountTreeSection = Literal[
+    "contacts",
+    "opportunities",
+    "account_notes",
+    "projects",
+    "artifacts",
+    "opportunity_notes",
+    "tasks",
+    "project_notes",
+]
+
+
+# SEARCH
+SearchEntity = Literal[
+    "account",
+    "contact",
+    "opportunity",
+    "project",
+    "task",
+    "account_note",
+    "opportunity_note",
+    "project_note",
+]
+
+
+class SearchHit(BaseModel):
+    entity: SearchEntity
+    id: UUID
+    # the primary key of the hit, to fetch it from its own endpoint
+    key: dict[str, UUID]
+    name: str | None = None
+    rank: float
+
+
+# STATS
+StatsEntity = Literal["opportunities", "projects", "tasks"]
+
+
+class StatusCount(BaseModel):
+    status: str | None
+    count: int
+    overdue: int
+
+
+class OwnerWorkload(BaseModel):
+    owned_by: str | None
+    open: int
+    overdue: int
+
+
+class DueWeekCount(BaseModel):
+    # the monday of the week, or None for rows without a due_date
+    week: dt.date | None
+    count: int
+    overdue: int
+
+
+class PipelineStats(BaseModel):
+    entity: StatsEntity
+    total: int
+    open: int
+    overdue: int
+    by_status: list[StatusCount]
+    by_owner: list[OwnerWorkload]
+    by_due_week: list[DueWeekCount]
+    computed_at: dt.datetime
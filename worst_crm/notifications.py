@@ -0,0 +1,159 @@
+import asyncio
+import datetime as dt
+import os
+import time
+from typing import Awaitable, Callable, Coroutine
+
+import psycopg
+
+from worst_crm import db
+
+# Every instance keeps in-process state derived from the db, ie the dynamic
+# models. When an instance changes that state it publishes the topic:
+# the `watch` row of the topic gets a new timestamp, and every instance
+# learns about it and runs the handlers subscribed to the topic.
+#
+# How the other instances learn about it depends on NOTIFY_BACKEND:
+#   changefeed: a sinkless CockroachDB changefeed on table `watch`
+#   listen:     LISTEN/NOTIFY, when running on PostgreSQL
+#   local:      only this process is notified right away
+# In every case, the `watch` table is also polled as a safety net, in case
+# a notification is lost: the interval doubles from NOTIFY_POLL_INTERVAL
+# up to NOTIFY_POLL_MAX_INTERVAL as long as nothing is found.
+# A NOTIFY_POLL_INTERVAL of 0 disables polling.
+
+NOTIFY_BACKEND = os.getenv("NOTIFY_BACKEND", "changefeed")
+NOTIFY_CHANNEL = "worst_crm_watch"
+NOTIFY_POLL_INTERVAL = float(os.getenv("NOTIFY_POLL_INTERVAL", 15))
+NOTIFY_POLL_MAX_INTERVAL = float(os.getenv("NOTIFY_POLL_MAX_INTERVAL", 600))
+NOTIFY_RECONNECT_MAX_INTERVAL = 60
+
+if NOTIFY_BACKEND not in ["changefeed", "listen", "local"]:
+    raise EnvironmentError(f"Invalid NOTIFY_BACKEND: {NOTIFY_BACKEND}")
+
+
+__handlers: dict[str, list[Callable[[], Awaitable[None]]]] = {}
+
+# the timestamp of each topic as last handled by this instance
+__versions: dict[str, dt.datetime] = {}
+
+__lock = asyncio.Lock()
+
+
+def subscribe(topic: str, handler: Callable[[], Awaitable[None]]) -> None:
+    __handlers.setdefault(topic, []).append(handler)
+
+
+async def __dispatch(topic: str) -> None:
+    for handler in __handlers.get(topic, []):
+        await handler()
+
+
+async def publish(topic: str) -> None:
+    ts = await db.update_watch(topic)
+
+    if NOTIFY_BACKEND == "listen":
+        await db.notify(NOTIFY_CHANNEL, topic)
+
+    # this instance doesn't wait for its own notification:
+    # the handlers have run by the time the request returns
+    async with __lock:
+        await __dispatch(topic)
+        # if the write failed, the other instances only see the next change
+        if ts:
+            __versions[topic] = ts
+
+
+async def init() -> None:
+    __versions.update(await db.get_watch())
+
+
+async def sync() -> bool:
+    """
+    Runs the handlers of the topics changed since they were last handled.
+    Returns whether any topic changed.
+    """
+    async with __lock:
+        changed = False
+        for topic, ts in (await db.get_watch()).items():
+            # timestamps from different nodes aren't ordered:
+            # any timestamp other than the last one handled is a change
+            if __versions.get(topic) != ts:
+                changed = True
+                try:
+                    await __dispatch(topic)
+                    __versions[topic] = ts
+                except Exception as e:
+                    # the topic is left as changed, so the next sync retries
+                    print(e)
+
+        return changed
+
+
+async def __listen_changefeed() -> None:
+    async with await psycopg.AsyncConnection.connect(
+        db.DB_URL, autocommit=True
+    ) as conn:
+        # the initial scan emits every row once: this catches up
+        # on the changes missed while the changefeed was down
+        async for _ in conn.cursor().stream("EXPERIMENTAL CHANGEFEED FOR watch"):
+            await sync()
+
+
+async def __listen_notify() -> None:
+    async with await psycopg.AsyncConnection.connect(
+        db.DB_URL, autocommit=True
+    ) as conn:
+        await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        await sync()
+
+        async for _ in conn.notifies():
+            await sync()
+
+
+async def __listen(listen: Callable[[], Coroutine]) -> None:
+    backoff = 1
+    while True:
+        start = time.monotonic()
+        try:
+            await listen()
+        except Exception as e:
+            print(e)
+
+        # a connection that lasted a while is not failing repeatedly
+        if time.monotonic() - start > NOTIFY_RECONNECT_MAX_INTERVAL:
+            backoff = 1
+
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, NOTIFY_RECONNECT_MAX_INTERVAL)
+
+
+async def __poll() -> None:
+    interval = NOTIFY_POLL_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            changed = await sync()
+        except Exception as e:
+            print(e)
+            changed = False
+
+        if changed:
+            interval = NOTIFY_POLL_INTERVAL
+        else:
+            interval = min(interval * 2, NOTIFY_POLL_MAX_INTERVAL)
+
+
+def get_watchers() -> list[Coroutine]:
+    watchers = []
+
+    if NOTIFY_BACKEND == "changefeed":
+        watchers.append(__listen(__listen_changefeed))
+    elif NOTIFY_BACKEND == "listen":
+        watchers.append(__listen(__listen_notify))
+
+    if NOTIFY_POLL_INTERVAL > 0:
+        watchers.append(__poll())
+
+    return watchers
@@ -1,15 +1,18 @@
+import datetime as dt
 from typing import Annotated
-from fastapi import APIRouter, Depends, Security
-from fastapi.responses import HTMLResponse
-from typing import Annotated
+from fastapi import APIRouter, Body, Depends, Query, Response, Security
+from fastapi.responses import HTMLResponse, StreamingResponse
 from uuid import UUID, uuid4
 from worst_crm import db
 from worst_crm.models import (
+    BulkResult,
     Account,
     UpdatedAccount,
     AccountInDB,
     AccountOverview,
     AccountFilters,
+    AccountTree,
+    AccountTreeSection,
     User,
 )
 import worst_crm.dependencies as dep
@@ -24,14 +27,50 @@ router = APIRouter(
 # CRUD
 @router.get("")
 async def get_all_accounts(
+    response: Response,
     account_filters: AccountFilters | None = None,
+    limit: Annotated[int, Query(ge=1, le=db.MAX_PAGE_SIZE)] = db.DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[AccountOverview]:
-    return db.get_all_accounts(account_filters)
+    after = dep.decode_cursor(cursor, db.ACCOUNTS_KEYSET)
+    accounts = await db.get_all_accounts(
+        account_filters, limit, after, staleness=staleness
+    )
+    dep.set_next_cursor(response, accounts, limit, db.ACCOUNTS_KEYSET)
+    return accounts
+
+
+@router.get("/export")
+async def export_all_accounts(
+    account_filters: AccountFilters | None = None,
+    format: dep.ExportFormat = "ndjson",
+) -> StreamingResponse:
+    return dep.export_response(db.stream_all_accounts(account_filters), format)
 
 
 @router.get("/{account_id}")
 async def get_account(account_id: UUID) -> Account | None:
-    return db.get_account(account_id)
+    return await db.get_account(account_id)
+
+
+@router.get(
+    "/{account_id}/tree",
+    description="The account with its contacts, opportunities, projects, tasks, "
+    "artifacts and notes, fetched in a single query. "
+    "`depth` 1 adds contacts, opportunities and account notes; "
+    "2 adds projects, artifacts and opportunity notes; "
+    "3 adds tasks and project notes. "
+    "`include` restricts the sections returned.",
+)
+async def get_account_tree(
+    account_id: UUID,
+    depth: Annotated[
+        int, Query(ge=0, le=db.MAX_ACCOUNT_TREE_DEPTH)
+    ] = db.MAX_ACCOUNT_TREE_DEPTH,
+    include: Annotated[list[AccountTreeSection] | None, Query()] = None,
+) -> AccountTree | None:
+    return await db.get_account_tree(account_id, depth, include)
 
 
 @router.post(
@@ -52,25 +91,59 @@ async def create_account(
     if not acc_in_db.account_id:
         acc_in_db.account_id = uuid4()
 
-    return db.create_account(acc_in_db)
+    return await db.create_account(acc_in_db)
+
+
+@router.post(
+    "/bulk",
+    dependencies=[Security(dep.get_current_user, scopes=["rw"])],
+    description="Upserts the records in a single transaction and returns "
+    "the outcome of each record, in the same order. "
+    "`account_id` will be generated if not provided by client.",
+)
+async def bulk_upsert_accounts(
+    accounts: Annotated[list[UpdatedAccount], Body(max_items=db.MAX_BULK_SIZE)],
+    current_user: Annotated[User, Depends(dep.get_current_user)],
+) -> list[BulkResult]:
+    accounts_in_db: list[AccountInDB] = []
+
+    for x in accounts:
+        x_in_db = AccountInDB(
+            **x.dict(exclude_unset=True),
+            created_by=current_user.user_id,
+            updated_by=current_user.user_id
+        )
+
+        if not x_in_db.account_id:
+            x_in_db.account_id = uuid4()
+
+        accounts_in_db.append(x_in_db)
+
+    return await db.bulk_upsert_accounts(accounts_in_db)
 
 
 @router.put("", dependencies=[Security(dep.get_current_user, scopes=["rw"])])
 async def update_account(
     acc: UpdatedAccount,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> Account | None:
     acc_in_db = AccountInDB(
         **acc.dict(exclude_unset=True), updated_by=current_user.user_id
     )
-    return db.update_account(acc_in_db)
+    updated = await db.update_account(acc_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(await db.get_account(acc_in_db.account_id))
+
+    return updated
 
 
 @router.delete(
     "/{account_id}", dependencies=[Security(dep.get_current_user, scopes=["rw"])]
 )
 async def delete_account(account_id: UUID) -> Account | None:
-    return db.delete_account(account_id)
+    return await db.delete_account(account_id)
 
 
 # Attachements
@@ -91,7 +164,7 @@ async def get_presigned_get_url(account_id: UUID, filename: str):
 )
 async def get_presigned_put_url(account_id: UUID, filename: str):
     s3_object_name = str(account_id) + "/" + filename
-    db.add_account_attachment(account_id, filename)
+    await db.add_account_attachment(account_id, filename)
     data = dep.get_presigned_put_url(s3_object_name)
     return HTMLResponse(content=data)
 
@@ -102,5 +175,5 @@ async def get_presigned_put_url(account_id: UUID, filename: str):
 )
 async def delete_attachement(account_id: UUID, filename: str):
     s3_object_name = str(account_id) + "/" + filename
-    db.remove_account_attachment(account_id, filename)
+    await db.remove_account_attachment(account_id, filename)
     dep.s3_remove_object(s3_object_name)
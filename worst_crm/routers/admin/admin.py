@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Security
 
 from worst_crm import dependencies as dep
-from . import users, status, models
+from . import users, status, models, diagnostics, indexes
 
 router = APIRouter(
     prefix="/admin",
@@ -12,3 +12,5 @@ router = APIRouter(
 router.include_router(users.router)
 router.include_router(status.router)
 router.include_router(models.router)
+router.include_router(diagnostics.router)
+router.include_router(indexes.router)
@@ -0,0 +1,34 @@
+from fastapi import APIRouter
+from worst_crm import db
+from worst_crm.models import SlowQuery, StatementStats
+
+
+router = APIRouter(prefix="/diagnostics", tags=["admin/diagnostics"])
+
+
+@router.get(
+    "/statements",
+    description="Execution count and timings of each named SQL statement, "
+    "and whether it's prepared server-side.",
+)
+async def get_statement_stats() -> list[StatementStats]:
+    return db.get_statement_stats()
+
+
+@router.delete("/statements")
+async def reset_statement_stats() -> None:
+    db.reset_statement_stats()
+
+
+@router.get(
+    "/slow-queries",
+    description="The last statements slower than SLOW_QUERY_THRESHOLD_MS, "
+    "newest first, with the EXPLAIN ANALYZE plan of a sample of them.",
+)
+async def get_slow_queries() -> list[SlowQuery]:
+    return db.get_slow_queries()
+
+
+@router.delete("/slow-queries")
+async def clear_slow_queries() -> None:
+    db.clear_slow_queries()
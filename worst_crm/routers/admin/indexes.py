@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from worst_crm import db
+from worst_crm.models import ManagedIndex
+
+
+router = APIRouter(prefix="/indexes", tags=["admin/indexes"])
+
+
+@router.get(
+    "",
+    description="The secondary indexes serving the list endpoints, "
+    "and whether they're missing or stale, ie. a model changed "
+    "and the index doesn't store its new fields.",
+)
+async def get_managed_indexes() -> list[ManagedIndex]:
+    return await db.get_managed_indexes()
+
+
+@router.post(
+    "",
+    description="Creates the missing indexes and rebuilds the stale ones, online. "
+    "Returns once every index is built.",
+)
+async def migrate_indexes() -> list[ManagedIndex]:
+    return await db.migrate_indexes()
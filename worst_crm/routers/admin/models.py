@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from worst_crm import db
+from worst_crm import db, notifications
 
 
 router = APIRouter(prefix="/models", tags=["admin/models"])
@@ -8,64 +8,76 @@ router = APIRouter(prefix="/models", tags=["admin/models"])
 # ACCOUNT
 @router.get("/account")
 async def get_account_model() -> dict:
-    return db.get_model("account")
+    return await db.get_model("account")
 
 
 @router.put("/account")
 async def update_account_model(model: dict) -> dict:
-    return db.update_model("account", model)
+    new_model = await db.update_model("account", model)
+    await notifications.publish("models")
+    return new_model
 
 
 # OPPORTUNITY
 @router.get("/opportunity")
 async def get_opportunity_model() -> dict:
-    return db.get_model("opportunity")
+    return await db.get_model("opportunity")
 
 
 @router.put("/opportunity")
 async def update_opportunity_model(model: dict) -> dict:
-    return db.update_model("opportunity", model)
+    new_model = await db.update_model("opportunity", model)
+    await notifications.publish("models")
+    return new_model
 
 
 # ARTIFACT
 @router.get("/artifact")
 async def get_artifact_model() -> dict:
-    return db.get_model("artifact")
+    return await db.get_model("artifact")
 
 
 @router.put("/artifact")
 async def update_artifact_model(model: dict) -> dict:
-    return db.update_model("artifact", model)
+    new_model = await db.update_model("artifact", model)
+    await notifications.publish("models")
+    return new_model
 
 
 # PROJECT
 @router.get("/project")
 async def get_project_model() -> dict:
-    return db.get_model("project")
+    return await db.get_model("project")
 
 
 @router.put("/project")
 async def update_project_model(model: dict) -> dict:
-    return db.update_model("project", model)
+    new_model = await db.update_model("project", model)
+    await notifications.publish("models")
+    return new_model
 
 
 # TASK
 @router.get("/task")
 async def get_task_model() -> dict:
-    return db.get_model("task")
+    return await db.get_model("task")
 
 
 @router.put("/task")
 async def update_task_model(model: dict) -> dict:
-    return db.update_model("task", model)
+    new_model = await db.update_model("task", model)
+    await notifications.publish("models")
+    return new_model
 
 
 # CONTACT
 @router.get("/contact")
 async def get_contact_model() -> dict:
-    return db.get_model("contact")
+    return await db.get_model("contact")
 
 
 @router.put("/contact")
 async def update_contact_model(model: dict) -> dict:
-    return db.update_model("contact", model)
+    new_model = await db.update_model("contact", model)
+    await notifications.publish("models")
+    return new_model
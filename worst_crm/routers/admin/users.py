@@ -12,21 +12,22 @@ router = APIRouter(
 
 @router.get("")
 async def get_all_users() -> list[User]:
-    return db.get_all_users()
+    return await db.get_all_users()
 
 
 @router.get("/{user_id}")
 async def get_user(user_id: str) -> User | None:
-    return db.get_user(user_id)
+    return await db.get_user(user_id)
 
 
 @router.post("")
 async def create_user(new_user: NewUser) -> User | None:
     uid = UserInDB(
-        **new_user.dict(), hashed_password=dep.get_password_hash(new_user.password)
+        **new_user.dict(),
+        hashed_password=await dep.get_password_hash(new_user.password)
     )
 
-    return db.create_user(uid)
+    return await db.create_user(uid)
 
 
 @router.put("/{user_id}")
@@ -34,11 +35,11 @@ async def update_user(user_id: str, user: UpdatedUser) -> User | None:
     updated_uid = UpdatedUserInDB(**user.dict())
 
     if user.password:
-        updated_uid.hashed_password = dep.get_password_hash(user.password)
+        updated_uid.hashed_password = await dep.get_password_hash(user.password)
 
-    return db.update_user(user_id, updated_uid)
+    return await db.update_user(user_id, updated_uid)
 
 
 @router.delete("/{user_id}")
 async def delete_user(user_id: str) -> User | None:
-    return db.delete_user(user_id)
+    return await db.delete_user(user_id)
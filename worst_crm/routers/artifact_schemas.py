@@ -1,3 +1,4 @@
+import datetime as dt
 from fastapi import APIRouter, Depends, Security
 from typing import Annotated
 from worst_crm import db
@@ -19,12 +20,12 @@ router = APIRouter(
 # CRUD
 @router.get("")
 async def get_all_artifacts() -> list[ArtifactSchema]:
-    return db.get_all_artifact_schemas()
+    return await db.get_all_artifact_schemas()
 
 
 @router.get("/{artifact_schema_id}")
 async def get_artifact_schema(artifact_schema_id: str) -> ArtifactSchema | None:
-    return db.get_artifact_schema(artifact_schema_id)
+    return await db.get_artifact_schema(artifact_schema_id)
 
 
 @router.post(
@@ -41,7 +42,7 @@ async def create_artifact_schema(
         updated_by=current_user.user_id
     )
 
-    return db.create_artifact_schema(artifact_in_db)
+    return await db.create_artifact_schema(artifact_in_db)
 
 
 @router.put(
@@ -51,12 +52,20 @@ async def create_artifact_schema(
 async def update_artifact_schema(
     artifact: UpdatedArtifactSchema,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> ArtifactSchema | None:
     artifact_in_db = ArtifactSchemaInDB(
         **artifact.dict(exclude_unset=True), updated_by=current_user.user_id
     )
 
-    return db.update_artifact_schema(artifact_in_db)
+    updated = await db.update_artifact_schema(artifact_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(
+            await db.get_artifact_schema(artifact_in_db.artifact_schema_id)
+        )
+
+    return updated
 
 
 @router.delete(
@@ -64,4 +73,4 @@ async def update_artifact_schema(
     dependencies=[Security(dep.get_current_user, scopes=["rw"])],
 )
 async def delete_artifact_schema(artifact_schema_id: str) -> ArtifactSchema | None:
-    return db.delete_artifact_schema(artifact_schema_id)
+    return await db.delete_artifact_schema(artifact_schema_id)
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Security, status
+import datetime as dt
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, Security, status
+from fastapi.responses import StreamingResponse
 from typing import Annotated
 from uuid import UUID, uuid4
-from worst_crm import db
+from worst_crm import db, tracing
 from worst_crm.models import (
     Artifact,
     ArtifactFilters,
@@ -13,8 +15,7 @@ from worst_crm.models import (
     User,
 )
 import worst_crm.dependencies as dep
-from worst_crm.models import build_model_tuple, extend_model
-from pydantic import BaseModel, ValidationError
+from pydantic import ValidationError
 
 router = APIRouter(
     prefix="/artifacts",
@@ -23,20 +24,13 @@ router = APIRouter(
 )
 
 
-def sanitize(artifact_schema_id: str, payload: dict) -> dict:
-    artifact_schema = db.get_artifact_schema(artifact_schema_id)
-
-    if artifact_schema:
-        model: type[BaseModel] = extend_model(
-            artifact_schema_id,
-            BaseModel,
-            build_model_tuple(artifact_schema.artifact_schema),
-        )
+@tracing.traced()
+async def sanitize(artifact_schema_id: str, payload: dict) -> dict:
+    model = await db.get_artifact_validator(artifact_schema_id)
 
+    if model:
         try:
-            model.parse_obj(payload)
-
-            return model(**payload).dict()
+            return model.parse_obj(payload).dict()
 
         except ValidationError as e:
             raise HTTPException(
@@ -53,31 +47,55 @@ def sanitize(artifact_schema_id: str, payload: dict) -> dict:
 # CRUD
 @router.get("")
 async def get_all_artifacts(
+    response: Response,
     artifact_filters: ArtifactFilters | None = None,
+    limit: Annotated[int, Query(ge=1, le=db.MAX_PAGE_SIZE)] = db.DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[ArtifactOverviewWithAccountName]:
-    return db.get_all_artifacts(artifact_filters)
+    after = dep.decode_cursor(cursor, db.ARTIFACTS_KEYSET)
+    artifacts = await db.get_all_artifacts(
+        artifact_filters, limit, after, staleness=staleness
+    )
+    dep.set_next_cursor(response, artifacts, limit, db.ARTIFACTS_KEYSET)
+    return artifacts
+
+
+@router.get("/export")
+async def export_all_artifacts(
+    artifact_filters: ArtifactFilters | None = None,
+    format: dep.ExportFormat = "ndjson",
+) -> StreamingResponse:
+    return dep.export_response(db.stream_all_artifacts(artifact_filters), format)
 
 
 @router.get("/{account_id}")
 async def get_all_artifacts_for_account_id(
     account_id: UUID,
     artifact_filters: ArtifactFilters | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[ArtifactOverviewWithOpportunityName]:
-    return db.get_all_artifacts_for_account_id(account_id, artifact_filters)
+    return await db.get_all_artifacts_for_account_id(
+        account_id, artifact_filters, staleness=staleness
+    )
 
 
 @router.get("/{account_id}/{opportunity_id}")
 async def get_all_artifacts_for_opportunity_id(
-    account_id: UUID, opportunity_id: UUID
+    account_id: UUID,
+    opportunity_id: UUID,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[ArtifactOverview]:
-    return db.get_all_artifacts_for_opportunity_id(account_id, opportunity_id)
+    return await db.get_all_artifacts_for_opportunity_id(
+        account_id, opportunity_id, staleness=staleness
+    )
 
 
 @router.get("/{account_id}/{opportunity_id}/{artifact_id}")
 async def get_artifact(
     account_id: UUID, opportunity_id: UUID, artifact_id: UUID
 ) -> Artifact | None:
-    return db.get_artifact(account_id, opportunity_id, artifact_id)
+    return await db.get_artifact(account_id, opportunity_id, artifact_id)
 
 
 @router.post(
@@ -98,11 +116,11 @@ async def create_artifact(
     if not artifact_in_db.artifact_id:
         artifact_in_db.artifact_id = uuid4()
 
-    artifact_in_db.payload = sanitize(
+    artifact_in_db.payload = await sanitize(
         artifact_in_db.artifact_schema_id, artifact_in_db.payload
     )
 
-    return db.create_artifact(artifact_in_db)
+    return await db.create_artifact(artifact_in_db)
 
 
 @router.put(
@@ -112,16 +130,28 @@ async def create_artifact(
 async def update_artifact(
     artifact: UpdatedArtifact,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> Artifact | None:
     artifact_in_db = ArtifactInDB(
         **artifact.dict(exclude_unset=True), updated_by=current_user.user_id
     )
 
-    artifact_in_db.payload = sanitize(
+    artifact_in_db.payload = await sanitize(
         artifact_in_db.artifact_schema_id, artifact_in_db.payload
     )
 
-    return db.update_artifact(artifact_in_db)
+    updated = await db.update_artifact(artifact_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(
+            await db.get_artifact(
+                artifact_in_db.account_id,
+                artifact_in_db.opportunity_id,
+                artifact_in_db.artifact_id,
+            )
+        )
+
+    return updated
 
 
 @router.delete(
@@ -131,4 +161,4 @@ async def update_artifact(
 async def delete_artifact(
     account_id: UUID, opportunity_id: UUID, artifact_id: UUID
 ) -> Artifact | None:
-    return db.delete_artifact(account_id, opportunity_id, artifact_id)
+    return await db.delete_artifact(account_id, opportunity_id, artifact_id)
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, Security
+import datetime as dt
+from fastapi import APIRouter, Body, Depends, Query, Response, Security
 from typing import Annotated
 from uuid import UUID, uuid4
 from worst_crm import db
 from worst_crm.models import (
+    BulkResult,
     Contact,
     ContactInDB,
     ContactWithAccountName,
@@ -20,20 +22,29 @@ router = APIRouter(
 
 # CRUD
 @router.get("")
-async def get_all_contacts() -> list[ContactWithAccountName]:
-    return db.get_all_contacts()
+async def get_all_contacts(
+    response: Response,
+    limit: Annotated[int, Query(ge=1, le=db.MAX_PAGE_SIZE)] = db.DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
+) -> list[ContactWithAccountName]:
+    after = dep.decode_cursor(cursor, db.CONTACTS_KEYSET)
+    contacts = await db.get_all_contacts(limit, after, staleness=staleness)
+    dep.set_next_cursor(response, contacts, limit, db.CONTACTS_KEYSET)
+    return contacts
 
 
 @router.get("/{account_id}")
 async def get_all_contacts_for_account_id(
     account_id: UUID,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[Contact]:
-    return db.get_all_contacts_for_account_id(account_id)
+    return await db.get_all_contacts_for_account_id(account_id, staleness=staleness)
 
 
 @router.get("/{account_id}/{contact_id}")
 async def get_contact(account_id: UUID, contact_id: UUID) -> Contact | None:
-    return db.get_contact(account_id, contact_id)
+    return await db.get_contact(account_id, contact_id)
 
 
 @router.post(
@@ -53,7 +64,35 @@ async def create_contact(
 
     if not contact_in_db.contact_id:
         contact_in_db.contact_id = uuid4()
-    return db.create_contact(contact_in_db)
+    return await db.create_contact(contact_in_db)
+
+
+@router.post(
+    "/bulk",
+    dependencies=[Security(dep.get_current_user, scopes=["rw"])],
+    description="Upserts the records in a single transaction and returns "
+    "the outcome of each record, in the same order. "
+    "`contact_id` will be generated if not provided by client.",
+)
+async def bulk_upsert_contacts(
+    contacts: Annotated[list[UpdatedContact], Body(max_items=db.MAX_BULK_SIZE)],
+    current_user: Annotated[User, Depends(dep.get_current_user)],
+) -> list[BulkResult]:
+    contacts_in_db: list[ContactInDB] = []
+
+    for x in contacts:
+        x_in_db = ContactInDB(
+            **x.dict(exclude_unset=True),
+            created_by=current_user.user_id,
+            updated_by=current_user.user_id
+        )
+
+        if not x_in_db.contact_id:
+            x_in_db.contact_id = uuid4()
+
+        contacts_in_db.append(x_in_db)
+
+    return await db.bulk_upsert_contacts(contacts_in_db)
 
 
 @router.put(
@@ -63,12 +102,20 @@ async def create_contact(
 async def update_contact(
     contact: UpdatedContact,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> Contact | None:
     contact_in_db = ContactInDB(
         **contact.dict(exclude_unset=True), updated_by=current_user.user_id
     )
 
-    return db.update_contact(contact_in_db)
+    updated = await db.update_contact(contact_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(
+            await db.get_contact(contact_in_db.account_id, contact_in_db.contact_id)
+        )
+
+    return updated
 
 
 @router.delete(
@@ -76,4 +123,4 @@ async def update_contact(
     dependencies=[Security(dep.get_current_user, scopes=["rw"])],
 )
 async def delete_contact(account_id: UUID, contact_id: UUID) -> Contact | None:
-    return db.delete_contact(account_id, contact_id)
+    return await db.delete_contact(account_id, contact_id)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, Security
+import datetime as dt
+from fastapi import APIRouter, Body, Depends, Security
 from fastapi.responses import HTMLResponse
 from typing import Annotated
 from uuid import UUID, uuid4
 from worst_crm import db
 from worst_crm.models import (
+    BulkResult,
     AccountNote,
     AccountNoteInDB,
     AccountNoteOverview,
@@ -31,14 +33,16 @@ router = APIRouter(
 # ACCOUNT_NOTE
 @router.get("/account/{account_id}")
 async def get_all_account_notes(
-    account_id: UUID, note_filters: NoteFilters | None = None
+    account_id: UUID,
+    note_filters: NoteFilters | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[AccountNoteOverview]:
-    return db.get_all_account_notes(account_id, note_filters)
+    return await db.get_all_account_notes(account_id, note_filters, staleness=staleness)
 
 
 @router.get("/account/{account_id}/{note_id}")
 async def get_account_note(account_id: UUID, note_id: UUID) -> AccountNote | None:
-    return db.get_account_note(account_id, note_id)
+    return await db.get_account_note(account_id, note_id)
 
 
 @router.post(
@@ -59,7 +63,35 @@ async def create_account_note(
     if not note_in_db.note_id:
         note_in_db.note_id = uuid4()
 
-    return db.create_account_note(note_in_db)
+    return await db.create_account_note(note_in_db)
+
+
+@router.post(
+    "/account/bulk",
+    dependencies=[Security(dep.get_current_user, scopes=["rw"])],
+    description="Upserts the records in a single transaction and returns "
+    "the outcome of each record, in the same order. "
+    "`note_id` will be generated if not provided by client.",
+)
+async def bulk_upsert_account_notes(
+    notes: Annotated[list[UpdatedAccountNote], Body(max_items=db.MAX_BULK_SIZE)],
+    current_user: Annotated[User, Depends(dep.get_current_user)],
+) -> list[BulkResult]:
+    notes_in_db: list[AccountNoteInDB] = []
+
+    for x in notes:
+        x_in_db = AccountNoteInDB(
+            **x.dict(exclude_unset=True),
+            created_by=current_user.user_id,
+            updated_by=current_user.user_id
+        )
+
+        if not x_in_db.note_id:
+            x_in_db.note_id = uuid4()
+
+        notes_in_db.append(x_in_db)
+
+    return await db.bulk_upsert_account_notes(notes_in_db)
 
 
 @router.put(
@@ -69,10 +101,18 @@ async def create_account_note(
 async def update_account_note(
     note: UpdatedAccountNote,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> AccountNote | None:
     note_in_db = AccountNoteInDB(**note.dict(), updated_by=current_user.user_id)
 
-    return db.update_account_note(note_in_db)
+    updated = await db.update_account_note(note_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(
+            await db.get_account_note(note_in_db.account_id, note_in_db.note_id)
+        )
+
+    return updated
 
 
 @router.delete(
@@ -80,7 +120,7 @@ async def update_account_note(
     dependencies=[Security(dep.get_current_user, scopes=["rw"])],
 )
 async def delete_account_note(account_id: UUID, note_id: UUID) -> AccountNote | None:
-    return db.delete_account_note(account_id, note_id)
+    return await db.delete_account_note(account_id, note_id)
 
 
 @router.get(
@@ -102,7 +142,7 @@ async def get_presigned_put_url_for_account_note(
     account_id: UUID, note_id: UUID, filename: str
 ) -> HTMLResponse:
     s3_object_name = str(account_id) + "/" + str(note_id) + "/" + filename
-    db.add_account_note_attachment(account_id, note_id, filename)
+    await db.add_account_note_attachment(account_id, note_id, filename)
     data = dep.get_presigned_put_url(s3_object_name)
     return HTMLResponse(content=data)
 
@@ -115,23 +155,28 @@ async def delete_attachement_from_account_note(
     account_id: UUID, note_id: UUID, filename: str
 ) -> None:
     s3_object_name = str(account_id) + "/" + str(note_id) + "/" + filename
-    db.remove_account_note_attachment(account_id, note_id, filename)
+    await db.remove_account_note_attachment(account_id, note_id, filename)
     dep.s3_remove_object(s3_object_name)
 
 
 # OPPORTUNITY_NOTE
 @router.get("/opportunity/{account_id}/{opportunity_id}")
 async def get_all_opportunity_notes(
-    account_id: UUID, opportunity_id: UUID, note_filters: NoteFilters | None = None
+    account_id: UUID,
+    opportunity_id: UUID,
+    note_filters: NoteFilters | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[OpportunityNoteOverview]:
-    return db.get_all_opportunity_notes(account_id, opportunity_id, note_filters)
+    return await db.get_all_opportunity_notes(
+        account_id, opportunity_id, note_filters, staleness=staleness
+    )
 
 
 @router.get("/opportunity/{account_id}/{opportunity_id}/{note_id}")
 async def get_opportunity_note(
     account_id: UUID, opportunity_id: UUID, note_id: UUID
 ) -> OpportunityNote | None:
-    return db.get_opportunity_note(account_id, opportunity_id, note_id)
+    return await db.get_opportunity_note(account_id, opportunity_id, note_id)
 
 
 @router.post(
@@ -152,7 +197,35 @@ async def create_opportunity_note(
     if not note_in_db.note_id:
         note_in_db.note_id = uuid4()
 
-    return db.create_opportunity_note(note_in_db)
+    return await db.create_opportunity_note(note_in_db)
+
+
+@router.post(
+    "/opportunity/bulk",
+    dependencies=[Security(dep.get_current_user, scopes=["rw"])],
+    description="Upserts the records in a single transaction and returns "
+    "the outcome of each record, in the same order. "
+    "`note_id` will be generated if not provided by client.",
+)
+async def bulk_upsert_opportunity_notes(
+    notes: Annotated[list[UpdatedOpportunityNote], Body(max_items=db.MAX_BULK_SIZE)],
+    current_user: Annotated[User, Depends(dep.get_current_user)],
+) -> list[BulkResult]:
+    notes_in_db: list[OpportunityNoteInDB] = []
+
+    for x in notes:
+        x_in_db = OpportunityNoteInDB(
+            **x.dict(exclude_unset=True),
+            created_by=current_user.user_id,
+            updated_by=current_user.user_id
+        )
+
+        if not x_in_db.note_id:
+            x_in_db.note_id = uuid4()
+
+        notes_in_db.append(x_in_db)
+
+    return await db.bulk_upsert_opportunity_notes(notes_in_db)
 
 
 @router.put(
@@ -162,10 +235,20 @@ async def create_opportunity_note(
 async def update_opportunity_note(
     note: UpdatedOpportunityNote,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> OpportunityNote | None:
     note_in_db = OpportunityNoteInDB(**note.dict(), updated_by=current_user.user_id)
 
-    return db.update_opportunity_note(note_in_db)
+    updated = await db.update_opportunity_note(note_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(
+            await db.get_opportunity_note(
+                note_in_db.account_id, note_in_db.opportunity_id, note_in_db.note_id
+            )
+        )
+
+    return updated
 
 
 @router.delete(
@@ -175,7 +258,7 @@ async def update_opportunity_note(
 async def delete_opportunity_note(
     account_id: UUID, opportunity_id: UUID, note_id: UUID
 ) -> OpportunityNote | None:
-    return db.delete_opportunity_note(account_id, opportunity_id, note_id)
+    return await db.delete_opportunity_note(account_id, opportunity_id, note_id)
 
 
 @router.get(
@@ -213,7 +296,9 @@ async def get_presigned_put_url_for_opportunity_note(
         + "/"
         + filename
     )
-    db.add_opportunity_note_attachment(account_id, opportunity_id, note_id, filename)
+    await db.add_opportunity_note_attachment(
+        account_id, opportunity_id, note_id, filename
+    )
     data = dep.get_presigned_put_url(s3_object_name)
     return HTMLResponse(content=data)
 
@@ -234,23 +319,30 @@ async def delete_attachement_from_opportunity_note(
         + "/"
         + filename
     )
-    db.remove_opportunity_note_attachment(account_id, opportunity_id, note_id, filename)
+    await db.remove_opportunity_note_attachment(
+        account_id, opportunity_id, note_id, filename
+    )
     dep.s3_remove_object(s3_object_name)
 
 
 # PROJECT_NOTE
 @router.get("/project/{account_id}/{opportunity_id}/{project_id}")
 async def get_all_project_notes(
-    account_id: UUID, opportunity_id: UUID, project_id: UUID
+    account_id: UUID,
+    opportunity_id: UUID,
+    project_id: UUID,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[ProjectNoteOverview]:
-    return db.get_all_project_notes(account_id, opportunity_id, project_id)
+    return await db.get_all_project_notes(
+        account_id, opportunity_id, project_id, staleness=staleness
+    )
 
 
 @router.get("/project/{account_id}/{opportunity_id}/{project_id}/{note_id}")
 async def get_project_note(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, note_id: UUID
 ) -> ProjectNote | None:
-    return db.get_project_note(account_id, opportunity_id, project_id, note_id)
+    return await db.get_project_note(account_id, opportunity_id, project_id, note_id)
 
 
 @router.post(
@@ -271,7 +363,35 @@ async def create_project_note(
     if not note_in_db.note_id:
         note_in_db.note_id = uuid4()
 
-    return db.create_project_note(note_in_db)
+    return await db.create_project_note(note_in_db)
+
+
+@router.post(
+    "/project/bulk",
+    dependencies=[Security(dep.get_current_user, scopes=["rw"])],
+    description="Upserts the records in a single transaction and returns "
+    "the outcome of each record, in the same order. "
+    "`note_id` will be generated if not provided by client.",
+)
+async def bulk_upsert_project_notes(
+    notes: Annotated[list[UpdatedProjectNote], Body(max_items=db.MAX_BULK_SIZE)],
+    current_user: Annotated[User, Depends(dep.get_current_user)],
+) -> list[BulkResult]:
+    notes_in_db: list[ProjectNoteInDB] = []
+
+    for x in notes:
+        x_in_db = ProjectNoteInDB(
+            **x.dict(exclude_unset=True),
+            created_by=current_user.user_id,
+            updated_by=current_user.user_id
+        )
+
+        if not x_in_db.note_id:
+            x_in_db.note_id = uuid4()
+
+        notes_in_db.append(x_in_db)
+
+    return await db.bulk_upsert_project_notes(notes_in_db)
 
 
 @router.put(
@@ -281,12 +401,25 @@ async def create_project_note(
 async def update_project_note(
     note: UpdatedProjectNote,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> ProjectNote | None:
     note_in_db = ProjectNoteInDB(
         **note.dict(exclude_unset=True), updated_by=current_user.user_id
     )
 
-    return db.update_project_note(note_in_db)
+    updated = await db.update_project_note(note_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(
+            await db.get_project_note(
+                note_in_db.account_id,
+                note_in_db.opportunity_id,
+                note_in_db.project_id,
+                note_in_db.note_id,
+            )
+        )
+
+    return updated
 
 
 @router.delete(
@@ -296,7 +429,7 @@ async def update_project_note(
 async def delete_project_note(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, note_id: UUID
 ) -> ProjectNote | None:
-    return db.delete_project_note(account_id, opportunity_id, project_id, note_id)
+    return await db.delete_project_note(account_id, opportunity_id, project_id, note_id)
 
 
 @router.get(
@@ -346,7 +479,7 @@ async def get_presigned_put_url_for_project_note(
         + "/"
         + filename
     )
-    db.add_project_note_attachment(
+    await db.add_project_note_attachment(
         account_id, opportunity_id, project_id, note_id, filename
     )
     data = dep.get_presigned_put_url(s3_object_name)
@@ -375,7 +508,7 @@ async def delete_attachement_from_project_note(
         + "/"
         + filename
     )
-    db.remove_project_note_attachment(
+    await db.remove_project_note_attachment(
         account_id, opportunity_id, project_id, note_id, filename
     )
     dep.s3_remove_object(s3_object_name)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, Security
-from fastapi.responses import HTMLResponse
+import datetime as dt
+from fastapi import APIRouter, Body, Depends, Query, Response, Security
+from fastapi.responses import HTMLResponse, StreamingResponse
 from typing import Annotated
 from uuid import UUID, uuid4
 from worst_crm import db
 from worst_crm.models import (
+    BulkResult,
     Opportunity,
     OpportunityFilters,
     OpportunityInDB,
@@ -24,21 +26,41 @@ router = APIRouter(
 # CRUD
 @router.get("")
 async def get_all_opportunities(
+    response: Response,
     opportunity_filters: OpportunityFilters | None = None,
+    limit: Annotated[int, Query(ge=1, le=db.MAX_PAGE_SIZE)] = db.DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[OpportunityOverviewWithAccountName]:
-    return db.get_all_opportunities(opportunity_filters)
+    after = dep.decode_cursor(cursor, db.OPPORTUNITIES_KEYSET)
+    opportunities = await db.get_all_opportunities(
+        opportunity_filters, limit, after, staleness=staleness
+    )
+    dep.set_next_cursor(response, opportunities, limit, db.OPPORTUNITIES_KEYSET)
+    return opportunities
+
+
+@router.get("/export")
+async def export_all_opportunities(
+    opportunity_filters: OpportunityFilters | None = None,
+    format: dep.ExportFormat = "ndjson",
+) -> StreamingResponse:
+    return dep.export_response(db.stream_all_opportunities(opportunity_filters), format)
 
 
 @router.get("/{account_id}")
 async def get_all_opportunities_for_account_id(
     account_id: UUID,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[OpportunityOverview]:
-    return db.get_all_opportunities_for_account_id(account_id)
+    return await db.get_all_opportunities_for_account_id(
+        account_id, staleness=staleness
+    )
 
 
 @router.get("/{account_id}/{opportunity_id}")
 async def get_opportunity(account_id: UUID, opportunity_id: UUID) -> Opportunity | None:
-    return db.get_opportunity(account_id, opportunity_id)
+    return await db.get_opportunity(account_id, opportunity_id)
 
 
 @router.post(
@@ -59,7 +81,37 @@ async def create_opportunity(
     if not opportunity_in_db.opportunity_id:
         opportunity_in_db.opportunity_id = uuid4()
 
-    return db.create_opportunity(opportunity_in_db)
+    return await db.create_opportunity(opportunity_in_db)
+
+
+@router.post(
+    "/bulk",
+    dependencies=[Security(dep.get_current_user, scopes=["rw"])],
+    description="Upserts the records in a single transaction and returns "
+    "the outcome of each record, in the same order. "
+    "`opportunity_id` will be generated if not provided by client.",
+)
+async def bulk_upsert_opportunities(
+    opportunities: Annotated[
+        list[UpdatedOpportunity], Body(max_items=db.MAX_BULK_SIZE)
+    ],
+    current_user: Annotated[User, Depends(dep.get_current_user)],
+) -> list[BulkResult]:
+    opportunities_in_db: list[OpportunityInDB] = []
+
+    for x in opportunities:
+        x_in_db = OpportunityInDB(
+            **x.dict(exclude_unset=True),
+            created_by=current_user.user_id,
+            updated_by=current_user.user_id
+        )
+
+        if not x_in_db.opportunity_id:
+            x_in_db.opportunity_id = uuid4()
+
+        opportunities_in_db.append(x_in_db)
+
+    return await db.bulk_upsert_opportunities(opportunities_in_db)
 
 
 @router.put(
@@ -69,12 +121,22 @@ async def create_opportunity(
 async def update_opportunity(
     opportunity: UpdatedOpportunity,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> Opportunity | None:
     opportunity_in_db = OpportunityInDB(
         **opportunity.dict(exclude_unset=True), updated_by=current_user.user_id
     )
 
-    return db.update_opportunity(opportunity_in_db)
+    updated = await db.update_opportunity(opportunity_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(
+            await db.get_opportunity(
+                opportunity_in_db.account_id, opportunity_in_db.opportunity_id
+            )
+        )
+
+    return updated
 
 
 @router.delete(
@@ -84,7 +146,7 @@ async def update_opportunity(
 async def delete_opportunity(
     account_id: UUID, opportunity_id: UUID
 ) -> Opportunity | None:
-    return db.delete_opportunity(account_id, opportunity_id)
+    return await db.delete_opportunity(account_id, opportunity_id)
 
 
 # Attachements
@@ -105,7 +167,7 @@ async def get_presigned_get_url(account_id: UUID, opportunity_id: UUID, filename
 )
 async def get_presigned_put_url(account_id: UUID, opportunity_id: UUID, filename: str):
     s3_object_name = str(account_id) + "/" + str(opportunity_id) + "/" + filename
-    db.add_opportunity_attachment(account_id, opportunity_id, filename)
+    await db.add_opportunity_attachment(account_id, opportunity_id, filename)
     data = dep.get_presigned_put_url(s3_object_name)
     return HTMLResponse(content=data)
 
@@ -116,5 +178,5 @@ async def get_presigned_put_url(account_id: UUID, opportunity_id: UUID, filename
 )
 async def delete_attachement(account_id: UUID, opportunity_id: UUID, filename: str):
     s3_object_name = str(account_id) + "/" + str(opportunity_id) + "/" + filename
-    db.remove_opportunity_attachment(account_id, opportunity_id, filename)
+    await db.remove_opportunity_attachment(account_id, opportunity_id, filename)
     dep.s3_remove_object(s3_object_name)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, Security
-from fastapi.responses import HTMLResponse
+import datetime as dt
+from fastapi import APIRouter, Body, Depends, Query, Response, Security
+from fastapi.responses import HTMLResponse, StreamingResponse
 from typing import Annotated
 from uuid import UUID, uuid4
 from worst_crm import db
 from worst_crm.models import (
+    BulkResult,
     Project,
     ProjectFilters,
     ProjectInDB,
@@ -25,31 +27,55 @@ router = APIRouter(
 # CRUD
 @router.get("")
 async def get_all_projects(
+    response: Response,
     project_filters: ProjectFilters | None = None,
+    limit: Annotated[int, Query(ge=1, le=db.MAX_PAGE_SIZE)] = db.DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[ProjectOverviewWithAccountName]:
-    return db.get_all_projects(project_filters)
+    after = dep.decode_cursor(cursor, db.PROJECTS_KEYSET)
+    projects = await db.get_all_projects(
+        project_filters, limit, after, staleness=staleness
+    )
+    dep.set_next_cursor(response, projects, limit, db.PROJECTS_KEYSET)
+    return projects
+
+
+@router.get("/export")
+async def export_all_projects(
+    project_filters: ProjectFilters | None = None,
+    format: dep.ExportFormat = "ndjson",
+) -> StreamingResponse:
+    return dep.export_response(db.stream_all_projects(project_filters), format)
 
 
 @router.get("/{account_id}")
 async def get_all_projects_for_account_id(
     account_id: UUID,
     project_filters: ProjectFilters | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[ProjectOverviewWithOpportunityName]:
-    return db.get_all_projects_for_account_id(account_id, project_filters)
+    return await db.get_all_projects_for_account_id(
+        account_id, project_filters, staleness=staleness
+    )
 
 
 @router.get("/{account_id}/{opportunity_id}")
 async def get_all_projects_for_opportunity_id(
-    account_id: UUID, opportunity_id: UUID
+    account_id: UUID,
+    opportunity_id: UUID,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[ProjectOverview]:
-    return db.get_all_projects_for_opportunity_id(account_id, opportunity_id)
+    return await db.get_all_projects_for_opportunity_id(
+        account_id, opportunity_id, staleness=staleness
+    )
 
 
 @router.get("/{account_id}/{opportunity_id}/{project_id}")
 async def get_project(
     account_id: UUID, opportunity_id: UUID, project_id: UUID
 ) -> Project | None:
-    return db.get_project(account_id, opportunity_id, project_id)
+    return await db.get_project(account_id, opportunity_id, project_id)
 
 
 @router.post(
@@ -70,7 +96,35 @@ async def create_project(
     if not project_in_db.project_id:
         project_in_db.project_id = uuid4()
 
-    return db.create_project(project_in_db)
+    return await db.create_project(project_in_db)
+
+
+@router.post(
+    "/bulk",
+    dependencies=[Security(dep.get_current_user, scopes=["rw"])],
+    description="Upserts the records in a single transaction and returns "
+    "the outcome of each record, in the same order. "
+    "`project_id` will be generated if not provided by client.",
+)
+async def bulk_upsert_projects(
+    projects: Annotated[list[UpdatedProject], Body(max_items=db.MAX_BULK_SIZE)],
+    current_user: Annotated[User, Depends(dep.get_current_user)],
+) -> list[BulkResult]:
+    projects_in_db: list[ProjectInDB] = []
+
+    for x in projects:
+        x_in_db = ProjectInDB(
+            **x.dict(exclude_unset=True),
+            created_by=current_user.user_id,
+            updated_by=current_user.user_id
+        )
+
+        if not x_in_db.project_id:
+            x_in_db.project_id = uuid4()
+
+        projects_in_db.append(x_in_db)
+
+    return await db.bulk_upsert_projects(projects_in_db)
 
 
 @router.put(
@@ -80,12 +134,24 @@ async def create_project(
 async def update_project(
     project: UpdatedProject,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> Project | None:
     project_in_db = ProjectInDB(
         **project.dict(exclude_unset=True), updated_by=current_user.user_id
     )
 
-    return db.update_project(project_in_db)
+    updated = await db.update_project(project_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(
+            await db.get_project(
+                project_in_db.account_id,
+                project_in_db.opportunity_id,
+                project_in_db.project_id,
+            )
+        )
+
+    return updated
 
 
 @router.delete(
@@ -95,7 +161,7 @@ async def update_project(
 async def delete_project(
     account_id: UUID, opportunity_id: UUID, project_id: UUID
 ) -> Project | None:
-    return db.delete_project(account_id, opportunity_id, project_id)
+    return await db.delete_project(account_id, opportunity_id, project_id)
 
 
 # Attachements
@@ -136,7 +202,7 @@ async def get_presigned_put_url(
         + "/"
         + filename
     )
-    db.add_project_attachment(account_id, opportunity_id, project_id, filename)
+    await db.add_project_attachment(account_id, opportunity_id, project_id, filename)
     data = dep.get_presigned_put_url(s3_object_name)
     return HTMLResponse(content=data)
 
@@ -157,5 +223,5 @@ async def delete_attachement(
         + "/"
         + filename
     )
-    db.remove_project_attachment(account_id, opportunity_id, project_id, filename)
+    await db.remove_project_attachment(account_id, opportunity_id, project_id, filename)
     dep.s3_remove_object(s3_object_name)
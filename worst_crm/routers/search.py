@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Query, Response
+from typing import Annotated
+from worst_crm import db
+from worst_crm.models import SearchEntity, SearchHit
+import worst_crm.dependencies as dep
+
+router = APIRouter(
+    prefix="/search",
+    dependencies=[Depends(dep.get_current_user)],
+    tags=["search"],
+)
+
+
+@router.get(
+    "",
+    description="Full-text search on names and texts, and fuzzy search on contacts. "
+    "Hits of all the given entities, or of every entity, are sorted by rank.",
+)
+async def search(
+    response: Response,
+    q: Annotated[str, Query(min_length=2, max_length=200)],
+    entity: Annotated[list[SearchEntity] | None, Query()] = None,
+    limit: Annotated[int, Query(ge=1, le=db.MAX_PAGE_SIZE)] = db.DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> list[SearchHit]:
+    after = dep.decode_cursor(cursor, db.SEARCH_KEYSET)
+    hits = await db.search(q, entity or list(db.SEARCH_SOURCES), limit, after)
+    dep.set_next_cursor(response, hits, limit, db.SEARCH_KEYSET)
+    return hits
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends
+from worst_crm import db
+from worst_crm.models import PipelineStats, StatsEntity
+import worst_crm.dependencies as dep
+
+router = APIRouter(
+    prefix="/stats",
+    dependencies=[Depends(dep.get_current_user)],
+    tags=["stats"],
+)
+
+
+@router.get(
+    "/{entity}",
+    description="Counts by status, open and overdue workload by owner, "
+    "and counts by due week. The stats are cached for a few seconds.",
+)
+async def get_stats(entity: StatsEntity) -> PipelineStats | None:
+    return await db.get_stats(entity)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, Security
+import datetime as dt
+from fastapi import APIRouter, Body, Depends, Security
 from fastapi.responses import HTMLResponse
 from typing import Annotated
 from uuid import UUID, uuid4
 from worst_crm import db
 from worst_crm.models import (
+    BulkResult,
     Task,
     TaskFilters,
     UpdatedTask,
@@ -24,23 +26,33 @@ router = APIRouter(
 # CRUD
 @router.get("/{account_id}/{opportunity_id}")
 async def get_all_tasks_for_opportunity_id(
-    account_id: UUID, opportunity_id: UUID, task_filters: TaskFilters | None = None
+    account_id: UUID,
+    opportunity_id: UUID,
+    task_filters: TaskFilters | None = None,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[TaskOverviewWithProjectName]:
-    return db.get_all_tasks_for_opportunity_id(account_id, opportunity_id, task_filters)
+    return await db.get_all_tasks_for_opportunity_id(
+        account_id, opportunity_id, task_filters, staleness=staleness
+    )
 
 
 @router.get("/{account_id}/{opportunity_id}/{project_id}")
 async def get_all_tasks_for_project_id(
-    account_id: UUID, opportunity_id: UUID, project_id: UUID
+    account_id: UUID,
+    opportunity_id: UUID,
+    project_id: UUID,
+    staleness: Annotated[dt.timedelta | None, Depends(dep.get_staleness)] = None,
 ) -> list[TaskOverview]:
-    return db.get_all_tasks_for_project_id(account_id, opportunity_id, project_id)
+    return await db.get_all_tasks_for_project_id(
+        account_id, opportunity_id, project_id, staleness=staleness
+    )
 
 
 @router.get("/{account_id}/{opportunity_id}/{project_id}/{task_id}")
 async def get_task(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, task_id: UUID
 ) -> Task | None:
-    return db.get_task(account_id, opportunity_id, project_id, task_id)
+    return await db.get_task(account_id, opportunity_id, project_id, task_id)
 
 
 @router.post(
@@ -61,7 +73,35 @@ async def create_task(
     if not task_in_db.task_id:
         task_in_db.task_id = uuid4()
 
-    return db.create_task(task_in_db)
+    return await db.create_task(task_in_db)
+
+
+@router.post(
+    "/bulk",
+    dependencies=[Security(dep.get_current_user, scopes=["rw"])],
+    description="Upserts the records in a single transaction and returns "
+    "the outcome of each record, in the same order. "
+    "`task_id` will be generated if not provided by client.",
+)
+async def bulk_upsert_tasks(
+    tasks: Annotated[list[UpdatedTask], Body(max_items=db.MAX_BULK_SIZE)],
+    current_user: Annotated[User, Depends(dep.get_current_user)],
+) -> list[BulkResult]:
+    tasks_in_db: list[TaskInDB] = []
+
+    for x in tasks:
+        x_in_db = TaskInDB(
+            **x.dict(exclude_unset=True),
+            created_by=current_user.user_id,
+            updated_by=current_user.user_id
+        )
+
+        if not x_in_db.task_id:
+            x_in_db.task_id = uuid4()
+
+        tasks_in_db.append(x_in_db)
+
+    return await db.bulk_upsert_tasks(tasks_in_db)
 
 
 @router.put(
@@ -71,10 +111,23 @@ async def create_task(
 async def update_task(
     task: UpdatedTask,
     current_user: Annotated[User, Depends(dep.get_current_user)],
+    expected_updated_at: dt.datetime | None = None,
 ) -> Task | None:
     task_in_db = TaskInDB(**task.dict(), updated_by=current_user.user_id)
 
-    return db.update_task(task_in_db)
+    updated = await db.update_task(task_in_db, expected_updated_at)
+
+    if not updated and expected_updated_at:
+        dep.raise_if_stale(
+            await db.get_task(
+                task_in_db.account_id,
+                task_in_db.opportunity_id,
+                task_in_db.project_id,
+                task_in_db.task_id,
+            )
+        )
+
+    return updated
 
 
 @router.delete(
@@ -84,7 +137,7 @@ async def update_task(
 async def delete_task(
     account_id: UUID, opportunity_id: UUID, project_id: UUID, task_id: UUID
 ) -> Task | None:
-    return db.delete_task(account_id, opportunity_id, project_id, task_id)
+    return await db.delete_task(account_id, opportunity_id, project_id, task_id)
 
 
 # Attachments
@@ -137,7 +190,9 @@ async def get_presigned_put_url(
         + "/"
         + filename
     )
-    db.add_task_attachment(account_id, opportunity_id, project_id, task_id, filename)
+    await db.add_task_attachment(
+        account_id, opportunity_id, project_id, task_id, filename
+    )
     data = dep.get_presigned_put_url(s3_object_name)
     return HTMLResponse(content=data)
 
@@ -164,5 +219,7 @@ async def delete_attachement(
         + "/"
         + filename
     )
-    db.remove_task_attachment(account_id, opportunity_id, project_id, task_id, filename)
+    await db.remove_task_attachment(
+        account_id, opportunity_id, project_id, task_id, filename
+    )
     dep.s3_remove_object(s3_object_name)
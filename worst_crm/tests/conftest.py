@@ -0,0 +1,10 @@
+from worst_crm.tests.utils import client
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def app_lifespan():
+    # runs the app startup and shutdown events, and keeps the same
+    # event loop, which the db connection pool is bound to, for the whole session
+    with client:
+        yield
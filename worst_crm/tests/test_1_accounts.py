@@ -1,6 +1,5 @@
-from fastapi.testclient import TestClient
-from worst_crm.main import app
-from worst_crm.models import Account, AccountOverview
+from worst_crm import db
+from worst_crm.models import Account, AccountOverview, BulkResult
 from worst_crm.tests import utils
 from worst_crm.tests.utils import login, setup_test
 import hashlib
@@ -9,7 +8,7 @@ from faker import Faker
 
 fake = Faker()
 
-client = TestClient(app)
+client = utils.client
 
 ACCOUNT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
 
@@ -54,6 +53,72 @@ def test_load_accounts(login, setup_test):
         )
 
 
+def test_bulk_upsert_accounts(login, setup_test):
+    accounts = [
+        {
+            "name": f"BULK-{i:06}",
+            "text": fake.text(),
+            "status": "NEW",
+            "owned_by": "dummyadmin",
+            "tags": ["bulk"],
+        }
+        for i in range(1200)
+    ]
+    # a FK violation only fails its own row
+    accounts[700]["owned_by"] = "nonexistentuser"
+
+    r = client.post(
+        "/accounts/bulk",
+        headers={"Authorization": f"Bearer {login}"},
+        json=accounts,
+    )
+
+    assert r.status_code == 200
+    results = [BulkResult(**x) for x in r.json()]
+    assert [x.index for x in results] == list(range(1200))
+    assert [x.index for x in results if not x.ok] == [700]
+    # the reason, not the driver's message naming the constraint
+    assert results[700].error == "23503: a referenced row does not exist"
+
+    # upserting again updates the existing rows
+    account_id = results[0].key["account_id"]
+    r = client.post(
+        "/accounts/bulk",
+        headers={"Authorization": f"Bearer {login}"},
+        json=[{**accounts[0], "account_id": str(account_id), "text": "bulk update"}],
+    )
+
+    assert r.status_code == 200
+    assert BulkResult(**r.json()[0]).ok
+
+    r = client.get(
+        f"/accounts/{account_id}", headers={"Authorization": f"Bearer {login}"}
+    )
+    acc = Account(**r.json())
+    assert acc.text == "bulk update"
+    assert acc.created_by == "dummyadmin"
+
+    # a partial record only updates the columns it sets
+    r = client.post(
+        "/accounts/bulk",
+        headers={"Authorization": f"Bearer {login}"},
+        json=[{"account_id": str(account_id), "name": "BULK-PARTIAL"}],
+    )
+
+    assert r.status_code == 200
+    assert BulkResult(**r.json()[0]).ok
+
+    r = client.get(
+        f"/accounts/{account_id}", headers={"Authorization": f"Bearer {login}"}
+    )
+    acc = Account(**r.json())
+    assert acc.name == "BULK-PARTIAL"
+    assert acc.text == "bulk update"
+    assert acc.status == "NEW"
+    assert acc.owned_by == "dummyadmin"
+    assert acc.tags == {"bulk"}
+
+
 def test_update_account(login, setup_test):
     r = client.put(
         f"/accounts",
@@ -81,6 +146,40 @@ def test_update_account(login, setup_test):
     assert acc.text == "I've updated this text"
 
 
+def test_update_account_partial_and_concurrent(login, setup_test):
+    r = client.get(
+        f"/accounts/{ACCOUNT_ID}", headers={"Authorization": f"Bearer {login}"}
+    )
+    acc = Account(**r.json())
+
+    # only the tags are sent: all other fields are left untouched
+    r = client.put(
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"expected_updated_at": acc.updated_at.isoformat()},
+        json={"account_id": ACCOUNT_ID, "tags": ["t3"]},
+    )
+    assert r.status_code == 200
+    upd_acc = Account(**r.json())
+    assert upd_acc.tags == {"t3"}
+    assert upd_acc.text == acc.text
+    assert upd_acc.updated_at > acc.updated_at
+
+    # a second writer holding the old version is rejected
+    r = client.put(
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"expected_updated_at": acc.updated_at.isoformat()},
+        json={"account_id": ACCOUNT_ID, "tags": ["t4"]},
+    )
+    assert r.status_code == 409
+
+    r = client.get(
+        f"/accounts/{ACCOUNT_ID}", headers={"Authorization": f"Bearer {login}"}
+    )
+    assert Account(**r.json()).tags == {"t3"}
+
+
 def test_get_all_accounts(login, setup_test):
     r = client.get(
         "/accounts",
@@ -108,6 +207,70 @@ def test_get_all_accounts_with_filters(login, setup_test):
     assert len(l) == 1
 
 
+def test_get_all_accounts_paginated(login, setup_test):
+    r = client.get(
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"limit": 10},
+    )
+
+    assert r.status_code == 200
+    page1 = [AccountOverview(**x) for x in r.json()]
+    assert len(page1) == 10
+    assert "X-Next-Cursor" in r.headers
+
+    r = client.get(
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"limit": 10, "cursor": r.headers["X-Next-Cursor"]},
+    )
+
+    assert r.status_code == 200
+    page2 = [AccountOverview(**x) for x in r.json()]
+    assert len(page2) == 10
+    assert not {x.account_id for x in page1} & {x.account_id for x in page2}
+    assert (page1[-1].name, str(page1[-1].account_id)) <= (
+        page2[0].name,
+        str(page2[0].account_id),
+    )
+
+    # page size is capped
+    r = client.get(
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"limit": db.MAX_PAGE_SIZE + 1},
+    )
+    assert r.status_code == 422
+
+    # tampered cursors are rejected
+    r = client.get(
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"cursor": "not-a-cursor"},
+    )
+    assert r.status_code == 422
+
+
+def test_get_all_accounts_with_staleness(login, setup_test):
+    r = client.get(
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"staleness": "5s"},
+    )
+
+    assert r.status_code == 200
+    assert all([AccountOverview(**x) for x in r.json()])
+
+    # an invalid unit, a negative and an excessive staleness
+    for staleness in ["5h", "-5s", "3600s"]:
+        r = client.get(
+            "/accounts",
+            headers={"Authorization": f"Bearer {login}"},
+            params={"staleness": staleness},
+        )
+        assert r.status_code == 422
+
+
 def test_attachment_upload_and_download(login, setup_test):
     for filename in ["1MB with spaces.txt", "ss.png"]:
         # uploading
@@ -0,0 +1,90 @@
+from worst_crm import db
+from worst_crm.models import SlowQuery, StatementStats
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login, setup_test
+import time
+
+client = utils.client
+
+
+def test_statement_stats(login, setup_test):
+    r = client.delete(
+        "/admin/diagnostics/statements",
+        headers={"Authorization": f"Bearer {login}"},
+    )
+    assert r.status_code == 200
+
+    for _ in range(3):
+        r = client.get("/admin/users", headers={"Authorization": f"Bearer {login}"})
+        assert r.status_code == 200
+
+    r = client.get(
+        "/admin/diagnostics/statements",
+        headers={"Authorization": f"Bearer {login}"},
+    )
+    assert r.status_code == 200
+
+    stats = {x.name: x for x in [StatementStats(**x) for x in r.json()]}
+    assert stats["get_all_users"].calls == 3
+    assert stats["get_all_users"].errors == 0
+    assert stats["get_all_users"].prepared
+
+    # the counters are zeroed, the statements are kept
+    r = client.delete(
+        "/admin/diagnostics/statements",
+        headers={"Authorization": f"Bearer {login}"},
+    )
+    assert r.status_code == 200
+
+    r = client.get(
+        "/admin/diagnostics/statements",
+        headers={"Authorization": f"Bearer {login}"},
+    )
+    stats = {x.name: x for x in [StatementStats(**x) for x in r.json()]}
+    assert stats["get_all_users"].calls == 0
+    assert stats["get_all_users"].prepared
+
+
+def get_slow_queries(login) -> dict[str, SlowQuery]:
+    r = client.get(
+        "/admin/diagnostics/slow-queries",
+        headers={"Authorization": f"Bearer {login}"},
+    )
+    assert r.status_code == 200
+    return {x.name: x for x in [SlowQuery(**x) for x in r.json()]}
+
+
+def test_slow_queries(login, setup_test, monkeypatch):
+    # every statement is slow, and every slow SELECT is explained
+    monkeypatch.setattr(db, "SLOW_QUERY_THRESHOLD_MS", 0)
+    monkeypatch.setattr(db, "SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 1)
+
+    r = client.delete(
+        "/admin/diagnostics/slow-queries",
+        headers={"Authorization": f"Bearer {login}"},
+    )
+    assert r.status_code == 200
+
+    r = client.get(
+        "/admin/users/dummyadmin", headers={"Authorization": f"Bearer {login}"}
+    )
+    assert r.status_code == 200
+
+    q = get_slow_queries(login)["get_user"]
+    assert q.params == ["str"]
+    assert q.rows == 1
+    assert not q.failed
+
+    # the plan is captured in the background
+    for _ in range(50):
+        q = get_slow_queries(login)["get_user"]
+        if q.plan:
+            break
+        time.sleep(0.1)
+
+    assert q.plan and any("execution time" in x for x in q.plan), q.plan
+
+    # EXPLAIN ANALYZE would send the notification again
+    client.portal.call(db.notify, "worst_crm_test", "slow")
+    time.sleep(0.5)
+    assert get_slow_queries(login)["notify"].plan is None
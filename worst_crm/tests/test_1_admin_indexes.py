@@ -0,0 +1,56 @@
+from worst_crm import db
+from worst_crm.models import ManagedIndex
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login, setup_test
+
+client = utils.client
+
+
+def get_index_status(login) -> dict[str, str]:
+    r = client.get("/admin/indexes", headers={"Authorization": f"Bearer {login}"})
+    assert r.status_code == 200
+    return {x.name: x.status for x in [ManagedIndex(**x) for x in r.json()]}
+
+
+def test_managed_indexes(login, setup_test):
+    # the DDL creates every managed index
+    assert set(get_index_status(login).values()) == {"ok"}
+
+    client.portal.call(
+        db.execute_stmt,
+        """
+        DROP INDEX accounts@accounts_updated_at;
+        DROP INDEX accounts@accounts_owned_by;
+        CREATE INDEX accounts_owned_by ON accounts(owned_by);
+        """,
+        (),
+        None,
+        False,
+        False,
+    )
+
+    # a database created before the search: its index is dropped with the column
+    for stmt in [
+        "DROP INDEX tasks@tasks_search",
+        "ALTER TABLE tasks DROP COLUMN search_vector",
+    ]:
+        client.portal.call(db.execute_stmt, stmt, (), None, False, False)
+
+    status = get_index_status(login)
+    assert status["accounts_updated_at"] == "missing"
+    assert status["accounts_owned_by"] == "stale"
+    assert status["tasks_search"] == "missing"
+
+    r = client.post("/admin/indexes", headers={"Authorization": f"Bearer {login}"})
+    assert r.status_code == 200
+    assert {x.status for x in [ManagedIndex(**x) for x in r.json()]} == {"ok"}
+
+    assert set(get_index_status(login).values()) == {"ok"}
+
+    # the search reads the column again
+    r = client.get(
+        "/search",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"q": "task"},
+    )
+    assert r.status_code == 200
@@ -0,0 +1,62 @@
+from worst_crm import db
+from worst_crm.models import Account
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login, setup_test
+
+client = utils.client
+
+
+def test_update_model_without_restart(login, setup_test):
+    r = client.get(
+        "/admin/models/account", headers={"Authorization": f"Bearer {login}"}
+    )
+    assert r.status_code == 200
+    model = r.json()
+    watch = client.portal.call(db.get_watch)
+
+    r = client.put(
+        "/admin/models/account",
+        headers={"Authorization": f"Bearer {login}"},
+        json={**model, "region": {"type": "str"}},
+    )
+    assert r.status_code == 200
+
+    try:
+        # the other instances are notified
+        assert client.portal.call(db.get_watch)["models"] != watch["models"]
+
+        # the new field is live in this process
+        assert "region" in Account.__fields__
+
+        r = client.get("/worst_crm.openapi.json")
+        assert "region" in r.json()["components"]["schemas"]["Account"]["properties"]
+
+        r = client.post(
+            "/accounts",
+            headers={"Authorization": f"Bearer {login}"},
+            json={
+                "name": "ACC-REGION",
+                "status": "NEW",
+                "owned_by": "dummyadmin",
+                "region": "EMEA",
+            },
+        )
+        assert r.status_code == 200
+        acc = Account(**r.json())
+        assert acc.region == "EMEA"  # type: ignore
+
+        r = client.delete(
+            f"/accounts/{acc.account_id}",
+            headers={"Authorization": f"Bearer {login}"},
+        )
+        assert r.status_code == 200
+
+    finally:
+        r = client.put(
+            "/admin/models/account",
+            headers={"Authorization": f"Bearer {login}"},
+            json=model,
+        )
+        assert r.status_code == 200
+
+    assert "region" not in Account.__fields__
@@ -1,8 +1,8 @@
-from fastapi.testclient import TestClient
-from worst_crm.main import app
+import worst_crm.dependencies as dep
 import worst_crm.tests.utils as utils
+from worst_crm.tests.utils import login, setup_test
 
-client = TestClient(app)
+client = utils.client
 
 
 def ztest_user_locked():
@@ -16,3 +16,56 @@ def ztest_user_locked():
         "/login", data={"username": "dummyadmin", "password": "wrong-password"}
     )
     assert r.status_code == 406
+
+
+def test_updated_user_is_not_served_from_cache(login, setup_test):
+    headers = {"Authorization": f"Bearer {login}"}
+
+    r = client.post(
+        "/admin/users",
+        headers=headers,
+        json={
+            "user_id": "dummyuser",
+            "password": "dummyuser",
+            "is_disabled": False,
+            "scopes": ["rw"],
+        },
+    )
+    assert r.status_code == 200
+
+    r = client.post("/login", data={"username": "dummyuser", "password": "dummyuser"})
+    assert r.status_code == 200
+    user_headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    # the user is now cached
+    r = client.get("/me", headers=user_headers)
+    assert r.status_code == 200
+
+    r = client.put(
+        "/admin/users/dummyuser", headers=headers, json={"is_disabled": True}
+    )
+    assert r.status_code == 200
+
+    r = client.get("/me", headers=user_headers)
+    assert r.status_code == 400
+
+    r = client.delete("/admin/users/dummyuser", headers=headers)
+    assert r.status_code == 200
+
+    r = client.get("/me", headers=user_headers)
+    assert r.status_code == 401
+
+
+def test_login_is_rejected_when_hashing_is_saturated(setup_test, monkeypatch):
+    # no room for any bcrypt job
+    monkeypatch.setattr(dep, "HASHING_WORKERS", 0)
+    monkeypatch.setattr(dep, "HASHING_MAX_QUEUE", 0)
+
+    r = client.post("/login", data={"username": "dummyadmin", "password": "x"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+
+    monkeypatch.undo()
+
+    r = client.post("/login", data={"username": "dummyadmin", "password": "dummyadmin"})
+    assert r.status_code == 200
@@ -1,13 +1,12 @@
-from fastapi.testclient import TestClient
-from worst_crm.main import app
 from worst_crm.models import ArtifactSchema
+from worst_crm.tests import utils
 from worst_crm.tests.utils import login
 from faker import Faker
 import random
 
 fake = Faker()
 
-client = TestClient(app)
+client = utils.client
 
 ARTIFACT_SCHEMA_ID = "ART-SCHEMA-1"
 
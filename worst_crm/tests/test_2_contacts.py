@@ -1,6 +1,4 @@
 import random
-from fastapi.testclient import TestClient
-from worst_crm.main import app
 from worst_crm.models import Contact
 from worst_crm.tests import utils
 from worst_crm.tests.utils import login
@@ -11,7 +9,7 @@ from faker import Faker
 fake = Faker()
 
 
-client = TestClient(app)
+client = utils.client
 
 ACCOUNT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
 CONTACT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
@@ -1,6 +1,5 @@
 import random
-from fastapi.testclient import TestClient
-from worst_crm.main import app
+from worst_crm import db
 from worst_crm.models import (
     Artifact,
     ArtifactOverview,
@@ -15,7 +14,7 @@ from faker import Faker
 
 fake = Faker()
 
-client = TestClient(app)
+client = utils.client
 
 
 ACCOUNT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
@@ -83,6 +82,53 @@ def test_load_artifacts(login):
         assert r.status_code == 200
 
 
+def test_artifact_validator_is_cached(login):
+    schema_id = "ART-SCHEMA-CACHE-" + str(random.randint(000, 999))
+
+    def create_artifact() -> Artifact:
+        r = client.post(
+            "/artifacts",
+            headers={"Authorization": f"Bearer {login}"},
+            json={
+                "name": "ART-CACHE",
+                "account_id": ACCOUNT_ID,
+                "opportunity_id": OPPORTUNITY_ID,
+                "artifact_schema_id": schema_id,
+                "payload": {"nodes": "3"},
+            },
+        )
+        assert r.status_code == 200
+        return Artifact(**r.json())
+
+    r = client.post(
+        "/artifact-schemas",
+        headers={"Authorization": f"Bearer {login}"},
+        json={
+            "artifact_schema_id": schema_id,
+            "artifact_schema": {"nodes": {"type": "int"}},
+        },
+    )
+    assert r.status_code == 200
+
+    assert create_artifact().payload == {"nodes": 3}
+    validator = client.portal.call(db.get_artifact_validator, schema_id)
+    assert client.portal.call(db.get_artifact_validator, schema_id) is validator
+
+    # the cached validator is dropped when its schema is updated
+    r = client.put(
+        "/artifact-schemas",
+        headers={"Authorization": f"Bearer {login}"},
+        json={
+            "artifact_schema_id": schema_id,
+            "artifact_schema": {"nodes": {"type": "str"}},
+        },
+    )
+    assert r.status_code == 200
+
+    assert create_artifact().payload == {"nodes": "3"}
+    assert client.portal.call(db.get_artifact_validator, schema_id) is not validator
+
+
 def test_update_artifact(login):
     r = client.put(
         f"/artifacts",
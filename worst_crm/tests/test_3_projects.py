@@ -1,6 +1,5 @@
 import random
-from fastapi.testclient import TestClient
-from worst_crm.main import app
+import time
 from worst_crm.models import (
     Project,
     ProjectOverview,
@@ -15,7 +14,7 @@ from faker import Faker
 
 fake = Faker()
 
-client = TestClient(app)
+client = utils.client
 
 
 ACCOUNT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
@@ -137,6 +136,42 @@ def test_get_all_projects_for_account_id(login):
     assert len(l) >= 20
 
 
+def get_account_names(login) -> set[str | None]:
+    r = client.request(
+        "GET",
+        "/projects",
+        headers={"Authorization": f"Bearer {login}"},
+        json={"where": {"account_id": {"eq": ACCOUNT_ID}}},
+    )
+    assert r.status_code == 200
+    return {ProjectOverviewWithAccountName(**x).account_name for x in r.json()}
+
+
+def test_get_all_projects_after_account_rename(login):
+    r = client.get(
+        f"/accounts/{ACCOUNT_ID}", headers={"Authorization": f"Bearer {login}"}
+    )
+    assert r.status_code == 200
+    name = r.json()["name"]
+    assert get_account_names(login) == {name}
+
+    for new_name in ["ACC-RENAMED", name]:
+        r = client.put(
+            "/accounts",
+            headers={"Authorization": f"Bearer {login}"},
+            json={"account_id": ACCOUNT_ID, "name": new_name},
+        )
+        assert r.status_code == 200
+
+        # the new name is propagated in the background
+        for _ in range(50):
+            if get_account_names(login) == {new_name}:
+                break
+            time.sleep(0.1)
+
+        assert get_account_names(login) == {new_name}
+
+
 def test_get_all_projects_for_opportunity_id(login):
     r = client.get(
         f"/projects/{ACCOUNT_ID}/{OPPORTUNITY_ID}",
@@ -1,5 +1,3 @@
-from fastapi.testclient import TestClient
-from worst_crm.main import app
 from worst_crm.models import OpportunityNote, OpportunityNoteOverview
 from worst_crm.tests import utils
 from worst_crm.tests.utils import login
@@ -10,7 +8,7 @@ import random
 
 fake = Faker()
 
-client = TestClient(app)
+client = utils.client
 
 
 ACCOUNT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
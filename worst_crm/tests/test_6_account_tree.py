@@ -0,0 +1,75 @@
+from worst_crm.models import AccountTree, OpportunityOverview
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login, setup_test
+import uuid
+
+client = utils.client
+
+ACCOUNT_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
+
+
+def test_get_account_tree(login, setup_test):
+    r = client.get(
+        f"/accounts/{ACCOUNT_ID}/tree", headers={"Authorization": f"Bearer {login}"}
+    )
+
+    assert r.status_code == 200
+    tree = AccountTree(**r.json())
+    assert str(tree.account.account_id) == ACCOUNT_ID
+    for section in [
+        tree.contacts,
+        tree.opportunities,
+        tree.account_notes,
+        tree.projects,
+        tree.artifacts,
+        tree.opportunity_notes,
+        tree.tasks,
+        tree.project_notes,
+    ]:
+        assert section is not None
+
+    # the same opportunities as the dedicated endpoint
+    r = client.get(
+        f"/opportunities/{ACCOUNT_ID}", headers={"Authorization": f"Bearer {login}"}
+    )
+    opps = [OpportunityOverview(**x) for x in r.json()]
+    assert {x.opportunity_id for x in tree.opportunities} == {  # type: ignore
+        x.opportunity_id for x in opps
+    }
+
+
+def test_get_account_tree_depth_and_include(login, setup_test):
+    r = client.get(
+        f"/accounts/{ACCOUNT_ID}/tree",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"depth": 0},
+    )
+    assert r.status_code == 200
+    tree = AccountTree(**r.json())
+    assert tree.contacts is None and tree.opportunities is None
+
+    r = client.get(
+        f"/accounts/{ACCOUNT_ID}/tree",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"depth": 1, "include": ["opportunities", "tasks"]},
+    )
+    assert r.status_code == 200
+    tree = AccountTree(**r.json())
+    assert tree.opportunities is not None
+    assert tree.contacts is None
+    # tasks are below depth 1
+    assert tree.tasks is None
+
+    r = client.get(
+        f"/accounts/{ACCOUNT_ID}/tree",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"include": ["nonexistent"]},
+    )
+    assert r.status_code == 422
+
+    r = client.get(
+        f"/accounts/{uuid.uuid4()}/tree",
+        headers={"Authorization": f"Bearer {login}"},
+    )
+    assert r.status_code == 200
+    assert r.json() is None
@@ -0,0 +1,154 @@
+from worst_crm import db
+from worst_crm.models import AccountOverview
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login, setup_test
+import json
+import os
+import pytest
+import resource
+
+client = utils.client
+
+# the export is checked against a synthetic data set of this many accounts
+EXPORT_TEST_ROWS = int(os.getenv("EXPORT_TEST_ROWS", 50_000))
+EXPORT_TEST_MAX_RSS_MB = int(os.getenv("EXPORT_TEST_MAX_RSS_MB", 25))
+# a million accounts take minutes to load: opt in with EXPORT_TEST_LARGE=1
+EXPORT_TEST_LARGE = os.getenv("EXPORT_TEST_LARGE", "False").lower() in ["true", "1"]
+EXPORT_TEST_TAG = "export-test"
+
+
+def load_synthetic_accounts(rows: int, batch_size: int = 50_000):
+    for start in range(0, rows, batch_size):
+        client.portal.call(
+            lambda args: db.execute_stmt(
+                """
+                INSERT INTO accounts (account_id, name, text, owned_by, tags)
+                SELECT gen_random_uuid(), 'EXP-' || lpad(i::STRING, 8, '0'),
+                    repeat('x', 200), 'dummyadmin', ARRAY[%s]
+                FROM generate_series(%s, %s) AS g(i)
+                """,
+                args,
+                returning_rs=False,
+            ),
+            (EXPORT_TEST_TAG, start + 1, min(start + batch_size, rows)),
+        )
+
+
+def delete_synthetic_accounts():
+    client.portal.call(
+        lambda args: db.execute_stmt(
+            "DELETE FROM accounts WHERE tags @> ARRAY[%s]", args, returning_rs=False
+        ),
+        (EXPORT_TEST_TAG,),
+    )
+
+
+async def export_and_count(path: str, query: str, body: dict, token: str) -> int:
+    """
+    Drives the ASGI app directly and parses the NDJSON chunks as they are sent:
+    the TestClient would buffer the whole response body in memory.
+    """
+    request_body = json.dumps(body).encode()
+    status_code = 0
+    count = 0
+    partial = b""
+
+    async def receive():
+        return {"type": "http.request", "body": request_body, "more_body": False}
+
+    async def send(message):
+        nonlocal status_code, count, partial
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+        elif message["type"] == "http.response.body":
+            *lines, partial = (partial + message.get("body", b"")).split(b"\n")
+            for line in lines:
+                AccountOverview(**json.loads(line))
+                count += 1
+
+    await client.app(
+        {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "server": ("testserver", 80),
+            "client": ("testclient", 50000),
+            "root_path": "",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", f"Bearer {token}".encode()),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(request_body)).encode()),
+            ],
+        },
+        receive,
+        send,
+    )
+
+    assert status_code == 200
+    assert partial == b""
+    return count
+
+
+def get_max_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def test_export_accounts_as_json(login, setup_test):
+    r = client.request(
+        "GET",
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        json={"name": ["ACC-1"]},
+    )
+    assert r.status_code == 200
+    expected = [AccountOverview(**x) for x in r.json()]
+
+    r = client.request(
+        "GET",
+        "/accounts/export",
+        headers={"Authorization": f"Bearer {login}"},
+        params={"format": "json"},
+        json={"name": ["ACC-1"]},
+    )
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/json")
+    assert [AccountOverview(**x) for x in r.json()] == expected
+
+
+def check_export_memory(token: str, rows: int, max_rss_mb: int):
+    load_synthetic_accounts(rows)
+
+    try:
+        rss_before = get_max_rss_mb()
+
+        count = client.portal.call(
+            export_and_count,
+            "/accounts/export",
+            "format=ndjson",
+            {"tags": [EXPORT_TEST_TAG]},
+            token,
+        )
+
+        assert count == rows
+        # the whole result set would take several times as much
+        assert get_max_rss_mb() - rss_before < max_rss_mb
+
+    finally:
+        delete_synthetic_accounts()
+
+
+def test_export_accounts_with_flat_memory(login, setup_test):
+    check_export_memory(login, EXPORT_TEST_ROWS, EXPORT_TEST_MAX_RSS_MB)
+
+
+@pytest.mark.skipif(not EXPORT_TEST_LARGE, reason="set EXPORT_TEST_LARGE=1")
+def test_export_a_million_accounts_with_flat_memory(login, setup_test):
+    check_export_memory(login, 1_000_000, 100)
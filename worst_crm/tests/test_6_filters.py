@@ -0,0 +1,192 @@
+from worst_crm import db
+from worst_crm.models import AccountFilters, AccountOverview
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login, setup_test
+from uuid import uuid4
+import pytest
+
+client = utils.client
+
+PREFIX = "FLT-"
+
+ACCOUNTS = [
+    {"name": f"{PREFIX}ALPHA", "status": "NEW", "due_date": "2031-01-10"},
+    {"name": f"{PREFIX}BETA", "status": "POC", "due_date": "2031-02-10"},
+    {"name": f"{PREFIX}GAMMA", "status": "POC", "tags": ["flt-vip"]},
+]
+
+
+def get_names(login, filters: dict) -> list[str]:
+    r = client.request(
+        "GET",
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        json=filters,
+    )
+    assert r.status_code == 200, r.text
+    return [AccountOverview(**x).name for x in r.json()]
+
+
+def test_filter_conditions(login, setup_test):
+    ids = []
+    for acc in ACCOUNTS:
+        r = client.post(
+            "/accounts",
+            headers={"Authorization": f"Bearer {login}"},
+            json={**acc, "owned_by": "dummyadmin"},
+        )
+        assert r.status_code == 200
+        ids.append(r.json()["account_id"])
+
+    try:
+        prefix = {"name": {"prefix": PREFIX}}
+
+        assert get_names(login, {"where": prefix}) == [x["name"] for x in ACCOUNTS]
+
+        assert get_names(
+            login, {"where": {**prefix, "due_date": {"gte": "2031-02-01"}}}
+        ) == [f"{PREFIX}BETA"]
+
+        # rows with a null due_date don't match a negation
+        assert get_names(
+            login, {"where": {**prefix, "due_date": {"ne": "2031-01-10"}}}
+        ) == [f"{PREFIX}BETA"]
+
+        assert get_names(
+            login, {"where": {**prefix, "due_date": {"is_null": True}}}
+        ) == [f"{PREFIX}GAMMA"]
+
+        assert get_names(
+            login, {"where": {**prefix, "status": {"not_in": ["POC"]}}}
+        ) == [f"{PREFIX}ALPHA"]
+
+        assert get_names(login, {"where": {"name": {"ilike": "%flt-gam%"}}}) == [
+            f"{PREFIX}GAMMA"
+        ]
+
+        assert get_names(
+            login,
+            {
+                "where": prefix,
+                "any_of": [
+                    {"status": {"eq": "NEW"}},
+                    {"tags": {"contains": ["flt-vip"]}},
+                ],
+            },
+        ) == [f"{PREFIX}ALPHA", f"{PREFIX}GAMMA"]
+
+        # an empty list matches nothing, rather than being ignored
+        assert get_names(login, {"where": {**prefix, "status": {"in": []}}}) == []
+
+    finally:
+        for account_id in ids:
+            r = client.delete(
+                f"/accounts/{account_id}",
+                headers={"Authorization": f"Bearer {login}"},
+            )
+            assert r.status_code == 200
+
+
+@pytest.mark.parametrize(
+    "where",
+    [
+        {"nope": {"eq": "x"}},
+        {"owned_by": {"foo": "x"}},
+        {"due_date": {"gte": "not-a-date"}},
+        {"due_date": {"prefix": "2023"}},
+        {"tags": {"eq": "x"}},
+        {"name": {"contains": ["x"]}},
+    ],
+)
+def test_filter_conditions_are_validated(login, setup_test, where):
+    r = client.request(
+        "GET",
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        json={"where": where},
+    )
+    assert r.status_code == 422
+
+
+@pytest.mark.parametrize("col", ["opportunity_id", "project_id"])
+def test_note_filter_conditions_are_common_columns(login, setup_test, col):
+    # the account notes don't have the columns of the project notes
+    r = client.request(
+        "GET",
+        f"/notes/account/{uuid4()}",
+        headers={"Authorization": f"Bearer {login}"},
+        json={"where": {col: {"eq": str(uuid4())}}},
+    )
+    assert r.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "prefix, end",
+    [
+        ("FLT-", "FLT."),
+        ("ab\U0010ffff", "ac"),
+        # the surrogates can't be encoded in UTF-8
+        ("a\ud7ff", "a\ue000"),
+        ("\U0010ffff", None),
+        ("", None),
+    ],
+)
+def test_prefix_end(prefix, end):
+    assert db.__get_prefix_end(prefix) == end
+    if end:
+        end.encode()
+
+
+# every operator must compile to a predicate served by an index.
+# The values are selective, so that the optimizer prefers the index
+# over reading the whole table in name order.
+@pytest.mark.parametrize(
+    "filters, index",
+    [
+        ({"where": {"owned_by": {"eq": "nobody"}}}, "accounts_owned_by"),
+        ({"where": {"owned_by": {"in": ["nobody", "noone"]}}}, "accounts_owned_by"),
+        ({"where": {"owned_by": {"ne": "dummyadmin"}}}, "accounts_owned_by"),
+        ({"where": {"owned_by": {"not_in": ["dummyadmin"]}}}, "accounts_owned_by"),
+        ({"where": {"owned_by": {"is_null": True}}}, "accounts_owned_by"),
+        ({"owned_by": ["nobody"]}, "accounts_owned_by"),
+        ({"where": {"name": {"prefix": "ZQXJ"}}}, "accounts_name"),
+        ({"where": {"name": {"ilike": "%zqxj%"}}}, "accounts_name_trgm"),
+        ({"where": {"tags": {"contains": ["zqxj"]}}}, "accounts_tags_gin"),
+        ({"tags": ["zqxj"]}, "accounts_tags_gin"),
+        ({"where": {"due_date": {"gt": "2999-01-01"}}}, "accounts_due_date"),
+        ({"where": {"due_date": {"lte": "1900-01-01"}}}, "accounts_due_date"),
+        (
+            {"where": {"due_date": {"gte": "2999-01-01", "lt": "2999-02-01"}}},
+            "accounts_due_date",
+        ),
+        (
+            {
+                "where": {
+                    "status": {"eq": "COMMERCIAL"},
+                    "due_date": {"gte": "2999-01-01"},
+                }
+            },
+            "accounts_status_due_date",
+        ),
+    ],
+)
+def test_filter_conditions_use_indexes(setup_test, filters, index):
+    plan = "\n".join(
+        client.portal.call(db.explain, db.get_all_accounts, AccountFilters(**filters))
+    )
+
+    assert f"accounts@{index}" in plan, plan
+    assert "FULL SCAN" not in plan, plan
+
+
+def test_any_of_uses_indexes(setup_test):
+    filters = AccountFilters(
+        any_of=[
+            {"owned_by": {"eq": "nobody"}},
+            {"tags": {"contains": ["zqxj"]}},
+        ]
+    )
+    plan = "\n".join(client.portal.call(db.explain, db.get_all_accounts, filters))
+
+    # each branch of the OR is read from its own index
+    assert "FULL SCAN" not in plan, plan
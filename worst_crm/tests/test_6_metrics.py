@@ -0,0 +1,44 @@
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login
+
+client = utils.client
+
+
+def get_samples() -> dict[str, float]:
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    samples = {}
+    for line in r.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+
+    return samples
+
+
+def test_metrics(login):
+    r = client.get("/accounts", headers={"Authorization": f"Bearer {login}"})
+    assert r.status_code == 200
+
+    samples = get_samples()
+
+    # the route template, not the path, is the label
+    assert (
+        samples[
+            'worst_crm_http_request_seconds_count{method="GET",route="/accounts",status="200"}'
+        ]
+        >= 1
+    )
+    assert samples['worst_crm_db_statement_seconds_count{name="get_all_accounts"}'] >= 1
+    assert samples["worst_crm_db_pool_checkout_seconds_count"] >= 1
+    assert samples['worst_crm_auth_hashing_seconds_count{operation="verify"}'] >= 1
+    assert samples["worst_crm_auth_jwt_decode_seconds_count"] >= 1
+    assert samples['worst_crm_db_pool_connections{state="size"}'] >= 1
+
+    r = client.get("/no/such/path")
+    assert r.status_code == 404
+
+    samples = get_samples()
+    assert not [x for x in samples if "/no/such/path" in x]
@@ -0,0 +1,56 @@
+from worst_crm import db
+from worst_crm.tests import utils
+from worst_crm.tests.utils import setup_test
+from uuid import uuid4
+import pytest
+
+client = utils.client
+
+ID = uuid4()
+
+
+# Every list query must be served by an index. A full scan is only
+# accepted under a soft limit: it stops as soon as the page is filled.
+# The status, user and artifact schema lists read small lookup tables
+# in full by design, and aren't checked.
+@pytest.mark.parametrize(
+    "fn, args",
+    [
+        (db.get_all_accounts, (None,)),
+        (db.get_all_contacts, ()),
+        (db.get_all_contacts_for_account_id, (ID,)),
+        (db.get_all_opportunities, (None,)),
+        (db.get_all_opportunities_for_account_id, (ID,)),
+        (db.get_all_artifacts, (None,)),
+        (db.get_all_artifacts_for_account_id, (ID, None)),
+        (db.get_all_artifacts_for_opportunity_id, (ID, ID)),
+        (db.get_all_projects, (None,)),
+        (db.get_all_projects_for_account_id, (ID, None)),
+        (db.get_all_projects_for_opportunity_id, (ID, ID)),
+        (db.get_all_tasks_for_opportunity_id, (ID, ID)),
+        (db.get_all_tasks_for_project_id, (ID, ID, ID)),
+        (db.get_all_account_notes, (ID,)),
+        (db.get_all_opportunity_notes, (ID, ID)),
+        (db.get_all_project_notes, (ID, ID, ID)),
+    ],
+    ids=lambda x: x.__name__ if callable(x) else "",
+)
+def test_get_all_avoids_full_scans(setup_test, fn, args):
+    plan = client.portal.call(db.explain, fn, *args)
+
+    assert plan, f"{fn.__name__} could not be explained"
+    assert not [
+        x for x in plan if "FULL SCAN" in x and "SOFT LIMIT" not in x
+    ], "\n".join(plan)
+
+
+@pytest.mark.parametrize("entity", ["opportunities", "projects", "tasks"])
+def test_stats_scan_owned_by_index(setup_test, monkeypatch, entity):
+    # the schema was just created: it can't be read in the past
+    monkeypatch.setattr(db, "STATS_STALENESS_SECONDS", 0)
+
+    plan = client.portal.call(db.explain, db.get_stats_rows, entity)
+
+    assert plan, f"the {entity} stats could not be explained"
+    # the index storing status and due_date, not the primary index with the text
+    assert [x for x in plan if f"{entity}@{entity}_owned_by" in x], "\n".join(plan)
@@ -0,0 +1,73 @@
+from worst_crm.models import SearchHit
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login, setup_test
+
+client = utils.client
+
+SEARCH_TERM = "Zyxwvut"
+
+
+def test_search(login, setup_test):
+    r = client.post(
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        json={
+            "name": f"{SEARCH_TERM} Industries",
+            "text": "Makes widgets",
+            "status": "NEW",
+            "owned_by": "dummyadmin",
+        },
+    )
+    assert r.status_code == 200
+    account_id = r.json()["account_id"]
+
+    r = client.post(
+        "/contacts",
+        headers={"Authorization": f"Bearer {login}"},
+        json={"account_id": account_id, "fname": SEARCH_TERM, "lname": "Smith"},
+    )
+    assert r.status_code == 200
+
+    try:
+        r = client.get(
+            "/search",
+            headers={"Authorization": f"Bearer {login}"},
+            params={"q": SEARCH_TERM.lower()},
+        )
+        assert r.status_code == 200
+        hits = [SearchHit(**x) for x in r.json()]
+        assert {x.entity for x in hits} == {"account", "contact"}
+        assert [x.rank for x in hits] == sorted([x.rank for x in hits], reverse=True)
+
+        # a typo still finds the contact
+        r = client.get(
+            "/search",
+            headers={"Authorization": f"Bearer {login}"},
+            params={"q": "Zyxwvat", "entity": ["contact"]},
+        )
+        assert r.status_code == 200
+        assert [SearchHit(**x).name for x in r.json()] == [f"{SEARCH_TERM} Smith"]
+
+        # paginated
+        r = client.get(
+            "/search",
+            headers={"Authorization": f"Bearer {login}"},
+            params={"q": SEARCH_TERM, "limit": 1},
+        )
+        assert r.status_code == 200
+        page1 = [SearchHit(**x) for x in r.json()]
+
+        r = client.get(
+            "/search",
+            headers={"Authorization": f"Bearer {login}"},
+            params={"q": SEARCH_TERM, "limit": 1, "cursor": r.headers["X-Next-Cursor"]},
+        )
+        assert r.status_code == 200
+        page2 = [SearchHit(**x) for x in r.json()]
+        assert len(page1) == len(page2) == 1
+        assert page1 != page2
+
+    finally:
+        client.delete(
+            f"/accounts/{account_id}", headers={"Authorization": f"Bearer {login}"}
+        )
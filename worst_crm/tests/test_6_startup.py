@@ -0,0 +1,68 @@
+from worst_crm.tests.utils import setup_test
+import json
+import os
+import subprocess
+import sys
+
+STARTUP_TEST_MAX_SECONDS = float(os.getenv("STARTUP_TEST_MAX_SECONDS", 5))
+
+# the app is already imported by this process:
+# the cold start is measured in a fresh interpreter
+STARTUP_SCRIPT = """
+import json
+import time
+
+start = time.perf_counter()
+
+import psycopg
+
+connects = 0
+connect = psycopg.connect
+
+
+def counting_connect(*args, **kwargs):
+    global connects
+    connects += 1
+    return connect(*args, **kwargs)
+
+
+psycopg.connect = counting_connect
+
+from fastapi.testclient import TestClient
+from worst_crm.main import app
+
+imported = time.perf_counter()
+
+with TestClient(app) as client:
+    r = client.get("/healthcheck")
+    assert r.status_code == 200
+
+served = time.perf_counter()
+
+print(
+    json.dumps(
+        {
+            "connects": connects,
+            "import_s": imported - start,
+            "first_request_s": served - start,
+        }
+    )
+)
+"""
+
+
+def test_startup_time(setup_test):
+    p = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert p.returncode == 0, p.stderr
+
+    result = json.loads(p.stdout.splitlines()[-1])
+    print(result)
+
+    # every dynamic model is built from a single query
+    assert result["connects"] == 1
+    assert result["first_request_s"] < STARTUP_TEST_MAX_SECONDS
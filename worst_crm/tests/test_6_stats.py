@@ -0,0 +1,107 @@
+from worst_crm import db
+from worst_crm.models import PipelineStats
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login, setup_test
+import datetime as dt
+
+client = utils.client
+
+YESTERDAY = (dt.date.today() - dt.timedelta(days=1)).isoformat()
+NEXT_YEAR = (dt.date.today() + dt.timedelta(days=365)).isoformat()
+
+OPPORTUNITIES = [
+    {"name": "STATS-1", "status": "OPEN", "due_date": YESTERDAY},
+    {"name": "STATS-2", "status": "IN PROGRESS", "due_date": NEXT_YEAR},
+    # completed opportunities are never overdue
+    {"name": "STATS-3", "status": "COMPLETED", "due_date": YESTERDAY},
+    {"name": "STATS-4", "status": "OPEN"},
+]
+
+
+def get_stats(login, entity: str) -> PipelineStats:
+    r = client.get(f"/stats/{entity}", headers={"Authorization": f"Bearer {login}"})
+    assert r.status_code == 200, r.text
+    return PipelineStats(**r.json())
+
+
+def get_counts(stats: PipelineStats) -> dict:
+    """The counts that inserting rows changes, to compare with a baseline."""
+    return {
+        "totals": (stats.total, stats.open, stats.overdue),
+        "by_status": {x.status: (x.count, x.overdue) for x in stats.by_status},
+        "by_owner": {x.owned_by: (x.open, x.overdue) for x in stats.by_owner},
+    }
+
+
+def get_delta(before: dict, after: dict) -> dict:
+    """The counts of after minus those of before, the unchanged ones left out."""
+    delta = {}
+
+    for k, v in after.items():
+        if isinstance(v, tuple):
+            delta[k] = tuple(a - b for a, b in zip(v, before[k]))
+        else:
+            delta[k] = {
+                x: tuple(a - b for a, b in zip(y, before[k].get(x, (0,) * len(y))))
+                for x, y in v.items()
+                if y != before[k].get(x)
+            }
+
+    return delta
+
+
+def test_stats(login, setup_test, monkeypatch):
+    # the schema was just created: it can't be read in the past
+    monkeypatch.setattr(db, "STATS_STALENESS_SECONDS", 0)
+    db.invalidate_cached_stats()
+
+    # the previous test modules left rows behind: compare with a baseline
+    before = get_counts(get_stats(login, "opportunities"))
+    tasks_before = get_stats(login, "tasks").total
+    db.invalidate_cached_stats()
+
+    r = client.post(
+        "/accounts",
+        headers={"Authorization": f"Bearer {login}"},
+        json={"name": "STATS", "status": "NEW", "owned_by": "dummyadmin"},
+    )
+    assert r.status_code == 200
+    account_id = r.json()["account_id"]
+
+    for opp in OPPORTUNITIES:
+        r = client.post(
+            "/opportunities",
+            headers={"Authorization": f"Bearer {login}"},
+            json={**opp, "account_id": account_id, "owned_by": "dummyadmin"},
+        )
+        assert r.status_code == 200
+
+    stats = get_stats(login, "opportunities")
+
+    assert get_delta(before, get_counts(stats)) == {
+        "totals": (4, 3, 1),
+        "by_status": {"OPEN": (2, 1), "IN PROGRESS": (1, 0), "COMPLETED": (1, 0)},
+        "by_owner": {"dummyadmin": (3, 1)},
+    }
+    assert sum([x.count for x in stats.by_due_week]) == stats.total
+    # rows without a due_date come last
+    assert stats.by_due_week[-1].week is None
+
+    # served from the cache until it expires
+    r = client.post(
+        "/opportunities",
+        headers={"Authorization": f"Bearer {login}"},
+        json={"name": "STATS-5", "account_id": account_id},
+    )
+    assert r.status_code == 200
+    assert get_stats(login, "opportunities") == stats
+
+    db.invalidate_cached_stats("opportunities")
+    assert get_stats(login, "opportunities").total == stats.total + 1
+
+    assert get_stats(login, "tasks").total == tasks_before
+
+
+def test_stats_unknown_entity(login):
+    r = client.get("/stats/accounts", headers={"Authorization": f"Bearer {login}"})
+    assert r.status_code == 422
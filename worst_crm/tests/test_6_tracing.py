@@ -0,0 +1,79 @@
+from worst_crm import tracing
+from worst_crm.tests import utils
+from worst_crm.tests.utils import login
+import pytest
+
+client = utils.client
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def exporter():
+    exporter = tracing.InMemoryExporter()
+    tracing.set_exporter(exporter)
+    yield exporter
+    tracing.set_exporter(None)
+
+
+def get_tree(spans: list[tracing.Span], parent_id: str | None) -> list:
+    """The span tree as nested (name, children) tuples."""
+    return [
+        (x.name, get_tree(spans, x.span_id))
+        for x in sorted(spans, key=lambda x: x.start_ns)
+        if x.parent_id == parent_id
+    ]
+
+
+def test_request_span_tree(login, exporter):
+    r = client.get(
+        "/accounts",
+        headers={
+            "Authorization": f"Bearer {login}",
+            "traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01",
+        },
+    )
+    assert r.status_code == 200
+
+    spans = exporter.get_finished_spans()
+
+    # the trace of the caller is continued
+    assert {x.trace_id for x in spans} == {TRACE_ID}
+
+    [(name, children)] = get_tree(spans, PARENT_ID)
+    assert name == "GET /accounts"
+    assert "get_current_user" in [x for x, _ in children]
+    assert ("execute_stmt", [("pool_checkout", [])]) in children
+
+    [stmt] = [x for x in spans if x.attributes.get("db.statement.name")]
+    assert stmt.attributes["db.statement.name"] == "get_all_accounts"
+    assert "db.rows" in stmt.attributes
+
+
+def test_sanitize_spans(login, exporter):
+    r = client.post(
+        "/artifacts",
+        headers={"Authorization": f"Bearer {login}"},
+        json={
+            "name": "ART-TRACE",
+            "account_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+            "opportunity_id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+            "artifact_schema_id": "NO-SUCH-SCHEMA",
+            "payload": {},
+        },
+    )
+    assert r.status_code == 422
+
+    spans = exporter.get_finished_spans()
+    [root] = [x for x in spans if x.parent_id is None]
+    assert root.name == "POST /artifacts"
+    assert root.attributes["http.status_code"] == 422
+
+    [sanitize] = [x for x in spans if x.name == "sanitize"]
+    assert sanitize.status == "ERROR"
+    assert [
+        x.attributes["db.statement.name"]
+        for x in spans
+        if x.parent_id == sanitize.span_id
+    ] == ["get_artifact_schema"]
@@ -13,6 +13,8 @@ import httpx
 import random
 from uuid import UUID
 
+# a single client shared by all test modules: the app connection pool
+# is bound to the event loop of the client portal, see conftest.py
 client = TestClient(app)
 
 
@@ -229,15 +231,16 @@ def login(username: str = "dummyadmin", password: str = "dummyadmin") -> str:
 
 @pytest.fixture(scope="session")
 def setup_test():
-    db.load_schema("storage/worst_crm.ddl.sql")
+    client.portal.call(db.load_schema, "storage/worst_crm.ddl.sql")
 
-    assert db.create_user(
+    assert client.portal.call(
+        db.create_user,
         UserInDB(
             user_id="dummyadmin",
             is_disabled=False,
             scopes=["rw", "admin"],
-            hashed_password=dep.get_password_hash("dummyadmin"),
-        )
+            hashed_password=client.portal.call(dep.get_password_hash, "dummyadmin"),
+        ),
     )
 
 
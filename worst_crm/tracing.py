@@ -0,0 +1,243 @@
+"""
+Tracing of the requests: the dependencies, the SQL statements, the pool
+checkouts and the S3 calls of a request are recorded as a tree of spans.
+
+The spans follow the OpenTelemetry data model: each has a trace_id shared
+by the whole request, a span_id, the span_id of its parent, a start and end
+time in ns since the epoch, attributes and a status. A request carrying
+a W3C `traceparent` header continues the trace of its caller.
+
+Spans are only recorded once an exporter is set: until then, span()
+and the traced functions cost a global lookup.
+The exporter is chosen with TRACING_EXPORTER: `console` prints each span
+as a JSON line, for a collector to pick up. The tests use InMemoryExporter.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Protocol
+import asyncio
+import functools
+import json
+import os
+import re
+import time
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER")
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "status",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None,
+        attributes: dict[str, Any],
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = attributes
+        # UNSET, OK or ERROR
+        self.status = "UNSET"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {x: getattr(self, x) for x in self.__slots__}
+
+
+class Exporter(Protocol):
+    def export(self, span: Span) -> None:
+        ...
+
+
+class InMemoryExporter:
+    """Keeps the finished spans, to assert on the span trees in the tests."""
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def get_finished_spans(self) -> list[Span]:
+        return list(self.spans)
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+class ConsoleExporter:
+    def export(self, span: Span) -> None:
+        print(json.dumps(span.to_dict(), default=str))
+
+
+_exporter: Exporter | None = None
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter: Exporter | None) -> None:
+    global _exporter
+
+    _exporter = exporter
+
+
+def get_current_span() -> Span | None:
+    return _current.get()
+
+
+@contextmanager
+def span(
+    name: str, parent: tuple[str, str] | None = None, **attributes: Any
+) -> Iterator[Span | None]:
+    """
+    Records the block as a child of the current span, or as the root of a new
+    trace. parent is the (trace_id, span_id) of a remote parent.
+    """
+    if not _exporter:
+        yield None
+        return
+
+    current = _current.get()
+
+    if current:
+        trace_id, parent_id = current.trace_id, current.span_id
+    elif parent:
+        trace_id, parent_id = parent
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+
+    s = Span(name, trace_id, parent_id, attributes)
+    token = _current.set(s)
+
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "ERROR"
+        s.attributes["exception.type"] = type(e).__name__
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current.reset(token)
+        # the exporter may have been unset meanwhile
+        if _exporter:
+            _exporter.export(s)
+
+
+def add_span(name: str, start_ns: int, **attributes: Any) -> None:
+    """Records a child of the current span that started at start_ns and ends now."""
+    current = _current.get()
+
+    if not _exporter or not current:
+        return
+
+    s = Span(name, current.trace_id, current.span_id, attributes)
+    s.start_ns = start_ns
+    s.end_ns = time.time_ns()
+    _exporter.export(s)
+
+
+def traced(name: str | None = None) -> Callable[[Callable], Callable]:
+    """
+    Records each call of the decorated function as a span.
+    The signature is kept, so it can decorate FastAPI dependencies.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _exporter:
+                    return await fn(*args, **kwargs)
+
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _exporter:
+                return fn(*args, **kwargs)
+
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _get_traceparent(scope) -> tuple[str, str] | None:
+    for k, v in scope["headers"]:
+        if k == b"traceparent":
+            m = TRACEPARENT_RE.match(v.decode("latin-1"))
+            return (m.group(1), m.group(2)) if m else None
+
+    return None
+
+
+class TracingMiddleware:
+    """
+    Records every HTTP request as the root span of its tree.
+    The span is named after the route template once the request is routed.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not _exporter:
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status_code
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+            await send(message)
+
+        with span(
+            scope["method"],
+            _get_traceparent(scope),
+            **{"http.method": scope["method"], "http.target": scope["path"]},
+        ) as s:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route and s:
+                    s.name = f"{scope['method']} {route}"
+                    s.attributes["http.route"] = route
+
+                if s:
+                    s.attributes["http.status_code"] = status_code
+                    if status_code >= 500:
+                        s.status = "ERROR"
+
+
+if TRACING_EXPORTER == "console":
+    set_exporter(ConsoleExporter())